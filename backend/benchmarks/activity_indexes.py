@@ -0,0 +1,100 @@
+"""
+EXPLAIN ANALYZE every ActivityQuery filter combination with and without the
+activity indexes from evolutions/13.sql.
+
+The "before" plans are made by dropping the indexes inside a transaction that
+is rolled back afterwards, so it is safe to run against a real database
+(it does take a short lock on the activity table).
+
+Usage (from backend/, with the usual DB_* env variables):
+    python -m benchmarks.activity_indexes [--verbose]
+"""
+
+import datetime
+import itertools
+import sys
+
+from peewee import fn
+
+from tpbackend.activity.query import ActivityQuery
+from tpbackend.storage import Activity, db
+from tpbackend.utils2 import now
+
+INDEXES = [
+    "activity_user_timestamp_id_idx",
+    "activity_game_timestamp_id_idx",
+    "activity_platform_timestamp_id_idx",
+    "activity_timestamp_id_idx",
+    "activity_user_game_platform_timestamp_idx",
+]
+
+FILTERS = ["user", "game", "platform", "before", "after"]
+
+
+def most_common(column) -> int:
+    return (
+        Activity.select(column)
+        .group_by(column)
+        .order_by(fn.COUNT(Activity.id).desc())
+        .limit(1)
+        .scalar()
+    )
+
+
+def build_queries() -> list[tuple[str, object]]:
+    values = {
+        "user": most_common(Activity.user),
+        "game": most_common(Activity.game),
+        "platform": most_common(Activity.platform),
+        "before": now() - datetime.timedelta(days=7),
+        "after": now() - datetime.timedelta(days=37),
+    }
+    queries = []
+    for n in range(len(FILTERS) + 1):
+        for combo in itertools.combinations(FILTERS, n):
+            query = ActivityQuery.base()
+            for f in combo:
+                query = getattr(ActivityQuery, f)(query, values[f])
+            # same shape as /activities
+            query = ActivityQuery.apply_sort(query, "timestamp", "desc").limit(100)
+            queries.append(("+".join(combo) or "(none)", query))
+    return queries
+
+
+def explain(query) -> tuple[str, float, list[str]]:
+    sql, params = query.sql()
+    cursor = db.execute_sql(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+    lines = [row[0] for row in cursor.fetchall()]
+    # the scan node is the interesting one (Limit/Sort are always on top)
+    node = next((line for line in lines if "Scan" in line), lines[0])
+    node = node.strip().removeprefix("->").split("(cost")[0].strip()
+    ms = 0.0
+    for line in lines:
+        if line.startswith("Execution Time"):
+            ms = float(line.split(":")[1].strip().split(" ")[0])
+    return node, ms, lines
+
+
+def main():
+    verbose = "--verbose" in sys.argv
+    db.connect(reuse_if_open=True)
+    queries = build_queries()
+
+    after = [explain(q) for _, q in queries]
+    with db.atomic() as txn:
+        for index in INDEXES:
+            db.execute_sql(f"DROP INDEX IF EXISTS {index}")
+        before = [explain(q) for _, q in queries]
+        txn.rollback()
+
+    print(f"{'filters':<32} {'before':>10} {'after':>10}  scan before -> after")
+    for (name, _), b, a in zip(queries, before, after):
+        print(f"{name:<32} {b[1]:>8.2f}ms {a[1]:>8.2f}ms  {b[0]} -> {a[0]}")
+        if verbose:
+            print("  before:\n    " + "\n    ".join(b[2]))
+            print("  after:\n    " + "\n    ".join(a[2]))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+EXPLAIN ANALYZE the filtered game/user/platform stats queries, comparing the
+old shape (LEFT JOIN every activity, filter in the outer WHERE, then group)
+with GameStatsQuery.filtered() and friends (filter and group the activities
+in a subquery, then join that to the entities).
+
+Both shapes are sorted by playtime and limited to 100, like the stats routes.
+Nothing is written to the database.
+
+Usage (from backend/, with the usual DB_* env variables):
+    python -m benchmarks.stats_queries [--verbose]
+"""
+
+import datetime
+import itertools
+import sys
+
+from peewee import JOIN, Case, fn
+
+from benchmarks.activity_indexes import explain, most_common
+from tpbackend.activity.query import ActivityQuery
+from tpbackend.game.query import GameStatsQuery
+from tpbackend.platform.query import PlatformStatsQuery
+from tpbackend.storage import Activity, Game, Platform, User, db
+from tpbackend.user.query import UserStatsQuery
+from tpbackend.utils2 import now
+
+FILTERS = ["user", "game", "platform", "before", "after"]
+
+ENTITIES = {
+    "game": (Game, GameStatsQuery),
+    "user": (User, UserStatsQuery),
+    "platform": (Platform, PlatformStatsQuery),
+}
+
+
+def old_shape(model, filters, values):
+    """The LEFT JOIN + outer WHERE query the stats routes used to build."""
+    visible = Activity.hidden == False  # noqa: E712
+    query = (
+        model.select(
+            model,
+            fn.SUM(Case(None, [(visible, Activity.seconds)], 0)).alias("total_seconds"),
+            fn.COUNT(Case(None, [(visible, 1)], None)).alias("activity_count"),
+            fn.MAX(Case(None, [(visible, Activity.timestamp)], None)).alias(
+                "last_activity"
+            ),
+        )
+        .join(Activity, JOIN.LEFT_OUTER)
+        .group_by(model.id)
+    )
+    for f in filters:
+        query = getattr(ActivityQuery, f)(query, values[f])
+    return query
+
+
+def new_shape(stats_query, filters, values):
+    activities = ActivityQuery.base()
+    for f in filters:
+        activities = getattr(ActivityQuery, f)(activities, values[f])
+    return stats_query.filtered(activities)
+
+
+def build_queries() -> list[tuple[str, object, object]]:
+    values = {
+        "user": most_common(Activity.user),
+        "game": most_common(Activity.game),
+        "platform": most_common(Activity.platform),
+        "before": now() - datetime.timedelta(days=7),
+        "after": now() - datetime.timedelta(days=37),
+    }
+    queries = []
+    for entity, (model, stats_query) in ENTITIES.items():
+        # grouping by the entity you also filter on is not something the routes do
+        filters = [f for f in FILTERS if f != entity]
+        for n in range(1, len(filters) + 1):
+            for combo in itertools.combinations(filters, n):
+                old, new = (
+                    stats_query.apply_sort(q, "playtime", "desc").limit(100)
+                    for q in (
+                        old_shape(model, combo, values),
+                        new_shape(stats_query, combo, values),
+                    )
+                )
+                queries.append((f"{entity}: " + "+".join(combo), old, new))
+    return queries
+
+
+def activity_scan(lines: list[str]) -> str:
+    """The node reading the activity table, that is where the filters matter."""
+    node = next((line for line in lines if "Scan" in line and " activity " in line), "")
+    return node.strip().removeprefix("->").split("(cost")[0].strip()
+
+
+def main():
+    verbose = "--verbose" in sys.argv
+    db.connect(reuse_if_open=True)
+
+    print(f"{'filters':<40} {'old':>10} {'new':>10}  scan old -> new")
+    for name, old, new in build_queries():
+        b = explain(old)
+        a = explain(new)
+        print(
+            f"{name:<40} {b[1]:>8.2f}ms {a[1]:>8.2f}ms  "
+            f"{activity_scan(b[2])} -> {activity_scan(a[2])}"
+        )
+        if verbose:
+            print("  old:\n    " + "\n    ".join(b[2]))
+            print("  new:\n    " + "\n    ".join(a[2]))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+-- indexes for the activity hot paths
+-- almost every read filters on hidden = false, then user/game/platform, then sorts/ranges on timestamp
+
+-- ActivityQuery + user, /activity/newest?user=, last_platform_for_game
+CREATE INDEX IF NOT EXISTS activity_user_timestamp_idx ON "activity" (user_id, timestamp DESC) WHERE NOT hidden;
+-- ActivityQuery + game, game pages
+CREATE INDEX IF NOT EXISTS activity_game_timestamp_idx ON "activity" (game_id, timestamp) WHERE NOT hidden;
+-- ActivityQuery + platform, platform pages
+CREATE INDEX IF NOT EXISTS activity_platform_timestamp_idx ON "activity" (platform_id, timestamp) WHERE NOT hidden;
+-- no entity filter, only before/after (/total, /activities, /activity/newest)
+CREATE INDEX IF NOT EXISTS activity_timestamp_idx ON "activity" (timestamp DESC) WHERE NOT hidden;
+-- get_overlapping_activity (includes hidden activities)
+CREATE INDEX IF NOT EXISTS activity_user_game_platform_timestamp_idx ON "activity" (user_id, game_id, platform_id, timestamp DESC);
+
+-- history is append only, BRIN is tiny and good enough for the cleanup/range scans
+CREATE INDEX IF NOT EXISTS history_timestamp_brin_idx ON "history" USING brin (timestamp);
+CREATE INDEX IF NOT EXISTS discordhistory_timestamp_brin_idx ON "discordhistory" USING brin (timestamp);
+
+-- history backrefs (get_history) and ON DELETE CASCADE lookups
+CREATE INDEX IF NOT EXISTS history_activity_id_idx ON "history" (activity_id) WHERE activity_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS history_game_id_idx ON "history" (game_id) WHERE game_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS history_user_id_idx ON "history" (user_id) WHERE user_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS history_platform_id_idx ON "history" (platform_id) WHERE platform_id IS NOT NULL;
+
+ANALYZE "activity";
+ANALYZE "history";
+ANALYZE "discordhistory";
@@ -0,0 +1,80 @@
+-- stats rollup tables, kept current by the backend on every activity write (deltas, see evolution 22).
+-- Filled from the existing activities below, !reconcile_stats recomputes them if they ever drift
+
+CREATE TABLE IF NOT EXISTS "game_stats" (
+    game_id integer PRIMARY KEY REFERENCES "game"(id) ON DELETE CASCADE,
+    seconds bigint NOT NULL DEFAULT 0,
+    activity_count integer NOT NULL DEFAULT 0,
+    first_activity timestamp with time zone,
+    last_activity timestamp with time zone,
+    user_count integer NOT NULL DEFAULT 0,
+    platform_count integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS "user_stats" (
+    user_id integer PRIMARY KEY REFERENCES "user"(id) ON DELETE CASCADE,
+    seconds bigint NOT NULL DEFAULT 0,
+    activity_count integer NOT NULL DEFAULT 0,
+    first_activity timestamp with time zone,
+    last_activity timestamp with time zone,
+    game_count integer NOT NULL DEFAULT 0,
+    platform_count integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS "platform_stats" (
+    platform_id integer PRIMARY KEY REFERENCES "platform"(id) ON DELETE CASCADE,
+    seconds bigint NOT NULL DEFAULT 0,
+    activity_count integer NOT NULL DEFAULT 0,
+    first_activity timestamp with time zone,
+    last_activity timestamp with time zone,
+    user_count integer NOT NULL DEFAULT 0,
+    game_count integer NOT NULL DEFAULT 0
+);
+
+-- single row
+CREATE TABLE IF NOT EXISTS "global_stats" (
+    id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    seconds bigint NOT NULL DEFAULT 0,
+    activity_count integer NOT NULL DEFAULT 0,
+    first_activity timestamp with time zone,
+    last_activity timestamp with time zone,
+    user_count integer NOT NULL DEFAULT 0,
+    game_count integer NOT NULL DEFAULT 0,
+    platform_count integer NOT NULL DEFAULT 0
+);
+
+-- sorting the unfiltered list pages
+CREATE INDEX IF NOT EXISTS game_stats_seconds_idx ON "game_stats" (seconds DESC);
+CREATE INDEX IF NOT EXISTS game_stats_last_activity_idx ON "game_stats" (last_activity DESC NULLS LAST);
+
+INSERT INTO "game_stats" (game_id, seconds, activity_count, first_activity, last_activity, user_count, platform_count)
+SELECT g.id, COALESCE(SUM(a.seconds), 0), COUNT(a.id), MIN(a."timestamp"), MAX(a."timestamp"),
+    COUNT(DISTINCT a.user_id), COUNT(DISTINCT a.platform_id)
+FROM "game" g LEFT JOIN "activity" a ON a.game_id = g.id AND NOT a.hidden GROUP BY g.id
+ON CONFLICT (game_id) DO UPDATE SET seconds = excluded.seconds, activity_count = excluded.activity_count,
+    first_activity = excluded.first_activity, last_activity = excluded.last_activity,
+    user_count = excluded.user_count, platform_count = excluded.platform_count;
+
+INSERT INTO "user_stats" (user_id, seconds, activity_count, first_activity, last_activity, game_count, platform_count)
+SELECT u.id, COALESCE(SUM(a.seconds), 0), COUNT(a.id), MIN(a."timestamp"), MAX(a."timestamp"),
+    COUNT(DISTINCT a.game_id), COUNT(DISTINCT a.platform_id)
+FROM "user" u LEFT JOIN "activity" a ON a.user_id = u.id AND NOT a.hidden GROUP BY u.id
+ON CONFLICT (user_id) DO UPDATE SET seconds = excluded.seconds, activity_count = excluded.activity_count,
+    first_activity = excluded.first_activity, last_activity = excluded.last_activity,
+    game_count = excluded.game_count, platform_count = excluded.platform_count;
+
+INSERT INTO "platform_stats" (platform_id, seconds, activity_count, first_activity, last_activity, user_count, game_count)
+SELECT p.id, COALESCE(SUM(a.seconds), 0), COUNT(a.id), MIN(a."timestamp"), MAX(a."timestamp"),
+    COUNT(DISTINCT a.user_id), COUNT(DISTINCT a.game_id)
+FROM "platform" p LEFT JOIN "activity" a ON a.platform_id = p.id AND NOT a.hidden GROUP BY p.id
+ON CONFLICT (platform_id) DO UPDATE SET seconds = excluded.seconds, activity_count = excluded.activity_count,
+    first_activity = excluded.first_activity, last_activity = excluded.last_activity,
+    user_count = excluded.user_count, game_count = excluded.game_count;
+
+INSERT INTO "global_stats" (id, seconds, activity_count, first_activity, last_activity, user_count, game_count, platform_count)
+SELECT 1, COALESCE(SUM(seconds), 0), COUNT(*), MIN("timestamp"), MAX("timestamp"),
+    COUNT(DISTINCT user_id), COUNT(DISTINCT game_id), COUNT(DISTINCT platform_id)
+FROM "activity" WHERE NOT hidden
+ON CONFLICT (id) DO UPDATE SET seconds = excluded.seconds, activity_count = excluded.activity_count,
+    first_activity = excluded.first_activity, last_activity = excluded.last_activity,
+    user_count = excluded.user_count, game_count = excluded.game_count, platform_count = excluded.platform_count;
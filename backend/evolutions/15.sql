@@ -0,0 +1,37 @@
+-- seconds per (UTC day, user, game, platform), activities crossing midnight are split over the days
+-- kept current by the backend on every activity write, filled from the existing activities below
+-- (same split as split_by_day, !reconcile_stats daily rebuilds it)
+
+CREATE TABLE IF NOT EXISTS "activity_daily" (
+    day date NOT NULL,
+    user_id integer NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+    game_id integer NOT NULL REFERENCES "game"(id) ON DELETE CASCADE,
+    platform_id integer NOT NULL REFERENCES "platform"(id) ON DELETE CASCADE,
+    seconds integer NOT NULL DEFAULT 0,
+    activity_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, game_id, platform_id)
+);
+
+CREATE INDEX IF NOT EXISTS activity_daily_user_day_idx ON "activity_daily" (user_id, day);
+CREATE INDEX IF NOT EXISTS activity_daily_game_day_idx ON "activity_daily" (game_id, day);
+CREATE INDEX IF NOT EXISTS activity_daily_platform_day_idx ON "activity_daily" (platform_id, day);
+-- incremental refreshes delete by key
+CREATE INDEX IF NOT EXISTS activity_daily_key_idx ON "activity_daily" (user_id, game_id, platform_id);
+
+INSERT INTO "activity_daily" (day, user_id, game_id, platform_id, seconds, activity_count)
+SELECT d.day::date, a.user_id, a.game_id, a.platform_id,
+    SUM(CASE
+        WHEN a.started::date = a.ended::date THEN a.seconds
+        ELSE ROUND(EXTRACT(EPOCH FROM LEAST(a.ended, d.day + interval '1 day') - GREATEST(a.started, d.day)))
+    END),
+    -- counted on the day it ended
+    COUNT(*) FILTER (WHERE d.day::date = a.ended::date)
+FROM (
+    SELECT user_id, game_id, platform_id, seconds, "timestamp" AS ended,
+        "timestamp" - make_interval(secs => seconds) AS started
+    FROM "activity" WHERE NOT hidden
+) a
+CROSS JOIN LATERAL generate_series(a.started::date, a.ended::date, interval '1 day') AS d(day)
+GROUP BY d.day, a.user_id, a.game_id, a.platform_id
+ON CONFLICT (day, user_id, game_id, platform_id) DO UPDATE
+SET seconds = excluded.seconds, activity_count = excluded.activity_count;
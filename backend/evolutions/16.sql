@@ -0,0 +1,14 @@
+-- id as tie breaker on the activity timestamp indexes, for cursor pagination of /activities
+-- ORDER BY timestamp, id + WHERE (timestamp, id) < (...) is then a plain index range scan
+
+CREATE INDEX IF NOT EXISTS activity_user_timestamp_id_idx ON "activity" (user_id, timestamp DESC, id DESC) WHERE NOT hidden;
+DROP INDEX IF EXISTS activity_user_timestamp_idx;
+
+CREATE INDEX IF NOT EXISTS activity_game_timestamp_id_idx ON "activity" (game_id, timestamp, id) WHERE NOT hidden;
+DROP INDEX IF EXISTS activity_game_timestamp_idx;
+
+CREATE INDEX IF NOT EXISTS activity_platform_timestamp_id_idx ON "activity" (platform_id, timestamp, id) WHERE NOT hidden;
+DROP INDEX IF EXISTS activity_platform_timestamp_idx;
+
+CREATE INDEX IF NOT EXISTS activity_timestamp_id_idx ON "activity" (timestamp DESC, id DESC) WHERE NOT hidden;
+DROP INDEX IF EXISTS activity_timestamp_idx;
@@ -0,0 +1,42 @@
+-- parent inherited game metadata, so reading it doesn't walk the parents one query at a time
+-- kept current by the backend (refresh_effective_game) whenever a game or its parent changes
+
+ALTER TABLE "game" ADD COLUMN IF NOT EXISTS effective_sgdb_id integer;
+ALTER TABLE "game" ADD COLUMN IF NOT EXISTS effective_sgdb_grid_id integer;
+ALTER TABLE "game" ADD COLUMN IF NOT EXISTS effective_igdb_id integer;
+ALTER TABLE "game" ADD COLUMN IF NOT EXISTS effective_image_url varchar(255);
+ALTER TABLE "game" ADD COLUMN IF NOT EXISTS effective_hidden boolean NOT NULL DEFAULT FALSE;
+
+-- backfill, same as refresh_effective_game()
+WITH RECURSIVE tree AS (
+    SELECT
+        g.id,
+        0 AS depth,
+        g.sgdb_id,
+        NULLIF(g.sgdb_grid_id, 0) AS sgdb_grid_id,
+        g.igdb_id,
+        NULLIF(g.image_url, '') AS image_url,
+        g.hidden
+    FROM "game" g
+    WHERE g.parent_id IS NULL
+    UNION ALL
+    SELECT
+        c.id,
+        t.depth + 1,
+        COALESCE(c.sgdb_id, t.sgdb_id),
+        COALESCE(NULLIF(c.sgdb_grid_id, 0), t.sgdb_grid_id),
+        COALESCE(c.igdb_id, t.igdb_id),
+        COALESCE(NULLIF(c.image_url, ''), t.image_url),
+        c.hidden OR t.hidden
+    FROM "game" c
+    JOIN tree t ON c.parent_id = t.id
+    WHERE t.depth < 32
+)
+UPDATE "game" SET
+    effective_sgdb_id = tree.sgdb_id,
+    effective_sgdb_grid_id = tree.sgdb_grid_id,
+    effective_igdb_id = tree.igdb_id,
+    effective_image_url = tree.image_url,
+    effective_hidden = tree.hidden
+FROM tree
+WHERE "game".id = tree.id;
@@ -0,0 +1,26 @@
+-- game hierarchy closure table: every (ancestor, descendant) pair, including (game, game) at depth 0
+-- kept current by the backend whenever a game's parent changes
+
+CREATE TABLE IF NOT EXISTS "game_closure" (
+    ancestor_id integer NOT NULL REFERENCES "game"(id) ON DELETE CASCADE,
+    descendant_id integer NOT NULL REFERENCES "game"(id) ON DELETE CASCADE,
+    depth integer NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS game_closure_descendant_idx ON "game_closure" (descendant_id, depth);
+
+-- backfill
+WITH RECURSIVE paths AS (
+    SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM "game"
+    UNION ALL
+    SELECT p.ancestor_id, g.id, p.depth + 1
+    FROM paths p
+    JOIN "game" g ON g.parent_id = p.descendant_id
+    WHERE p.depth < 32
+)
+INSERT INTO "game_closure" (ancestor_id, descendant_id, depth)
+SELECT ancestor_id, descendant_id, MIN(depth) FROM paths GROUP BY ancestor_id, descendant_id
+ON CONFLICT DO NOTHING;
+
+ANALYZE "game_closure";
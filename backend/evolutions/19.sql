@@ -0,0 +1,20 @@
+-- Oblivionis row an activity was synced from: the sync skips rows already synced,
+-- if it crashed between adding the session and deleting the Oblivionis row
+ALTER TABLE "activity" ADD COLUMN IF NOT EXISTS oblivionis_id integer;
+CREATE UNIQUE INDEX IF NOT EXISTS activity_oblivionis_id_idx ON "activity" (oblivionis_id) WHERE oblivionis_id IS NOT NULL;
+
+-- Oblivionis rows that failed to sync, dead once the sync gave up on them
+CREATE TABLE IF NOT EXISTS "oblivionis_dead_letter" (
+    oblivionis_id integer PRIMARY KEY,
+    timestamp timestamp with time zone NOT NULL,
+    discord_user_id varchar(255) NOT NULL,
+    discord_user_name varchar(255) NOT NULL,
+    game_name varchar(255) NOT NULL,
+    seconds integer NOT NULL,
+    platform varchar(255) NOT NULL,
+    attempts integer NOT NULL DEFAULT 0,
+    error text NOT NULL DEFAULT '',
+    first_failed timestamp with time zone NOT NULL DEFAULT now(),
+    last_failed timestamp with time zone NOT NULL DEFAULT now(),
+    dead boolean NOT NULL DEFAULT false
+);
@@ -0,0 +1,25 @@
+-- [start, end) of an activity, it ends at timestamp and lasts seconds.
+-- Expression GiST indexes on it give exact overlap checks and "played during" window queries,
+-- the timestamp indexes only know when activities ended.
+-- Immutable: the interval is whole seconds, no time zone dependent day/month arithmetic
+CREATE OR REPLACE FUNCTION activity_period(ended timestamp with time zone, seconds integer)
+RETURNS tstzrange
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT tstzrange(ended - make_interval(secs => seconds), ended) $$;
+
+-- activity.timestamp is a UTC timestamp without time zone on databases created by peewee
+CREATE OR REPLACE FUNCTION activity_period(ended timestamp without time zone, seconds integer)
+RETURNS tstzrange
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT activity_period(ended AT TIME ZONE 'UTC', seconds) $$;
+
+-- user_id in the GiST index
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- overlap check when adding a session: all of the user's sessions, hidden ones too
+CREATE INDEX IF NOT EXISTS activity_user_period_idx ON "activity" USING gist (user_id, activity_period(timestamp, seconds));
+
+-- overlaps=start,end without a user filter
+CREATE INDEX IF NOT EXISTS activity_period_idx ON "activity" USING gist (activity_period(timestamp, seconds)) WHERE NOT hidden;
+
+ANALYZE "activity";
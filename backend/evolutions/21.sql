@@ -0,0 +1,8 @@
+-- GameSelect.by_name_or_alias: exact name, then alias, then name in any capitalization.
+-- Mostly answered from memory (game/resolver.py), these are for the fallback queries and rebuilds
+CREATE INDEX IF NOT EXISTS game_name_idx ON "game" (name);
+CREATE INDEX IF NOT EXISTS game_lower_name_idx ON "game" (LOWER(name));
+-- aliases @> ARRAY[...]
+CREATE INDEX IF NOT EXISTS game_aliases_idx ON "game" USING gin (aliases);
+
+ANALYZE "game";
@@ -0,0 +1,40 @@
+-- non-hidden activities per (user, game), (user, platform) and (game, platform).
+-- The distinct counts of the stats rollups (user_stats.game_count...) change when a pair's count
+-- goes from 0 to more or back, so activity writes can update them with deltas instead of COUNT(DISTINCT)
+-- (see STATS_CHANGES_CTES in storage.py)
+
+CREATE TABLE IF NOT EXISTS "user_game_stats" (
+    user_id integer NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+    game_id integer NOT NULL REFERENCES "game"(id) ON DELETE CASCADE,
+    activity_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, game_id)
+);
+CREATE INDEX IF NOT EXISTS user_game_stats_game_idx ON "user_game_stats" (game_id);
+
+CREATE TABLE IF NOT EXISTS "user_platform_stats" (
+    user_id integer NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+    platform_id integer NOT NULL REFERENCES "platform"(id) ON DELETE CASCADE,
+    activity_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, platform_id)
+);
+CREATE INDEX IF NOT EXISTS user_platform_stats_platform_idx ON "user_platform_stats" (platform_id);
+
+CREATE TABLE IF NOT EXISTS "game_platform_stats" (
+    game_id integer NOT NULL REFERENCES "game"(id) ON DELETE CASCADE,
+    platform_id integer NOT NULL REFERENCES "platform"(id) ON DELETE CASCADE,
+    activity_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (game_id, platform_id)
+);
+CREATE INDEX IF NOT EXISTS game_platform_stats_platform_idx ON "game_platform_stats" (platform_id);
+
+INSERT INTO "user_game_stats" (user_id, game_id, activity_count)
+SELECT user_id, game_id, COUNT(*) FROM "activity" WHERE NOT hidden GROUP BY user_id, game_id
+ON CONFLICT (user_id, game_id) DO UPDATE SET activity_count = excluded.activity_count;
+
+INSERT INTO "user_platform_stats" (user_id, platform_id, activity_count)
+SELECT user_id, platform_id, COUNT(*) FROM "activity" WHERE NOT hidden GROUP BY user_id, platform_id
+ON CONFLICT (user_id, platform_id) DO UPDATE SET activity_count = excluded.activity_count;
+
+INSERT INTO "game_platform_stats" (game_id, platform_id, activity_count)
+SELECT game_id, platform_id, COUNT(*) FROM "activity" WHERE NOT hidden GROUP BY game_id, platform_id
+ON CONFLICT (game_id, platform_id) DO UPDATE SET activity_count = excluded.activity_count;
@@ -22,9 +22,9 @@ class API_Activity(BaseModel):
             id=activity.id,
             timestamp=dt_to_ts(activity.timestamp),
             seconds=activity.seconds,
-            user_id=activity.user.id,
-            game_id=activity.game.id,
-            platform_id=activity.platform.id,
+            user_id=activity.user_id,
+            game_id=activity.game_id,
+            platform_id=activity.platform_id,
             emulated=activity.emulated,
             created=dt_to_ts(activity.created),
             updated=dt_to_ts(activity.updated),
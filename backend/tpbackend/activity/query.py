@@ -1,12 +1,19 @@
+import base64
 import datetime
 import logging
 from typing import Literal
 
+from peewee import Expression, Tuple, fn
+
 from tpbackend.storage import Activity, User, Game, Platform
 from tpbackend.utils2 import assertTimezone, validateTS, ts_to_dt
 
 logger = logging.getLogger("activities_query")
 
+# cursors keep the full timestamp precision, ms would skip/repeat activities
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
 
 class ActivityQuery:
     SORTS = {
@@ -14,6 +21,9 @@ class ActivityQuery:
         "timestamp": Activity.timestamp,
     }
 
+    # [start, end) tstzrange of the activity, GiST indexed (see evolutions/20.sql)
+    PERIOD = fn.activity_period(Activity.timestamp, Activity.seconds)
+
     @staticmethod
     def base(include_hidden=False):
         if include_hidden:
@@ -26,6 +36,61 @@ class ActivityQuery:
         column = ActivityQuery.SORTS[sort]
         return query.order_by(column.desc() if order == "desc" else column.asc())
 
+    @staticmethod
+    def apply_keyset_sort(query, sort, order):
+        """
+        Like apply_sort, but with id as tie breaker so (sort column, id) is unique.
+        Needed for cursor pagination
+        """
+        column = ActivityQuery.SORTS[sort]
+        if order == "desc":
+            return query.order_by(column.desc(), Activity.id.desc())
+        return query.order_by(column.asc(), Activity.id.asc())
+
+    @staticmethod
+    def encode_cursor(activity: Activity, sort) -> str:
+        """
+        Opaque cursor pointing after activity, for the given sort
+        """
+        if sort == "timestamp":
+            micros = (activity.get_datetime() - EPOCH) // MICROSECOND
+            raw = f"t:{micros}:{activity.get_id()}"
+        else:
+            raw = f"i:{activity.get_id()}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort) -> tuple | None:
+        """
+        Returns the key encoded in cursor, or None if it is invalid or for another sort
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            parts = base64.urlsafe_b64decode(padded).decode().split(":")
+            if sort == "timestamp" and parts[0] == "t" and len(parts) == 3:
+                ts = EPOCH + int(parts[1]) * MICROSECOND
+                return (ts, int(parts[2]))
+            if sort == "id" and parts[0] == "i" and len(parts) == 2:
+                return (int(parts[1]),)
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def after_cursor(query, key: tuple, sort, order):
+        """
+        Only activities after key (from decode_cursor) in the (apply_keyset_sort) order
+        """
+        if sort == "timestamp":
+            column = Tuple(Activity.timestamp, Activity.id)
+            value = Tuple(*key)
+        else:
+            column = Activity.id
+            value = key[0]
+        if order == "desc":
+            return query.where(column < value)
+        return query.where(column > value)
+
     @staticmethod
     def id(query, activity_id: int):
         return query.where(Activity.id == activity_id)  # type: ignore
@@ -84,6 +149,48 @@ class ActivityQuery:
         dt = assertTimezone(after)
         return query.where(Activity.timestamp >= dt)  # type: ignore
 
+    @staticmethod
+    def overlaps(
+        query,
+        start: int | datetime.datetime | None,
+        end: int | datetime.datetime | None,
+    ):
+        """
+        Activities played (at least partly) during [start, end), None is unbounded.
+        before/after only look at when activities ended
+        """
+
+        def bound(ts: int | datetime.datetime | None) -> datetime.datetime | None:
+            if ts is None:
+                return None
+            if isinstance(ts, int):
+                ts = ts_to_dt(ts)
+            return assertTimezone(ts)
+
+        window = fn.tstzrange(bound(start), bound(end))
+        return query.where(Expression(ActivityQuery.PERIOD, "&&", window))
+
+    @staticmethod
+    def totals(query) -> dict:
+        """
+        All totals of the (filtered) query in one aggregate statement,
+        so they all see the same snapshot
+        """
+        return (
+            query.select(
+                fn.COALESCE(fn.SUM(Activity.seconds), 0).alias("seconds"),
+                fn.COUNT(Activity.id).alias("activity_count"),
+                fn.MIN(Activity.timestamp).alias("first_activity"),
+                fn.MAX(Activity.timestamp).alias("last_activity"),
+                fn.COUNT(fn.DISTINCT(Activity.game)).alias("game_count"),
+                fn.COUNT(fn.DISTINCT(Activity.platform)).alias("platform_count"),
+                fn.COUNT(fn.DISTINCT(Activity.user)).alias("user_count"),
+            )
+            .order_by()
+            .dicts()
+            .get()
+        )
+
     @staticmethod
     def count(query) -> int:
         logger.info("Counting query: %s", query.sql())
@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Path, Query
+from fastapi import APIRouter, Path, Query, Response
 from typing import Literal
-from tpbackend.api.params import query_id, query_ts, sorts
-from tpbackend.storage import Activity
+from tpbackend.api.route_cache import cached_route
+from tpbackend.api.params import query_id, query_overlaps, query_ts, sorts
+from tpbackend.storage import Activity, GlobalStats
 from tpbackend.activity.models import API_Activity, Total
 from tpbackend.activity.query import ActivityQuery
-from tpbackend.utils2 import parse_csv, clamp, validateTS, dt_to_ts
+from tpbackend.utils2 import parse_csv, clamp, validateTS, dt_to_ts, parseWindow
 from tpbackend.api.params import AscDescOrder, path_csv, query_csv, offset, limit
 from tpbackend.api.responses import bad_request, not_found
-from peewee import fn
 import logging
 
 logger = logging.getLogger("activity_routes")
@@ -94,7 +94,9 @@ def get_many_activities(ids=path_csv("activity ids")) -> list[API_Activity]:
     tags=["activities"],
     response_model=list[API_Activity],
 )
+@cached_route()
 def get_activities(
+    response: Response,
     offset=offset(),
     limit=limit(),
     order: AscDescOrder = "desc",
@@ -104,10 +106,18 @@ def get_activities(
     platform=query_id("platform"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
+    cursor: str | None = Query(
+        default=None,
+        description="X-Next-Cursor header of the previous page, to continue from there",
+    ),
 ) -> list[API_Activity]:
     limit = clamp(int(limit), 1, 500)
     offset = max(0, int(offset))
     before, after = validateTS(before), validateTS(after)
+    window = parseWindow(overlaps) if overlaps else None
+    if overlaps and not window:
+        return bad_request("Invalid overlaps, expected start,end timestamps")
 
     query = ActivityQuery.base(include_hidden=False)
     if user is not None:
@@ -120,49 +130,81 @@ def get_activities(
         query = ActivityQuery.before(query, before)
     if after is not None:
         query = ActivityQuery.after(query, after)
-    query = ActivityQuery.apply_sort(query, sort, order)
+    if window:
+        query = ActivityQuery.overlaps(query, *window)
+    if cursor:
+        key = ActivityQuery.decode_cursor(cursor, sort)
+        if key is None:
+            return bad_request("Invalid cursor")
+        query = ActivityQuery.after_cursor(query, key, sort, order)
+    query = ActivityQuery.apply_keyset_sort(query, sort, order)
     query = query.offset(offset).limit(limit)
-    return [API_Activity.from_activity(a) for a in query]
+    activities = list(query)
+    if len(activities) == limit:
+        response.headers["X-Next-Cursor"] = ActivityQuery.encode_cursor(
+            activities[-1], sort
+        )
+    return [API_Activity.from_activity(a) for a in activities]
 
 
 @router.get("/total", response_model=Total, tags=["activities"])
+@cached_route()
 def get_total(
     users=query_csv("users"),
     games=query_csv("games"),
     platforms=query_csv("platforms"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
 ) -> Total:
     before, after = validateTS(before), validateTS(after)
+    window = parseWindow(overlaps) if overlaps else None
+    if overlaps and not window:
+        return bad_request("Invalid overlaps, expected start,end timestamps")
+    if not (users or games or platforms or before or after or window):
+        totals = GlobalStats.get_or_none(GlobalStats.id == 1)
+        if totals:
+            return Total(
+                seconds=totals.seconds,
+                activity_count=totals.activity_count,
+                game_count=totals.game_count,
+                platform_count=totals.platform_count,
+                user_count=totals.user_count,
+                first_activity=(
+                    dt_to_ts(totals.first_activity) if totals.first_activity else None
+                ),
+                last_activity=(
+                    dt_to_ts(totals.last_activity) if totals.last_activity else None
+                ),
+            )
+    user_ids = sorted(set(parse_csv(users))) if users else None
+    game_ids = sorted(set(parse_csv(games))) if games else None
+    platform_ids = sorted(set(parse_csv(platforms))) if platforms else None
+
     query = ActivityQuery.base(include_hidden=False)
-    if users:
-        query = ActivityQuery.users(query, parse_csv(users))
-    if games:
-        query = ActivityQuery.games(query, parse_csv(games))
-    if platforms:
-        query = ActivityQuery.platforms(query, parse_csv(platforms))
+    if user_ids is not None:
+        query = ActivityQuery.users(query, user_ids)
+    if game_ids is not None:
+        query = ActivityQuery.games(query, game_ids)
+    if platform_ids is not None:
+        query = ActivityQuery.platforms(query, platform_ids)
     if before:
         query = ActivityQuery.before(query, before)
     if after:
         query = ActivityQuery.after(query, after)
-    first = None
-    last = None
-    # logger.info(f"Total Query: {query.sql()}")
-    count = query.count()
-    if count > 0:
-        firstq = query.select(fn.min(Activity.timestamp)).scalar()
-        lastq = query.select(fn.max(Activity.timestamp)).scalar()
-        if firstq:
-            first = dt_to_ts(firstq)
-        if lastq:
-            last = dt_to_ts(lastq)
+    if window:
+        query = ActivityQuery.overlaps(query, *window)
+    totals = ActivityQuery.totals(query)
     return Total(
-        seconds=query.select(fn.SUM(Activity.seconds)).scalar() or 0,
-        activity_count=count,
-        game_count=query.select(fn.COUNT(fn.DISTINCT(Activity.game))).scalar() or 0,
-        platform_count=query.select(fn.COUNT(fn.DISTINCT(Activity.platform))).scalar()
-        or 0,
-        user_count=query.select(fn.COUNT(fn.DISTINCT(Activity.user))).scalar() or 0,
-        first_activity=first,
-        last_activity=last,
+        seconds=totals["seconds"],
+        activity_count=totals["activity_count"],
+        game_count=totals["game_count"],
+        platform_count=totals["platform_count"],
+        user_count=totals["user_count"],
+        first_activity=(
+            dt_to_ts(totals["first_activity"]) if totals["first_activity"] else None
+        ),
+        last_activity=(
+            dt_to_ts(totals["last_activity"]) if totals["last_activity"] else None
+        ),
     )
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, FastAPI
+import time
+
+from fastapi import APIRouter, Depends, FastAPI, Request
 from pydantic import BaseModel
 import uvicorn
 
 from tpbackend.__version__ import __version__
+from tpbackend.metrics import metrics_source, observe_request
+from tpbackend.storage import connection_scope
 from tpbackend.user.routes import router as user_router
 from tpbackend.game.routes import router as game_router
 from tpbackend.platform.routes import router as platform_router
@@ -21,9 +25,33 @@ class VersionInfo(BaseModel):
     version: str
 
 
+async def db_session():
+    """
+    One pooled connection per request, returned when the request is done.
+    Set up here (in the request's context) so the worker thread running
+    the route sees the same connection state.
+    """
+    with connection_scope():
+        yield
+
+
 def create_app():
     app = FastAPI(title="timeplayed", version=__version__)
-    api_router = APIRouter(prefix="/api")
+
+    @app.middleware("http")
+    async def metrics(request: Request, call_next):
+        started = time.monotonic()
+        status = 500
+        try:
+            # statements are attributed to the route, once the router has matched it
+            with metrics_source(request.scope):
+                response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            observe_request(request.scope, status, time.monotonic() - started)
+
+    api_router = APIRouter(prefix="/api", dependencies=[Depends(db_session)])
 
     api_router.include_router(misc_router)
     api_router.include_router(user_router)
@@ -0,0 +1,68 @@
+import pytest
+
+from tpbackend.storage import connection_scope, db
+
+# runs against the configured database (DB_HOST...), skipped if there is none
+TestClient = pytest.importorskip("fastapi.testclient").TestClient
+
+
+def database_available() -> bool:
+    try:
+        with connection_scope():
+            db.connect()
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not database_available(), reason="no database")
+
+
+@pytest.fixture
+def client():
+    from tpbackend.api.api import create_app
+
+    return TestClient(create_app())
+
+
+@pytest.fixture
+def count_queries(monkeypatch):
+    queries = []
+    execute_sql = db.execute_sql
+
+    def counting_execute_sql(sql, *args, **kwargs):
+        queries.append(sql)
+        return execute_sql(sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute_sql", counting_execute_sql)
+    return queries
+
+
+class TestQueryCount:
+    # the number of queries of a list endpoint should not depend on the page size (no N+1)
+    @pytest.mark.parametrize(
+        "endpoint",
+        [
+            "/api/activities",
+            "/api/games",
+            "/api/games-stats",
+            "/api/games-stats?after=1",
+            "/api/users",
+            "/api/users-stats",
+            "/api/users-stats?after=1",
+            "/api/platforms",
+            "/api/platforms-stats",
+            "/api/platforms-stats?after=1",
+        ],
+    )
+    def test_constant_queries(self, client, count_queries, endpoint):
+        counts = []
+        for limit in (1, 50):
+            count_queries.clear()
+            sep = "&" if "?" in endpoint else "?"
+            response = client.get(f"{endpoint}{sep}limit={limit}")
+            assert response.status_code == 200
+            if limit > 1 and len(response.json()) <= 1:
+                pytest.skip("not enough data")
+            counts.append(len(count_queries))
+        assert counts[0] == counts[1]
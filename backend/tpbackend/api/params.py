@@ -55,6 +55,14 @@ def query_ts(name: Literal["before", "after"]):
     )
 
 
+def query_overlaps():
+    return Query(
+        default=None,
+        description="Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window.",
+        json_schema_extra={"type": "string"},
+    )
+
+
 def query_search(name: str):
     return Query(
         default=None,
@@ -63,6 +71,14 @@ def query_search(name: str):
     )
 
 
+def query_rollup():
+    return Query(
+        default=False,
+        description="Include the activities of all child games",
+        json_schema_extra={"type": "boolean"},
+    )
+
+
 ################## PATH ###################
 
 
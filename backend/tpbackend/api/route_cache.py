@@ -0,0 +1,134 @@
+import functools
+import inspect
+import json
+import os
+from typing import cast
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from tpbackend.cache import (
+    cache_get,
+    cache_get_or_compute,
+    cache_set_tagged,
+    cache_tag_versions,
+)
+from tpbackend.utils2 import now
+
+CACHE_ROUTE_EX = int(os.environ.get("CACHE_ROUTE_EX", 60))
+# before in the past: nothing new can show up unless something is written, which invalidates it anyway
+CACHE_ROUTE_PAST_EX = int(os.environ.get("CACHE_ROUTE_PAST_EX", 86400))
+
+# path/query parameters holding user/game/platform ids
+ENTITY_PARAMS = {
+    f"{kind}{suffix}": kind
+    for kind in ("user", "game", "platform")
+    for suffix in ("", "s", "_id", "_ids")
+}
+
+# id lists where order and duplicates don't matter
+UNORDERED_PARAMS = {"users", "games", "platforms"}
+
+
+def cache_key(request: Request) -> str:
+    params = []
+    for name, value in sorted(request.query_params.multi_items()):
+        if name in UNORDERED_PARAMS:
+            value = ",".join(sorted(set(value.split(",")), key=lambda v: (len(v), v)))
+        params.append((name, value))
+    return f"route:{request.url.path}?{urlencode(params)}"
+
+
+def cache_tags(request: Request, kind: str | None) -> list[str]:
+    """
+    user:X, game:Y, platform:Z for the ids in the request, or global if there are none.
+    kind: tag of the entities the route returns (games, users...), their writes invalidate it
+    """
+    tags = set()
+    for name, value in [*request.path_params.items(), *request.query_params.items()]:
+        if name in ENTITY_PARAMS:
+            tags.update(
+                f"{ENTITY_PARAMS[name]}:{i}"
+                for i in str(value).split(",")
+                if i.isdigit()
+            )
+    if not tags:
+        tags.add("global")
+    if kind:
+        tags.add(kind)
+    return sorted(tags)
+
+
+def cache_ex(request: Request) -> int:
+    before = request.query_params.get("before", "")
+    if before.isdigit() and int(before) < now().timestamp() * 1000:
+        return CACHE_ROUTE_PAST_EX
+    return CACHE_ROUTE_EX
+
+
+def cached_response(value: str) -> Response:
+    headers, body = value.split("\n", 1)
+    return Response(
+        content=body, media_type="application/json", headers=json.loads(headers)
+    )
+
+
+def cached_route(kind: str | None = None, single_flight=False):
+    """
+    Caches the JSON response of a GET route, keyed on its path and query parameters.
+    Writes invalidate it by tag (see cache_tags(), CacheMixin and invalidate_activity_cache()),
+    a response computed while its tags were invalidated isn't cached.
+    Headers set on the route's response parameter are cached too.
+    single_flight: concurrent misses run the route once, for expensive ones
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        adapter = TypeAdapter(signature.return_annotation)
+
+        @functools.wraps(func)
+        def wrapper(*args, _cache_request: Request, **kwargs):
+            key = cache_key(_cache_request)
+            tags = cache_tags(_cache_request, kind)
+            versions = None
+
+            def compute() -> str:
+                nonlocal versions
+                # before reading anything, a write invalidating the tags from here on
+                # may not be in the result, so it isn't cached then
+                versions = cache_tag_versions(tags)
+                result = func(*args, **kwargs)
+                response = kwargs.get("response")
+                headers = (
+                    dict(response.headers) if isinstance(response, Response) else {}
+                )
+                body = adapter.dump_json(result, by_alias=True).decode()
+                return json.dumps(headers) + "\n" + body
+
+            def setter(key: str, value: str, ex: int):
+                cache_set_tagged(key, value, tags, ex=ex, versions=versions)
+
+            ex = cache_ex(_cache_request)
+            if single_flight:
+                value = cache_get_or_compute(key, compute, ex=ex, setter=setter)
+            else:
+                cached = cache_get(key)
+                if cached:
+                    return cached_response(cached.decode())
+                value = compute()
+                setter(key, value, ex=ex)
+            return cached_response(cast(str, value))
+
+        # FastAPI fills in the request from the signature
+        wrapper.__signature__ = signature.replace(  # type: ignore
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(
+                    "_cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+                ),
+            ]
+        )
+        return wrapper
+
+    return decorator
@@ -0,0 +1,133 @@
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from tpbackend import cache
+from tpbackend.api import route_cache
+from tpbackend.utils2 import now
+
+
+def make_request(path: str, query: str = "", path_params: dict | None = None):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [],
+            "path_params": path_params or {},
+        }
+    )
+
+
+@pytest.fixture
+def app(fake_redis):
+    app = FastAPI()
+    app.state.calls = []
+    app.state.during = None
+
+    @app.get("/api/games/{game_id}/things")
+    @route_cache.cached_route(kind="games")
+    def things(game_id: int, response: Response, users: str = "") -> list[int]:
+        app.state.calls.append(game_id)
+        if app.state.during:
+            app.state.during()
+        response.headers["X-Next-Cursor"] = f"cursor-{len(app.state.calls)}"
+        return [game_id, len(app.state.calls)]
+
+    return app
+
+
+class TestCacheKey:
+    def test_query_order_ignored(self):
+        a = make_request("/api/activities", "limit=10&user=1")
+        b = make_request("/api/activities", "user=1&limit=10")
+        assert route_cache.cache_key(a) == route_cache.cache_key(b)
+
+    def test_unordered_ids(self):
+        a = make_request("/api/activities", "users=10,2,2")
+        b = make_request("/api/activities", "users=2,10")
+        assert route_cache.cache_key(a) == route_cache.cache_key(b)
+        assert route_cache.cache_key(a) == "route:/api/activities?users=2%2C10"
+
+    def test_ordered_params_kept(self):
+        a = make_request("/api/activities", "sort=name,id")
+        b = make_request("/api/activities", "sort=id,name")
+        assert route_cache.cache_key(a) != route_cache.cache_key(b)
+
+    def test_path(self):
+        a = make_request("/api/games/1", "limit=10")
+        b = make_request("/api/games/2", "limit=10")
+        assert route_cache.cache_key(a) != route_cache.cache_key(b)
+
+
+class TestCacheTags:
+    def test_entity_ids(self):
+        request = make_request(
+            "/api/games/5/things", "users=1,2&platform_id=3", {"game_id": 5}
+        )
+        assert route_cache.cache_tags(request, "games") == [
+            "game:5",
+            "games",
+            "platform:3",
+            "user:1",
+            "user:2",
+        ]
+
+    def test_global_without_ids(self):
+        request = make_request("/api/activities", "limit=10&users=abc")
+        assert route_cache.cache_tags(request, None) == ["global"]
+        assert route_cache.cache_tags(request, "users") == ["global", "users"]
+
+
+class TestCacheEx:
+    def test_past_before(self):
+        before = int(now().timestamp() * 1000) - 60_000
+        request = make_request("/api/activities", f"before={before}")
+        assert route_cache.cache_ex(request) == route_cache.CACHE_ROUTE_PAST_EX
+
+    def test_future_or_no_before(self):
+        before = int(now().timestamp() * 1000) + 60_000
+        request = make_request("/api/activities", f"before={before}")
+        assert route_cache.cache_ex(request) == route_cache.CACHE_ROUTE_EX
+        request = make_request("/api/activities")
+        assert route_cache.cache_ex(request) == route_cache.CACHE_ROUTE_EX
+
+
+class TestCachedRoute:
+    def test_replays_body_and_headers(self, app):
+        client = TestClient(app)
+        first = client.get("/api/games/5/things?users=1")
+        second = client.get("/api/games/5/things?users=1")
+        assert app.state.calls == [5]
+        assert first.json() == second.json() == [5, 1]
+        assert first.headers["x-next-cursor"] == "cursor-1"
+        assert second.headers["x-next-cursor"] == "cursor-1"
+
+    def test_stored_with_tags_and_ttl(self, app, fake_redis):
+        before = int(now().timestamp() * 1000) - 60_000
+        TestClient(app).get(f"/api/games/5/things?before={before}")
+        key = f"route:/api/games/5/things?before={before}"
+        assert route_cache.CACHE_ROUTE_EX < fake_redis.ttl(key)
+        assert fake_redis.ttl(key) <= route_cache.CACHE_ROUTE_PAST_EX
+        assert fake_redis.smembers("tag:game:5") == {key.encode()}
+        assert fake_redis.smembers("tag:games") == {key.encode()}
+
+    def test_invalidated_by_tag(self, app):
+        client = TestClient(app)
+        client.get("/api/games/5/things?users=1")
+        client.get("/api/games/6/things")
+        cache.cache_invalidate(["user:1"])
+        assert client.get("/api/games/5/things?users=1").json() == [5, 3]
+        assert client.get("/api/games/6/things").json() == [6, 2]
+        assert app.state.calls == [5, 6, 5]
+
+    def test_invalidated_while_computing(self, app):
+        client = TestClient(app)
+        # a write to game 5 commits after the route read its data
+        app.state.during = lambda: cache.cache_invalidate(["game:5"])
+        assert client.get("/api/games/5/things").json() == [5, 1]
+        app.state.during = None
+        assert client.get("/api/games/5/things").json() == [5, 2]
+        assert client.get("/api/games/5/things").json() == [5, 2]
+        assert app.state.calls == [5, 5]
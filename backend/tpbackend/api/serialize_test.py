@@ -0,0 +1,150 @@
+import datetime
+
+import pytest
+
+from tpbackend.activity.models import API_Activity
+from tpbackend.game.models import API_Game, API_GameWithStats
+from tpbackend.platform.models import API_Platform, API_PlatformWithStats
+from tpbackend.storage import Activity, Game, Platform, User, db
+from tpbackend.user.models import API_User, API_UserWithStats
+
+# the serializers of the list endpoints, without a database (api_test.py covers the endpoints).
+# Every query is recorded and answered with no rows, so a lazy foreign key load fails loudly
+
+TIMESTAMP = datetime.datetime(2025, 3, 1, 12, 0, tzinfo=datetime.UTC)
+DATES = {"created": TIMESTAMP, "updated": TIMESTAMP}
+STATS = {
+    "total_seconds": 3600,
+    "activity_count": 2,
+    "first_activity": TIMESTAMP,
+    "last_activity": TIMESTAMP,
+}
+
+
+class EmptyCursor:
+    description: list = []
+    rowcount = 0
+    lastrowid = None
+
+    def fetchone(self):
+        return None
+
+    def fetchmany(self, size=None):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def __iter__(self):
+        return iter([])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    queries = []
+
+    def execute_sql(sql, *args, **kwargs):
+        queries.append(sql)
+        return EmptyCursor()
+
+    monkeypatch.setattr(db, "execute_sql", execute_sql)
+    return queries
+
+
+def activities(n: int) -> list[Activity]:
+    return [
+        Activity(
+            __no_default__=1,
+            id=i,
+            timestamp=TIMESTAMP,
+            seconds=60,
+            user=1,
+            game=2,
+            platform=3,
+            emulated=False,
+            **DATES,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def games(n: int) -> list[Game]:
+    return [
+        Game(
+            __no_default__=1,
+            id=i,
+            name=f"game {i}",
+            aliases=[],
+            parent=1 if i > 1 else None,
+            user_count=1,
+            platform_count=1,
+            **DATES,
+            **STATS,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def users(n: int) -> list[User]:
+    return [
+        User(
+            __no_default__=1,
+            id=i,
+            discord_id=str(i),
+            name=f"user {i}",
+            default_platform=1,
+            game_count=1,
+            platform_count=1,
+            **DATES,
+            **STATS,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def platforms(n: int) -> list[Platform]:
+    return [
+        Platform(
+            __no_default__=1,
+            id=i,
+            abbreviation=f"p{i}",
+            user_count=1,
+            game_count=1,
+            **DATES,
+            **STATS,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+SERIALIZERS = {
+    "activities": lambda n: [API_Activity.from_activity(a) for a in activities(n)],
+    "games": lambda n: API_Game.from_games(games(n)),
+    "games-stats": lambda n: API_GameWithStats.from_games(games(n)),
+    "users": lambda n: [API_User.from_user(u) for u in users(n)],
+    "users-stats": lambda n: [API_UserWithStats.from_user(u) for u in users(n)],
+    "platforms": lambda n: [API_Platform.from_platform(p) for p in platforms(n)],
+    "platforms-stats": lambda n: [
+        API_PlatformWithStats.from_platform(p) for p in platforms(n)
+    ],
+}
+
+
+class TestQueryCount:
+    # only the games query their children (all at once), the rest serialize loaded rows
+    @pytest.mark.parametrize("name", SERIALIZERS.keys())
+    def test_constant_queries(self, queries, name):
+        counts = []
+        for n in (1, 50):
+            queries.clear()
+            assert len(SERIALIZERS[name](n)) == n
+            counts.append(len(queries))
+        assert counts[0] == counts[1] == (1 if name.startswith("games") else 0)
+
+    def test_lazy_load_counted(self, queries):
+        with pytest.raises(User.DoesNotExist):
+            activities(1)[0].user
+        assert len(queries) == 1
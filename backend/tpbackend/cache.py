@@ -1,6 +1,14 @@
+import json
+import lzma
 import redis
+import zlib
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable
 
 logger = logging.getLogger("cache")
 
@@ -12,6 +20,35 @@ __CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
 __CACHE_DEFAULT_EX = int(os.environ.get("CACHE_DEFAULT_EX", 10))
 __CACHE_LOG_ENABLED = os.environ.get("CACHE_LOG_ENABLED", "false").lower() == "true"
 
+# in-process LRU in front of redis (0 = disabled)
+__L1_SIZE = int(os.environ.get("CACHE_L1_SIZE", 1000))
+# upper bound on how long an entry lives in L1, in case an invalidation is missed
+__L1_MAX_EX = int(os.environ.get("CACHE_L1_MAX_EX", 60))
+__L1_CHANNEL = "cache:invalidate"
+
+__L1: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+__L1_LOCK = threading.Lock()
+__L1_LISTENER = None
+# held while (re)starting the listener, see __l1_listening()
+__L1_START_LOCK = threading.Lock()
+# after failing to start it, seconds before trying again
+__L1_RETRY = 5
+__L1_RETRY_AT = 0.0
+
+# key -> [lock, number of callers using it], see single_flight()
+__FLIGHTS: dict[str, list] = {}
+__FLIGHTS_LOCK = threading.Lock()
+
+# values are stored as tag + compressed bytes when that is smaller,
+# plain values (never starting with a NUL byte) are read as they are
+__CODECS = {
+    "zlib": (b"\x00z", zlib.compress, zlib.decompress),
+    "lzma": (b"\x00x", lzma.compress, lzma.decompress),
+}
+__CODEC = os.environ.get("CACHE_CODEC", "zlib")  # or "none"
+__CODEC_MIN_SIZE = int(os.environ.get("CACHE_CODEC_MIN_SIZE", 1024))
+__CODEC_STATS = {"compressed": 0, "bytes_in": 0, "bytes_stored": 0}
+
 __STATS = {}
 
 
@@ -33,48 +70,440 @@ def __error(message: str):
     logger.error(message)
 
 
+def __encode(value: str | bytes) -> str | bytes:
+    if not isinstance(value, (str, bytes)) or len(value) < __CODEC_MIN_SIZE:
+        return value
+    if __CODEC not in __CODECS:
+        return value
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    tag, compress, _ = __CODECS[__CODEC]
+    encoded = tag + compress(data)
+    if len(encoded) >= len(data):
+        return value
+    __CODEC_STATS["compressed"] += 1
+    __CODEC_STATS["bytes_in"] += len(data)
+    __CODEC_STATS["bytes_stored"] += len(encoded)
+    return encoded
+
+
+def __decode(value: bytes) -> bytes:
+    if not value.startswith(b"\x00"):
+        return value
+    for tag, _, decompress in __CODECS.values():
+        if value.startswith(tag):
+            return decompress(value[len(tag) :])
+    raise ValueError(f"Unknown cache codec tag {value[:2]!r}")
+
+
 def get_cache_stats() -> str:
-    hits = sum(s["hit"] for s in __STATS.values())
-    misses = sum(s["miss"] for s in __STATS.values())
-    total = hits + misses
-    hit_rate = (hits / total * 100) if total > 0 else 0
-    stats = f"Cache stats: {total} total, {hits} hits, {misses} misses, hit rate: **{hit_rate:.2f}%**\n"
+    def line(s: dict) -> str:
+        hits = s["l1_hit"] + s["hit"]
+        total = hits + s["miss"]
+        hit_rate = (hits / total * 100) if total > 0 else 0
+        return f"{total} total, {s['l1_hit']} L1 hit, {s['hit']} redis hit, {s['miss']} miss, hit rate: **{hit_rate:.2f}%**"
+
+    totals = {k: sum(s[k] for s in __STATS.values()) for k in ("l1_hit", "hit", "miss")}
+    stats = f"Cache stats: {line(totals)}, L1 size: {len(__L1)}/{__L1_SIZE}\n"
     # sort origins by count desc
     sorted_stats = sorted(
-        __STATS.items(), key=lambda x: x[1]["hit"] + x[1]["miss"], reverse=True
+        __STATS.items(), key=lambda x: sum(x[1].values()), reverse=True
     )
     for src, s in sorted_stats:
-        src_total = s["hit"] + s["miss"]
-        src_hit_rate = (s["hit"] / src_total * 100) if src_total > 0 else 0
-        stats += f"- {src}: {src_total} total, {s['hit']} hit, {s['miss']} miss, hit rate: **{src_hit_rate:.2f}%**\n"
+        stats += f"- {src}: {line(s)}\n"
+    c = __CODEC_STATS
+    saved = c["bytes_in"] - c["bytes_stored"]
+    stats += f"Compressed ({__CODEC}): {c['compressed']} values, {c['bytes_in']} -> {c['bytes_stored']} bytes, **{saved}** bytes saved\n"
     return stats
 
 
+def get_codec_counters() -> dict[str, int]:
+    """
+    compressed (values), bytes_in (before compression), bytes_stored
+    """
+    return dict(__CODEC_STATS)
+
+
+def get_cache_counters() -> dict[str, dict[str, int]]:
+    """
+    l1_hit/hit/miss counts per key prefix
+    """
+    return {src: dict(s) for src, s in __STATS.items()}
+
+
+def __l1_get(key: str) -> bytes | None:
+    with __L1_LOCK:
+        entry = __L1.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del __L1[key]
+            return None
+        __L1.move_to_end(key)
+        return entry[1]
+
+
+def __l1_set(key: str, value: bytes, ex: int):
+    if ex <= 0:
+        return
+    with __L1_LOCK:
+        __L1[key] = (time.monotonic() + ex, value)
+        __L1.move_to_end(key)
+        while len(__L1) > __L1_SIZE:
+            __L1.popitem(last=False)
+
+
+def __l1_drop(keys: list[str]):
+    with __L1_LOCK:
+        for key in keys:
+            __L1.pop(key, None)
+
+
+def __l1_on_message(message):
+    __l1_drop(json.loads(message["data"]))
+
+
+def __l1_on_listener_error(e, pubsub, thread):
+    __error(f"Exception caught in cache invalidation listener: {e}")
+    thread.stop()
+    pubsub.close()
+    # may have missed invalidations
+    with __L1_LOCK:
+        __L1.clear()
+
+
+def __l1_listening() -> bool:
+    """
+    L1 is only safe to use while we hear invalidations from other workers.
+    (Re)starts the pub/sub listener if it isn't running. Never waits for that:
+    the other callers use redis only until it is up (or while redis is down)
+    """
+    global __L1_LISTENER, __L1_RETRY_AT
+    if __L1_LISTENER is not None and __L1_LISTENER.is_alive():
+        return True
+    if time.monotonic() < __L1_RETRY_AT:
+        return False
+    if not __L1_START_LOCK.acquire(blocking=False):
+        return False
+    try:
+        if __L1_LISTENER is not None and __L1_LISTENER.is_alive():
+            return True
+        try:
+            pubsub = __REDIS_CLIENT.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{__L1_CHANNEL: __l1_on_message})
+            listener = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=__l1_on_listener_error
+            )
+        except Exception as e:
+            __error(f"Exception caught starting cache invalidation listener: {e}")
+            __L1_RETRY_AT = time.monotonic() + __L1_RETRY
+            return False
+        # may have missed invalidations while it was down
+        with __L1_LOCK:
+            __L1.clear()
+        __L1_LISTENER = listener
+        return True
+    finally:
+        __L1_START_LOCK.release()
+
+
+def __publish_invalidation(pipe, keys: list[str]):
+    """
+    Tell all workers (including this one) to drop keys from their L1
+    """
+    __l1_drop(keys)
+    if __L1_SIZE > 0 and keys:
+        pipe.publish(__L1_CHANNEL, json.dumps(keys))
+
+
+def __source_stats(key: str) -> dict:
+    src = key.split(":")[0] if ":" in key else "unknown"
+    if src not in __STATS:
+        __STATS[src] = {
+            "l1_hit": 0,
+            "hit": 0,
+            "miss": 0,
+        }
+    return __STATS[src]
+
+
+def __l1_ex(ttl: int) -> int:
+    # ttl is -1 without expiry
+    return __L1_MAX_EX if ttl < 0 else min(ttl, __L1_MAX_EX)
+
+
 def cache_get(key: str):
     if __CACHE_ENABLED:
-        src = key.split(":")[0] if ":" in key else "unknown"
-        if src not in __STATS:
-            __STATS[src] = {
-                "hit": 0,
-                "miss": 0,
-            }
+        stats = __source_stats(key)
+        l1 = __L1_SIZE > 0 and __l1_listening()
+        if l1:
+            cached = __l1_get(key)
+            if cached is not None:
+                __log(f"L1 hit: {key}")
+                stats["l1_hit"] += 1
+                return cached
         try:
-            cached = __REDIS_CLIENT.get(key)
+            pipe = __REDIS_CLIENT.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            cached, ttl = pipe.execute()
             if cached:
+                cached = __decode(cached)
                 __log(f"Hit: {key}")
-                __STATS[src]["hit"] += 1
+                stats["hit"] += 1
+                if l1:
+                    __l1_set(key, cached, __l1_ex(ttl))
                 return cached
             __warn(f"Miss: {key}")
-            __STATS[src]["miss"] += 1
+            stats["miss"] += 1
         except Exception as e:
             __error(f"Exception caught getting cache for key {key}: {e}")
     return None
 
 
+def cache_get_many(keys: list[str]) -> list:
+    """
+    Like cache_get() for each key (None for misses), with one round trip for all keys not in L1
+    """
+    results = [None] * len(keys)
+    if not __CACHE_ENABLED or not keys:
+        return results
+    l1 = __L1_SIZE > 0 and __l1_listening()
+    missing = []
+    for i, key in enumerate(keys):
+        cached = __l1_get(key) if l1 else None
+        if cached is not None:
+            __source_stats(key)["l1_hit"] += 1
+            results[i] = cached
+        else:
+            missing.append(i)
+    if not missing:
+        return results
+    try:
+        pipe = __REDIS_CLIENT.pipeline(transaction=False)
+        pipe.mget([keys[i] for i in missing])
+        if l1:
+            for i in missing:
+                pipe.ttl(keys[i])
+        values, *ttls = pipe.execute()
+        for n, i in enumerate(missing):
+            stats = __source_stats(keys[i])
+            if values[n]:
+                stats["hit"] += 1
+                results[i] = __decode(values[n])
+                if l1:
+                    __l1_set(keys[i], results[i], __l1_ex(ttls[n]))
+            else:
+                stats["miss"] += 1
+        __log(f"Get many: {len(keys)} keys, {len(missing)} not in L1")
+    except Exception as e:
+        __error(f"Exception caught getting cache for {len(keys)} keys: {e}")
+    return results
+
+
 def cache_set(key: str, value: str, ex=__CACHE_DEFAULT_EX):
     if __CACHE_ENABLED:
         try:
-            __REDIS_CLIENT.set(key, value, ex=ex)
+            pipe = __REDIS_CLIENT.pipeline()
+            pipe.set(key, __encode(value), ex=ex)
+            __publish_invalidation(pipe, [key])
+            pipe.execute()
             __log(f"Set: {key} (expires in {ex} seconds)")
         except Exception as e:
             __error(f"Exception caught setting cache for key {key}: {e}")
+
+
+def cache_set_many(
+    values: dict[str, str], ex: int | dict[str, int] = __CACHE_DEFAULT_EX
+):
+    """
+    Like cache_set() for each key, in one round trip.
+    ex: for all keys, or per key
+    """
+    if __CACHE_ENABLED and values:
+        try:
+            pipe = __REDIS_CLIENT.pipeline(transaction=False)
+            for key, value in values.items():
+                pipe.set(
+                    key, __encode(value), ex=ex[key] if isinstance(ex, dict) else ex
+                )
+            __publish_invalidation(pipe, list(values))
+            pipe.execute()
+            __log(f"Set many: {len(values)} keys")
+        except Exception as e:
+            __error(f"Exception caught setting cache for {len(values)} keys: {e}")
+
+
+@contextmanager
+def single_flight(key: str, wait: float = 10.0, lock_ex: int = 30):
+    """
+    Only one caller at a time (across threads, and workers through a redis lock) runs the block for key,
+    the others wait for it. Gives up waiting after wait seconds in total and runs the block anyway.
+    Yields whether it waited its turn (False if it gave up, or without a cache).
+    See cache_get_or_compute()
+    """
+    if not __CACHE_ENABLED:
+        yield False
+        return
+    # one deadline for the local and the redis lock, not wait for each
+    deadline = time.monotonic() + wait
+    with __FLIGHTS_LOCK:
+        flight = __FLIGHTS.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    local = flight[0].acquire(timeout=wait)
+    remote = None
+    turn = local
+    try:
+        if local:
+            try:
+                # expires by itself if we die holding it
+                remote = __REDIS_CLIENT.lock(
+                    f"lock:{key}",
+                    timeout=lock_ex,
+                    blocking_timeout=max(deadline - time.monotonic(), 0),
+                    sleep=0.05,
+                )
+                if not remote.acquire():
+                    remote = None
+                    turn = False
+            except Exception as e:
+                # no redis, the local lock is all we can do
+                __error(f"Exception caught locking key {key}: {e}")
+                remote = None
+        yield turn
+    finally:
+        try:
+            if remote:
+                remote.release()
+        except Exception as e:
+            __error(f"Exception caught unlocking key {key}: {e}")
+        if local:
+            flight[0].release()
+        with __FLIGHTS_LOCK:
+            flight[1] -= 1
+            if flight[1] == 0:
+                del __FLIGHTS[key]
+
+
+def __peek(key: str):
+    # no stats or L1, for re-checking right after a counted miss
+    try:
+        cached = __REDIS_CLIENT.get(key)
+        return __decode(cached) if cached else None
+    except Exception as e:
+        __error(f"Exception caught getting cache for key {key}: {e}")
+        return None
+
+
+def cache_get_or_compute(
+    key: str,
+    compute: Callable[[], str | None],
+    ex=__CACHE_DEFAULT_EX,
+    setter: Callable | None = None,
+) -> str | None:
+    """
+    Cached value of key, or compute() it (and cache it, unless it is None).
+    Concurrent misses of the same key compute it once, the others get that result.
+    setter: instead of cache_set, called as setter(key, value, ex=ex)
+    """
+    cached = cache_get(key)
+    if cached:
+        return cached.decode("utf-8")
+    with single_flight(key) as turn:
+        # filled in while we were waiting for the lock?
+        # not if we gave up waiting, computing it is quicker than waiting any longer
+        cached = __peek(key) if turn else None
+        if cached:
+            return cached.decode("utf-8")
+        value = compute()
+        if value is not None:
+            (setter or cache_set)(key, value, ex=ex)
+        return value
+
+
+# tag sets outlive the keys in them, so invalidating a tag always finds its keys
+__CACHE_TAG_EX = int(os.environ.get("CACHE_TAG_EX", 86400))
+
+
+def __tag_version_keys(tags: list[str] | set[str]) -> list[str]:
+    return [f"tag_version:{tag}" for tag in tags]
+
+
+def cache_tag_versions(tags: list[str]) -> list | None:
+    """
+    Current versions of the tags, every cache_invalidate bumps them.
+    Read before computing a value, for cache_set_tagged(versions=...)
+    """
+    if __CACHE_ENABLED:
+        try:
+            return __REDIS_CLIENT.mget(__tag_version_keys(tags))
+        except Exception as e:
+            __error(f"Exception caught getting tag versions {tags}: {e}")
+    return None
+
+
+def cache_set_tagged(
+    key: str,
+    value: str,
+    tags: list[str],
+    ex=__CACHE_DEFAULT_EX,
+    versions: list | None = None,
+):
+    """
+    Like cache_set(), but also remembers the key under each tag,
+    so cache_invalidate(tags) can drop it before it expires.
+    versions (from cache_tag_versions): not set if a tag was invalidated since,
+    the value may have been computed from data that changed
+    """
+    if __CACHE_ENABLED:
+        try:
+            version_keys = __tag_version_keys(tags)
+
+            def set_tagged(pipe) -> bool:
+                if versions is not None and pipe.mget(version_keys) != versions:
+                    return False
+                pipe.multi()
+                pipe.set(key, __encode(value), ex=ex)
+                for tag in tags:
+                    pipe.sadd(f"tag:{tag}", key)
+                    pipe.expire(f"tag:{tag}", max(ex, __CACHE_TAG_EX))
+                __publish_invalidation(pipe, [key])
+                return True
+
+            # WATCH: an invalidation between the check and the set fails it (and the retry skips it)
+            watched = version_keys if versions is not None else []
+            if __REDIS_CLIENT.transaction(
+                set_tagged, *watched, value_from_callable=True
+            ):
+                __log(f"Set: {key} {tags} (expires in {ex} seconds)")
+            else:
+                __log(f"Not set, invalidated while computing: {key} {tags}")
+        except Exception as e:
+            __error(f"Exception caught setting cache for key {key}: {e}")
+
+
+def cache_invalidate(tags: list[str] | set[str]):
+    """
+    Deletes all keys set with any of the tags, and bumps their versions (see cache_tag_versions).
+    Atomic (WATCH/MULTI): a key tagged while reading the tags is read again, not dropped from its tag set
+    """
+    if __CACHE_ENABLED and tags:
+        try:
+            tag_keys = [f"tag:{tag}" for tag in tags]
+
+            def invalidate(pipe) -> list[str]:
+                keys = [key.decode() for key in pipe.sunion(*tag_keys)]
+                pipe.multi()
+                pipe.delete(*keys, *tag_keys)
+                for version_key in __tag_version_keys(tags):
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, __CACHE_TAG_EX)
+                __publish_invalidation(pipe, keys)
+                return keys
+
+            # retried if a tag set changed in between
+            keys = __REDIS_CLIENT.transaction(
+                invalidate, *tag_keys, value_from_callable=True
+            )
+            __log(f"Invalidated: {sorted(tags)} ({len(keys)} keys)")
+        except Exception as e:
+            __error(f"Exception caught invalidating cache for tags {tags}: {e}")
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+import redis
+
+from tpbackend import cache
+
+# the real one, the fake_redis fixture replaces it
+l1_listening = getattr(cache, "__l1_listening")
+
+
+class TestCacheGetMany:
+    def test_hits_and_misses(self, fake_redis):
+        fake_redis.set("a:1", b"one")
+        fake_redis.set("b:3", b"three")
+        assert cache.cache_get_many(["a:1", "a:2", "b:3"]) == [b"one", None, b"three"]
+        counters = cache.get_cache_counters()
+        assert counters["a"] == {"l1_hit": 0, "hit": 1, "miss": 1}
+        assert counters["b"] == {"l1_hit": 0, "hit": 1, "miss": 0}
+
+    def test_second_read_from_l1(self, fake_redis):
+        fake_redis.set("a:1", b"one", ex=30)
+        cache.cache_get_many(["a:1", "a:2"])
+        fake_redis.delete("a:1")  # not asked again
+        assert cache.cache_get_many(["a:1", "a:2"]) == [b"one", None]
+        assert cache.get_cache_counters()["a"] == {"l1_hit": 1, "hit": 1, "miss": 2}
+
+    def test_empty(self, fake_redis):
+        assert cache.cache_get_many([]) == []
+        assert cache.get_cache_counters() == {}
+
+
+class TestCacheSetMany:
+    def test_one_ttl(self, fake_redis):
+        cache.cache_set_many({"a:1": "one", "a:2": "two"}, ex=60)
+        assert fake_redis.mget(["a:1", "a:2"]) == [b"one", b"two"]
+        assert 0 < fake_redis.ttl("a:1") <= 60
+        assert 0 < fake_redis.ttl("a:2") <= 60
+
+    def test_ttl_per_key(self, fake_redis):
+        cache.cache_set_many({"a:1": "one", "a:2": "two"}, ex={"a:1": 60, "a:2": 600})
+        assert 0 < fake_redis.ttl("a:1") <= 60
+        assert 60 < fake_redis.ttl("a:2") <= 600
+
+    def test_round_trip(self, fake_redis):
+        cache.cache_set_many({"a:1": "one", "a:2": "two" * 1000})
+        assert cache.cache_get_many(["a:1", "a:2"]) == [b"one", b"two" * 1000]
+
+    def test_drops_stale_l1(self, fake_redis):
+        fake_redis.set("a:1", b"old", ex=30)
+        cache.cache_get_many(["a:1"])
+        cache.cache_set_many({"a:1": "new"})
+        assert cache.cache_get_many(["a:1"]) == [b"new"]
+
+
+class TestL1Listener:
+    def test_starts(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "__L1_LISTENER", None)
+        assert l1_listening()
+        listener = getattr(cache, "__L1_LISTENER")
+        assert listener.is_alive()
+        listener.stop()
+
+    def test_fails_open(self, fake_redis, monkeypatch):
+        def down(**kwargs):
+            raise ConnectionError("redis is down")
+
+        monkeypatch.setattr(fake_redis, "pubsub", down)
+        monkeypatch.setattr(cache, "__L1_LISTENER", None)
+        monkeypatch.setattr(cache, "__L1_RETRY_AT", 0.0)
+        assert not l1_listening()
+        # not tried again on every call
+        assert getattr(cache, "__L1_RETRY_AT") > time.monotonic()
+
+    def test_does_not_wait_for_another_start(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "__L1_LISTENER", None)
+        monkeypatch.setattr(cache, "__L1_RETRY_AT", 0.0)
+        # another thread is starting it
+        with getattr(cache, "__L1_START_LOCK"):
+            assert not l1_listening()
+
+
+class TestCacheInvalidate:
+    def test_drops_tagged_keys(self, fake_redis):
+        cache.cache_set_tagged("a:1", "one", ["user:1"])
+        cache.cache_set_tagged("a:2", "two", ["user:1", "game:2"])
+        cache.cache_set_tagged("a:3", "three", ["game:3"])
+        cache.cache_invalidate(["user:1"])
+        assert fake_redis.mget(["a:1", "a:2", "a:3"]) == [None, None, b"three"]
+        assert not fake_redis.exists("tag:user:1")
+
+    def test_key_tagged_meanwhile(self, fake_redis, monkeypatch):
+        cache.cache_set_tagged("a:1", "one", ["user:1"])
+        sunion = redis.client.Pipeline.sunion
+        calls = []
+
+        def tagged_meanwhile(pipe, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                # another worker caches a response between the read and the delete
+                cache.cache_set_tagged("a:2", "two", ["user:1"])
+            return sunion(pipe, *args)
+
+        monkeypatch.setattr(redis.client.Pipeline, "sunion", tagged_meanwhile)
+        cache.cache_invalidate(["user:1"])
+        # read again, a:2 is dropped too instead of losing its tag
+        assert len(calls) == 2
+        assert fake_redis.mget(["a:1", "a:2"]) == [None, None]
+
+    def test_set_skipped_if_invalidated_meanwhile(self, fake_redis):
+        versions = cache.cache_tag_versions(["user:1", "game:2"])
+        cache.cache_set_tagged("a:1", "one", ["user:1"], versions=versions[:1])
+        cache.cache_invalidate(["game:2"])
+        # computed before the invalidation
+        cache.cache_set_tagged("a:2", "two", ["user:1", "game:2"], versions=versions)
+        assert fake_redis.mget(["a:1", "a:2"]) == [b"one", None]
+        assert fake_redis.smembers("tag:user:1") == {b"a:1"}
+
+    def test_invalidated_between_check_and_set(self, fake_redis, monkeypatch):
+        versions = cache.cache_tag_versions(["user:1"])
+        mget = redis.client.Pipeline.mget
+        calls = []
+
+        def invalidated_meanwhile(pipe, *args):
+            calls.append(args)
+            result = mget(pipe, *args)
+            if len(calls) == 1:
+                cache.cache_invalidate(["user:1"])
+            return result
+
+        monkeypatch.setattr(redis.client.Pipeline, "mget", invalidated_meanwhile)
+        cache.cache_set_tagged("a:1", "one", ["user:1"], versions=versions)
+        # the WATCH failed the first try, the retry sees the new version
+        assert len(calls) == 2
+        assert fake_redis.get("a:1") is None
+
+
+class FakeLock:
+    """
+    redis-py's Lock releases with a Lua script, fakeredis can't run those (without lupa)
+    """
+
+    locks: dict[str, threading.Lock] = {}
+
+    def __init__(self, name, timeout=None, blocking_timeout=None, sleep=None):
+        self.lock = FakeLock.locks.setdefault(name, threading.Lock())
+        self.blocking_timeout = blocking_timeout
+
+    def acquire(self):
+        return self.lock.acquire(timeout=self.blocking_timeout)
+
+    def release(self):
+        self.lock.release()
+
+
+@pytest.fixture
+def fake_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(fake_redis, "lock", FakeLock)
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_compute_once(self, fake_lock):
+        computed = []
+        results = []
+        start = threading.Barrier(8)
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        def get():
+            start.wait()
+            results.append(cache.cache_get_or_compute("sf:1", compute, ex=60))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(computed) == 1
+        assert results == ["value"] * 8
+        assert getattr(cache, "__FLIGHTS") == {}
+
+    def test_none_is_not_cached(self, fake_lock, fake_redis):
+        assert cache.cache_get_or_compute("sf:2", lambda: None) is None
+        assert not fake_redis.exists("sf:2")
+        assert cache.cache_get_or_compute("sf:2", lambda: "late") == "late"
+
+    def test_gives_up_waiting(self, fake_lock):
+        ran = []
+
+        def waiter():
+            with cache.single_flight("sf:3", wait=0.05):
+                ran.append(1)
+
+        with cache.single_flight("sf:3"):
+            t = threading.Thread(target=waiter)
+            t.start()
+            t.join(timeout=5)
+            # while the holder is still running its block
+            assert ran == [1]
+        assert getattr(cache, "__FLIGHTS") == {}
+
+    def test_one_deadline_for_both_locks(self, fake_lock):
+        other_worker = FakeLock.locks.setdefault("lock:sf:4", threading.Lock())
+        other_worker.acquire()
+        entered = threading.Event()
+        turns = []
+
+        def holder():
+            # this worker's first caller: local lock, gives up on the redis one
+            with cache.single_flight("sf:4", wait=0.1) as turn:
+                turns.append(turn)
+                entered.set()
+                time.sleep(0.4)
+
+        t = threading.Thread(target=holder)
+        t.start()
+        try:
+            entered.wait(timeout=5)
+            started = time.monotonic()
+            # 0.4 s for the local lock leaves 0.1 s for the redis one
+            with cache.single_flight("sf:4", wait=0.5) as turn:
+                turns.append(turn)
+                waited = time.monotonic() - started
+        finally:
+            t.join(timeout=5)
+            other_worker.release()
+        assert turns == [False, False]
+        assert waited < 0.75
+        assert getattr(cache, "__FLIGHTS") == {}
+
+    def test_gave_up_computes_without_peeking(self, fake_lock, fake_redis, monkeypatch):
+        @contextmanager
+        def gave_up(key):
+            # a value shows up while waiting, then the wait times out
+            fake_redis.set("sf:5", "late")
+            yield False
+
+        monkeypatch.setattr(cache, "single_flight", gave_up)
+        assert cache.cache_get_or_compute("sf:5", lambda: "fresh") == "fresh"
+
+
+class TestCompression:
+    def test_large_values_compressed(self, fake_redis):
+        value = '{"name": "wow"}' * 1000
+        cache.cache_set("c:1", value)
+        stored = fake_redis.get("c:1")
+        assert stored.startswith(b"\x00z")
+        assert len(stored) < len(value)
+        assert cache.cache_get("c:1") == value.encode()
+
+    @pytest.mark.parametrize("codec, tag", [("zlib", b"\x00z"), ("lzma", b"\x00x")])
+    def test_round_trip(self, fake_redis, monkeypatch, codec, tag):
+        monkeypatch.setattr(cache, "__CODEC", codec)
+        value = "abc" * 1000
+        cache.cache_set_tagged("c:2", value, ["user:1"])
+        assert fake_redis.get("c:2").startswith(tag)
+        assert cache.cache_get("c:2") == value.encode()
+        # read with another codec configured
+        monkeypatch.setattr(cache, "__CODEC", "none")
+        assert cache.cache_get("c:2") == value.encode()
+
+    def test_small_values_plain(self, fake_redis):
+        cache.cache_set("c:3", "small")
+        assert fake_redis.get("c:3") == b"small"
+        assert cache.cache_get("c:3") == b"small"
+
+    def test_incompressible_values_plain(self, fake_redis):
+        # plain values never start with a NUL byte
+        value = b"\x01" + os.urandom(4095)
+        cache.cache_set("c:4", value)  # type: ignore
+        assert fake_redis.get("c:4") == value
+        assert cache.cache_get("c:4") == value
+
+    def test_codec_none(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "__CODEC", "none")
+        value = "abc" * 1000
+        cache.cache_set("c:5", value)
+        assert fake_redis.get("c:5") == value.encode()
+
+    def test_counters(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(
+            cache, "__CODEC_STATS", {"compressed": 0, "bytes_in": 0, "bytes_stored": 0}
+        )
+        cache.cache_set("c:6", "abc" * 1000)
+        cache.cache_set("c:7", "small")
+        counters = cache.get_codec_counters()
+        assert counters["compressed"] == 1
+        assert counters["bytes_in"] == 3000
+        assert counters["bytes_stored"] == len(fake_redis.get("c:6"))
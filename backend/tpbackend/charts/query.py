@@ -0,0 +1,37 @@
+import datetime
+
+from peewee import fn
+
+from tpbackend.storage import ActivityDaily, User, Game, Platform
+
+
+class ActivityDailyQuery:
+    @staticmethod
+    def base():
+        return (
+            ActivityDaily.select(
+                ActivityDaily.day, fn.SUM(ActivityDaily.seconds).alias("seconds")
+            )
+            .group_by(ActivityDaily.day)
+            .order_by(ActivityDaily.day)
+        )
+
+    @staticmethod
+    def user(query, user: int | User):
+        return query.where(ActivityDaily.user == user)  # type: ignore
+
+    @staticmethod
+    def game(query, game: int | Game):
+        return query.where(ActivityDaily.game == game)  # type: ignore
+
+    @staticmethod
+    def platform(query, platform: int | Platform):
+        return query.where(ActivityDaily.platform == platform)  # type: ignore
+
+    @staticmethod
+    def before(query, day: datetime.date):
+        return query.where(ActivityDaily.day < day)  # type: ignore
+
+    @staticmethod
+    def after(query, day: datetime.date):
+        return query.where(ActivityDaily.day >= day)  # type: ignore
@@ -2,11 +2,14 @@ import datetime
 from typing import cast
 from fastapi import APIRouter
 from tpbackend.activity.query import ActivityQuery
+from tpbackend.api.route_cache import cached_route
 from tpbackend.api.params import query_id, query_ts
 from tpbackend.charts.models import PlaytimeChart
+from tpbackend.charts.query import ActivityDailyQuery
 from tpbackend.storage import (
     Activity,
 )
+from tpbackend.utils2 import split_by_day, validateTS
 import logging
 
 
@@ -16,7 +19,23 @@ router = APIRouter()
 # TODO, get rid of this file? move it somewhere else?
 
 
+def utc_datetime(ts: int | None) -> datetime.datetime | None:
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts / 1000, datetime.timezone.utc)
+
+
+def midnight(ts: int | None) -> datetime.date | None:
+    """
+    Returns the UTC date if ts (ms) is exactly on a UTC midnight
+    """
+    if ts is None or ts % 86400000 != 0:
+        return None
+    return cast(datetime.datetime, utc_datetime(ts)).date()
+
+
 @router.get("/playtime/by_day", tags=["charts"], response_model=PlaytimeChart)
+@cached_route()
 def get_playtime_by_day(
     user=query_id("user"),
     game=query_id("game"),
@@ -24,58 +43,51 @@ def get_playtime_by_day(
     before=query_ts("before"),
     after=query_ts("after"),
 ) -> PlaytimeChart:
-    query = ActivityQuery.base()
-
-    if user:
-        query = ActivityQuery.user(query, user)
-    if game:
-        query = ActivityQuery.game(query, game)
-    if platform:
-        query = ActivityQuery.platform(query, platform)
-    if before:
-        query = ActivityQuery.before(query, before)
-    if after:
-        query = ActivityQuery.after(query, after)
+    """
+    Seconds played per UTC day during [after, before), activities are cut at the bounds.
+    before/after on UTC midnights (or none at all) are answered from the daily rollup,
+    anything else is computed from the activities. Days without playtime are left out
+    """
+    before, after = validateTS(before), validateTS(after)
+    before_day, after_day = midnight(before), midnight(after)
 
     daily_seconds: dict[datetime.date, int] = {}
-    for activity in query:
-        activity = cast(Activity, activity)
-        end_time = activity.get_datetime()
-        start_time = end_time - datetime.timedelta(seconds=activity.get_seconds())
-
-        start_date = start_time.date()
-        end_date = end_time.date()
-
-        if start_date == end_date:
-            daily_seconds[start_date] = (  # type: ignore
-                daily_seconds.get(start_date, 0) + activity.seconds
+    if (before is None or before_day) and (after is None or after_day):
+        query = ActivityDailyQuery.base()
+        if user:
+            query = ActivityDailyQuery.user(query, user)
+        if game:
+            query = ActivityDailyQuery.game(query, game)
+        if platform:
+            query = ActivityDailyQuery.platform(query, platform)
+        if before_day:
+            query = ActivityDailyQuery.before(query, before_day)
+        if after_day:
+            query = ActivityDailyQuery.after(query, after_day)
+        for day, seconds in query.tuples():
+            daily_seconds[day] = seconds
+    else:
+        query = ActivityQuery.base()
+        if user:
+            query = ActivityQuery.user(query, user)
+        if game:
+            query = ActivityQuery.game(query, game)
+        if platform:
+            query = ActivityQuery.platform(query, platform)
+        after_dt = utc_datetime(after)
+        before_dt = utc_datetime(before)
+        # played at least partly during [after, before)
+        query = ActivityQuery.overlaps(query, after_dt, before_dt)
+        for activity in query:
+            activity = cast(Activity, activity)
+            days = split_by_day(
+                activity.get_datetime(), activity.get_seconds(), after_dt, before_dt
             )
-        else:
-            current_date = start_date
-            while current_date <= end_date:
-                if current_date == start_date:
-                    next_midnight = datetime.datetime.combine(
-                        current_date + datetime.timedelta(days=1),
-                        datetime.time.min,
-                        tzinfo=datetime.timezone.utc,
-                    )
-                    day_seconds = round((next_midnight - start_time).total_seconds())
-                elif current_date == end_date:
-                    this_midnight = datetime.datetime.combine(
-                        current_date,
-                        datetime.time.min,
-                        tzinfo=datetime.timezone.utc,
-                    )
-                    day_seconds = round((end_time - this_midnight).total_seconds())
-                else:
-                    day_seconds = 86400
-                daily_seconds[current_date] = (
-                    daily_seconds.get(current_date, 0) + day_seconds
-                )
-                current_date += datetime.timedelta(days=1)
+            for day, seconds in days.items():
+                daily_seconds[day] = daily_seconds.get(day, 0) + seconds
 
     data = {"labels": [], "datasets": [{"label": "Playtime (seconds)", "data": []}]}
-    for date in sorted(daily_seconds.keys()):
+    for date in sorted(day for day, seconds in daily_seconds.items() if seconds):
         data["labels"].append(date.strftime("%Y-%m-%d"))
         data["datasets"][0]["data"].append(daily_seconds[date])
     return PlaytimeChart.parse_obj(data)
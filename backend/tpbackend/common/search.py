@@ -0,0 +1,28 @@
+from peewee import Expression, Field, fn
+
+
+def normalize_search(search: str | None) -> str:
+    if not search:
+        return ""
+    return search.strip().lower()
+
+
+def search_where(column: Field, search: str):
+    """
+    Substring match, or close enough (pg_trgm word similarity) to allow typos.
+    Both use the gin_trgm_ops index on the search column (evolution 8).
+    """
+    # <% = word_similarity(search, column) > pg_trgm.word_similarity_threshold
+    # (%% because psycopg2 would treat a single % as a placeholder)
+    return column.contains(search) | Expression(search, "<%%", column)
+
+
+def search_rank(column: Field, search: str) -> list:
+    """
+    Order by for best match first: how well the term matches any part of the column,
+    then how much of the column it covers (so 'zelda' ranks 'Zelda' above 'Zelda II')
+    """
+    return [
+        fn.word_similarity(search, column).desc(),
+        fn.similarity(column, search).desc(),
+    ]
@@ -0,0 +1,21 @@
+from collections import OrderedDict
+
+import pytest
+
+from tpbackend import cache
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    The cache against an in-memory redis, with an empty L1 and stats
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, "__REDIS_CLIENT", client)
+    monkeypatch.setattr(cache, "__CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "__L1", OrderedDict())
+    monkeypatch.setattr(cache, "__STATS", {})
+    # no pub/sub listener thread, invalidations are published but not heard
+    monkeypatch.setattr(cache, "__l1_listening", lambda: True)
+    return client
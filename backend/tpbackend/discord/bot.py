@@ -1,9 +1,15 @@
+import asyncio
+import itertools
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from typing import cast
 import discord
 from tpbackend.permissions import PERMISSION_COMMANDS, PERMISSION_DEVELOPER
-from tpbackend.storage import User, DiscordHistory
+from tpbackend.storage import User, DiscordHistory, connection_scope
 from tpbackend.globals import DEBUG
+from tpbackend.metrics import DISCORD_COMMAND_SECONDS, metrics_source, timed
 
 from .command_list import REGULAR_COMMANDS, ADMIN_COMMANDS
 from .commands.help import HelpCommand
@@ -20,7 +26,21 @@ intents.members = True
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-__CMD = 0
+__CMD = itertools.count(1)
+
+# commands run in these threads, the event loop (gateway heartbeat, API, sync) is never blocked
+DISCORD_COMMAND_WORKERS = int(os.environ.get("DISCORD_COMMAND_WORKERS", 4))
+# "still working" reply after this many seconds
+DISCORD_COMMAND_SLOW = float(os.environ.get("DISCORD_COMMAND_SLOW", 3))
+# stop waiting for a command after this many seconds (the thread can't be stopped, it finishes on its own)
+DISCORD_COMMAND_TIMEOUT = float(os.environ.get("DISCORD_COMMAND_TIMEOUT", 120))
+
+_executor = ThreadPoolExecutor(
+    max_workers=DISCORD_COMMAND_WORKERS, thread_name_prefix="discord-command"
+)
+# one command at a time per Discord user, in the order they were sent
+_user_locks: dict[int, asyncio.Lock] = {}
+_user_queued: dict[int, int] = {}
 
 
 def get_discord_user(id: int | str) -> discord.User | None:
@@ -55,17 +75,17 @@ def user_from_message(message: discord.Message) -> User | None:
 
 
 def dm_receive(message: discord.Message) -> str | None:
-    global __CMD
-    __CMD += 1
+    # several run at once, in the command threads
+    cmd = next(__CMD)
 
     def _info(msg: str):
-        logger.info("[CMD#%s] %s", __CMD, msg)
+        logger.info("[CMD#%s] %s", cmd, msg)
 
     def _warn(msg: str):
-        logger.warning("[CMD#%s] %s", __CMD, msg)
+        logger.warning("[CMD#%s] %s", cmd, msg)
 
     def _err(msg: str):
-        logger.error("[CMD#%s] %s", __CMD, msg)
+        logger.error("[CMD#%s] %s", cmd, msg)
 
     def _ret(reply: str | None) -> str | None:
         if reply:
@@ -122,7 +142,12 @@ def dm_receive(message: discord.Message) -> str | None:
             if in_cmd == n and c.can_execute(user, body):
                 try:
                     _info(f"Executing command `{n}` with body `{body}`")
-                    return _ret(c.execute(user, body))
+                    command = c.names[0]
+                    with metrics_source(f"discord:{command}"), timed(
+                        DISCORD_COMMAND_SECONDS, command=command
+                    ):
+                        reply = c.execute(user, body)
+                    return _ret(reply)
                 except Exception as e:
                     _err(f"Exception while executing command: {e}")
                     return _ret(f"Error. Maybe `!help {n}` can... help")
@@ -130,6 +155,54 @@ def dm_receive(message: discord.Message) -> str | None:
     return _ret("Unknown command. Use `!help` to see available commands.")
 
 
+def dm_receive_scoped(message: discord.Message) -> str | None:
+    with connection_scope():
+        return dm_receive(message)
+
+
+@asynccontextmanager
+async def user_turn(user_id: int):
+    """
+    Waits for the user's previous commands (asyncio.Lock is FIFO)
+    """
+    lock = _user_locks.setdefault(user_id, asyncio.Lock())
+    _user_queued[user_id] = _user_queued.get(user_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _user_queued[user_id] -= 1
+        if not _user_queued[user_id]:
+            del _user_queued[user_id]
+            del _user_locks[user_id]
+
+
+async def run_command(message: discord.Message) -> str | None:
+    """
+    Runs dm_receive in a command thread.
+    Tells the user when it is slow, gives up waiting on it after DISCORD_COMMAND_TIMEOUT
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, dm_receive_scoped, message)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), DISCORD_COMMAND_SLOW)
+    except TimeoutError:
+        pass
+    await message.author.send("Still working on it…", reference=message)
+    try:
+        return await asyncio.wait_for(
+            future, max(DISCORD_COMMAND_TIMEOUT - DISCORD_COMMAND_SLOW, 0)
+        )
+    except TimeoutError:
+        logger.error(
+            "Command from %s timed out after %ss: %s",
+            message.author,
+            DISCORD_COMMAND_TIMEOUT,
+            message.content,
+        )
+        return "That took too long, gave up waiting. It may still finish, check before retrying."
+
+
 @bot.event
 async def on_guild_available(guild: discord.Guild):
     logger.info("Server %s available", guild)
@@ -148,8 +221,10 @@ async def on_message(message: discord.Message):
         # Ignore messages in channels
         return
 
-    reply = dm_receive(message)
-    if not reply:
-        return
+    # nothing is awaited before queueing up, so the user's commands keep their order
+    async with user_turn(message.author.id):
+        reply = await run_command(message)
+        if not reply:
+            return
 
-    await message.author.send(reply, reference=message)
+        await message.author.send(reply, reference=message)
@@ -8,11 +8,13 @@ from .commands.delete_platform import DeletePlatformCommand
 from .commands.emulated import ToggleEmulatedCommand
 from .commands.get_activity import GetActivityCommand
 from .commands.get_cache_stats import GetCacheStats
+from .commands.get_db_stats import GetDbStats
 from .commands.get_game import GetGameCommand
 from .commands.last import LastActivityCommand
 from .commands.permission_add import AddPermissionCommand
 from .commands.permission_remove import RemovePermissionCommand
 from .commands.refresh_search import RefreshSearch
+from .commands.reconcile_stats import ReconcileStatsCommand
 from .commands.search_games import SearchGamesCommand
 from .commands.set_default_platform import SetDefaultPlatformCommand
 from .commands.set_game import SetGameCommand
@@ -52,6 +54,7 @@ from .commands.set_platform_icon import SetPlatformIconCommand
 from .commands.hide_game import HideGameCommand
 from .commands.set_parent import SetParentCommand
 from .commands.igdb_search import SearchIGDBCommand
+from .commands.dead_letters_admin import DeadLettersAdminCommand
 
 REGULAR_COMMANDS = [
     # HelpCommand(), # circular import
@@ -123,7 +126,10 @@ ADMIN_COMMANDS = [
     MissingCoverAdminCommand(),
     MissingGRYAdminCommand(),
     GetCacheStats(),
+    GetDbStats(),
     RefreshSearch(),
+    ReconcileStatsCommand(),
+    DeadLettersAdminCommand(),
 ]
 
 used = set()
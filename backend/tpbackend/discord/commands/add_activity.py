@@ -1,10 +1,10 @@
-from typing import cast
+import datetime
 from tpbackend.activity.query import ActivityQuery
 from tpbackend.activity.utils import md_activity_link
 from tpbackend.game.query import GameQuery
 from tpbackend.game.select import GameSelect
 from tpbackend.discord.commands.manual_activity_command import ManualActivityCommand
-from tpbackend.storage import Platform, User
+from tpbackend.storage import User
 from tpbackend.storage import Game
 from tpbackend.operations import (
     add_session,
@@ -95,12 +95,13 @@ Returns: Confirmation message
         return self.add(user=user, game=game, seconds=seconds)
 
     def get_overlapping(self, user_id: int, seconds: int) -> bool:
-        after_ts = (now().timestamp() * 1000) - (seconds * 1000)
-        after_ts = int(after_ts)
+        # the new activity would end now
+        end = now()
+        start = end - datetime.timedelta(seconds=seconds)
         query = ActivityQuery.base()
         query = ActivityQuery.user(query, user_id)
-        query = ActivityQuery.after(query, after_ts)
-        return ActivityQuery.count(query) > 0
+        query = ActivityQuery.overlaps(query, start, end)
+        return query.exists()
 
     def add(self, user: User, game: Game, seconds: int) -> str:
         timestamp = now()
@@ -110,8 +111,6 @@ Returns: Confirmation message
         if not platform:
             self.logger.debug("No last platform found, using default")
             platform = user.get_default_platform()
-        platform = Platform.get_by_id(platform.id)
-        platform = cast(Platform, platform)
 
         result = add_session(
             user=user,
@@ -119,6 +118,7 @@ Returns: Confirmation message
             seconds=seconds,
             timestamp=timestamp,
             platform=platform,
+            source="manual add command",
         )
         sesh = result[0]
         if sesh:
@@ -129,8 +129,5 @@ Returns: Confirmation message
             msg += f"- Date: {formatted_dt}\n"
             msg += f"- Platform: {display_name(sesh.get_platform())}\n"
 
-            sesh.add_history("Activity source: manual add command")
-            sesh.save()
-
             return msg.strip()
         return f"ERROR: {result[1]}"
@@ -0,0 +1,75 @@
+from typing import cast
+
+from tpbackend.storage import OblivionisDeadLetter, User
+from tpbackend.utils2 import js_iso
+from .admin_command import AdminCommand
+
+
+class DeadLettersAdminCommand(AdminCommand):
+    def __init__(self):
+        names = ["adm_dead_letters", "adm_dl"]
+        d = "Inspect and retry Oblivionis activities that failed to sync"
+        h = (
+            "Usage: `!adm_dead_letters` lists failing activities, dead ones were given up on. "
+            "`!adm_dead_letters retry <oblivionis_id>` syncs them again (comma separated ids, or `all` for every dead one). "
+            "`!adm_dead_letters delete <oblivionis_id>` drops them (comma separated ids)."
+        )
+        super().__init__(names=names, description=d, help=h)
+
+    def execute(self, user: User, msg: str) -> str:
+        splitted = msg.strip().split(" ", 1)
+        action = splitted[0].strip().lower()
+        arg = splitted[1].strip() if len(splitted) > 1 else ""
+        if action == "":
+            return self.list_letters()
+        if action not in ("retry", "delete") or arg == "":
+            return f"Invalid syntax. See `!help {self.names[0]}` for help."
+        if action == "retry" and arg.lower() == "all":
+            return self.retry(None)
+        try:
+            ids = [int(i.strip()) for i in arg.split(",")]
+        except ValueError:
+            return f"Invalid syntax. See `!help {self.names[0]}` for help."
+        if action == "retry":
+            return self.retry(ids)
+        deleted = (
+            OblivionisDeadLetter.delete()
+            .where(OblivionisDeadLetter.oblivionis_id.in_(ids))  # type: ignore
+            .execute()
+        )
+        return f"Deleted {deleted} dead letters"
+
+    def list_letters(self) -> str:
+        letters = list(
+            OblivionisDeadLetter.select().order_by(
+                OblivionisDeadLetter.last_failed.desc()  # type: ignore
+            )
+        )
+        if len(letters) == 0:
+            return "No failed Oblivionis activities! 🥳"
+        out = ""
+        count = 0
+        for letter in letters:
+            letter = cast(OblivionisDeadLetter, letter)
+            count += 1
+            status = "dead" if letter.dead else "retrying"
+            out += (
+                f"- **{letter.oblivionis_id}** ({status}, {letter.attempts} attempts, last {js_iso(letter.last_failed)}): "
+                f"{letter.discord_user_name} / {letter.game_name} / {letter.platform} / {letter.seconds}s - `{letter.error}`\n"
+            )
+            if count > 20 or len(out) > 1337:
+                out += f"... and {len(letters) - count} more\n"
+                break
+        return out
+
+    def retry(self, ids: list[int] | None) -> str:
+        # imported here, the sync imports the bot
+        from tpbackend.oblivionis.sync import retry_dead_letters
+
+        results = retry_dead_letters(ids)
+        if len(results) == 0:
+            return "Nothing to retry"
+        out = ""
+        for oblivionis_id, error in results.items():
+            out += f"- {oblivionis_id}: {'synced' if error is None else f'failed: `{error}`'}\n"
+        return out.strip()
@@ -0,0 +1,11 @@
+from tpbackend.storage import User, get_db_stats
+from .admin_command import AdminCommand
+
+
+class GetDbStats(AdminCommand):
+    def __init__(self):
+        names = ["get_db_stats", "gdbs"]
+        super().__init__(names=names, description="Get DB connection pool stats")
+
+    def execute(self, user: User, msg: str) -> str:
+        return get_db_stats()
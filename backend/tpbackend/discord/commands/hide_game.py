@@ -25,13 +25,14 @@ class HideGameCommand(AdminCommand):
         """
         Update hidden state of activities for game
         """
-        activities = Activity.select().where(Activity.game == game)
-        changed = 0
+        hidden = game.get_hidden()
+        activities = Activity.select().where(
+            (Activity.game == game) & (Activity.hidden != hidden)
+        )
+        changed = []
         for activity in activities:
             activity = cast(Activity, activity)
-            if activity.get_hidden() == game.get_hidden():
-                continue
-            activity.set_hidden(game.get_hidden())
-            activity.save()
-            changed += 1
-        return changed
+            activity.set_hidden(hidden)
+            changed.append(activity)
+        Activity.bulk_save(changed, [Activity.hidden])
+        return len(changed)
@@ -1,3 +1,4 @@
+from peewee import fn
 from tpbackend.storage import User, Game
 from .admin_command import AdminCommand
 from typing import cast
@@ -10,12 +11,14 @@ class MissingCoverAdminCommand(AdminCommand):
         super().__init__(names=names, description=d)
 
     def execute(self, user: User, msg: str) -> str:
-        missing = []
-        for game in Game.select():
-            game = cast(Game, game)
-            if game.has_cover_art():
-                continue
-            missing.append(game)
+        # same as not has_cover_art(), in one query
+        missing = list(
+            Game.select().where(
+                (fn.COALESCE(Game.effective_image_url, "") == "")
+                & (fn.COALESCE(Game.effective_sgdb_id, 0) == 0)
+                & (fn.COALESCE(Game.effective_igdb_id, 0) == 0)
+            )
+        )
 
         if len(missing) == 0:
             return "All games have cover art! :D"
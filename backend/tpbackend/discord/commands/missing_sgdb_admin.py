@@ -10,11 +10,7 @@ class MissingSGDBAdminCommand(AdminCommand):
         super().__init__(names=names, description=d)
 
     def execute(self, user: User, msg: str) -> str:
-        missing = []
-        for game in Game.select():
-            game = cast(Game, game)
-            if game.get_sgdb_id() is None:
-                missing.append(game)
+        missing = list(Game.select().where(Game.effective_sgdb_id.is_null()))
 
         if len(missing) == 0:
             return "All games have SGDB id! 🥳"
@@ -2,8 +2,7 @@ from typing import Optional
 
 from tpbackend.game.select import GameSelect
 from .command import Command
-from .set_game import set_game_actually
-from tpbackend.storage import Activity, User
+from tpbackend.storage import Activity, Game, User
 
 
 def execute_move_game(
@@ -39,7 +38,8 @@ def execute_move_game(
     if user_filter is not None:
         where_clause.append(Activity.user == user_filter)  # type: ignore
 
-    activities = list(Activity.select().where(*where_clause))  # type: ignore
+    # with the game joined, so set_game doesn't lazy load it for every activity
+    activities = list(Activity.select(Activity, Game).join(Game).where(*where_clause))  # type: ignore
     if not activities:
         return f"No activities found for game {from_game.name} (id: {from_game_id})."
 
@@ -53,7 +53,8 @@ def execute_move_game(
         )
 
     for act in activities:
-        set_game_actually(act, to_game)
+        act.set_game(to_game)
+    Activity.bulk_save(activities, [Activity.game])
 
     return f"Moved {count} {noun} from *{from_game.name}* to *{to_game.name}*."
 
@@ -0,0 +1,22 @@
+from tpbackend.storage import User, rebuild_activity_daily, reconcile_stats
+from .admin_command import AdminCommand
+
+
+class ReconcileStatsCommand(AdminCommand):
+    def __init__(self):
+        names = ["reconcile_stats", "rcs"]
+        d = "Recompute all stats tables from scratch"
+        h = (
+            "Stats tables are kept up to date on every activity write. This recomputes them, in case they ever drift. "
+            "`!reconcile_stats daily` also rebuilds the daily stats (charts) from every activity."
+        )
+        super().__init__(names=names, description=d, help=h)
+
+    def execute(self, user: User, msg: str) -> str:
+        arg = msg.strip().lower()
+        if arg not in ("", "daily"):
+            return f"Invalid syntax. See `!help {self.names[0]}` for help."
+        reconcile_stats()
+        if arg == "daily":
+            rebuild_activity_daily()
+        return "Done"
@@ -9,10 +9,8 @@ class RefreshSearch(AdminCommand):
         super().__init__(names=names, description=d)
 
     def execute(self, user: User, msg: str) -> str:
-        for game in Game.select():
-            game.save()  # triggers reindex
-        for user in User.select():
-            user.save()  # triggers reindex
-        for platform in Platform.select():
-            platform.save()  # triggers reindex
+        # bulk_save rebuilds the search column
+        Game.bulk_save(list(Game.select()), [])
+        User.bulk_save(list(User.select()), [])
+        Platform.bulk_save(list(Platform.select()), [])
         return "Done"
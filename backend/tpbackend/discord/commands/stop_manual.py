@@ -31,6 +31,7 @@ class StopManualCommand(ManualActivityCommand):
             platform=live.get_platform(),
             game=live.get_game(),
             seconds=seconds,
+            source="live activity",
         )
 
         sesh = result[0]
@@ -41,9 +42,6 @@ class StopManualCommand(ManualActivityCommand):
             msg += f"- Duration: {secsToHHMMSS(sesh.get_seconds())}\n"
             msg += f"- Platform: {display_name(sesh.get_platform())}\n"
 
-            sesh.add_history("Activity source: live activity")
-            sesh.save()
-
             return msg.strip()
         if isinstance(result[1], ValueError):
             return "Session ended, but not saved because it was too short"
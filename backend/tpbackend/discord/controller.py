@@ -1,6 +1,8 @@
 from .bot import bot, avatar_from_discord_user_id
 from tpbackend.cache import cache_set, cache_get
 
+AVATAR_EX = 3600
+
 
 def get_avatar_url(discord_user_id: str | int) -> str:
     discord_user_id = int(discord_user_id)
@@ -9,5 +11,5 @@ def get_avatar_url(discord_user_id: str | int) -> str:
     if cached:
         return cached.decode("utf-8")  # type: ignore
     url = avatar_from_discord_user_id(discord_user_id)
-    cache_set(cache_key, url, ex=3600)
+    cache_set(cache_key, url, ex=AVATAR_EX)
     return url
@@ -1,8 +1,26 @@
 from pydantic import BaseModel
+from tpbackend.storage import Game
 from tpbackend.utils2 import dt_to_ts
 from tpbackend.common.models import BaseTotals
 
 
+def children_ids_of(games: list) -> dict[int, list[int]]:
+    """
+    Children ids of many games in one query (instead of game.children per game)
+    """
+    res: dict[int, list[int]] = {game.id: [] for game in games}
+    if not res:
+        return res
+    query = (
+        Game.select(Game.id, Game.parent)
+        .where(Game.parent.in_(list(res.keys())))  # type: ignore
+        .order_by(Game.id)
+    )
+    for child_id, parent_id in query.tuples():
+        res[parent_id].append(child_id)
+    return res
+
+
 class GameStats(BaseTotals):
     user_count: int
     platform_count: int
@@ -23,7 +41,9 @@ class API_Game(BaseModel):
     parent_id: int | None
 
     @classmethod
-    def from_game(cls, game):
+    def from_game(cls, game, children_ids: list[int] | None = None):
+        if children_ids is None:
+            children_ids = children_ids_of([game])[game.id]
         return cls(
             id=game.id,
             name=game.name,
@@ -35,16 +55,24 @@ class API_Game(BaseModel):
             release_year=game.release_year,
             created=dt_to_ts(game.created),
             updated=dt_to_ts(game.updated),
-            children_ids=[child.id for child in game.children],
+            children_ids=children_ids,
             parent_id=game.parent_id,
         )
 
+    @classmethod
+    def from_games(cls, games) -> list:
+        games = list(games)
+        children = children_ids_of(games)
+        return [cls.from_game(game, children[game.id]) for game in games]
+
 
 class API_GameWithStats(API_Game):
     stats: GameStats
 
     @classmethod
-    def from_game(cls, game):
+    def from_game(cls, game, children_ids: list[int] | None = None):
+        if children_ids is None:
+            children_ids = children_ids_of([game])[game.id]
         return cls(
             id=game.id,
             name=game.name,
@@ -56,7 +84,7 @@ class API_GameWithStats(API_Game):
             release_year=game.release_year,
             created=dt_to_ts(game.created),
             updated=dt_to_ts(game.updated),
-            children_ids=[child.id for child in game.children],
+            children_ids=children_ids,
             parent_id=game.parent_id,
             stats=GameStats(
                 seconds=game.total_seconds,
@@ -1,12 +1,9 @@
 import logging
 from typing import Literal
 
-from peewee import (
-    JOIN,
-    fn,
-    Case,
-)
-from tpbackend.storage import Activity, Game
+from peewee import JOIN, fn
+from tpbackend.common.search import normalize_search, search_rank, search_where
+from tpbackend.storage import GameClosure, GameStats, Activity, Game
 
 logger = logging.getLogger("game_query")
 
@@ -41,15 +38,22 @@ class GameQuery:
         order,
     ):
         column = GameQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
 
     @staticmethod
     def search(query, search: str):
-        if not search or search.strip() == "":
+        """
+        Filters on search and orders by best match.
+        Sorts applied after this only break ties.
+        """
+        search = normalize_search(search)
+        if not search:
             return query
-        q = query.where(Game.search.contains(search.lower()))  # type: ignore
+        q = query.where(search_where(Game.search, search)).order_by(  # type: ignore
+            *search_rank(Game.search, search)  # type: ignore
+        )
         # logger.debug(f"GameQuery search: {q.sql()}")
         return q
 
@@ -61,29 +65,13 @@ class GameQuery:
 
 
 class GameStatsQuery:
-    TOTAL_SECONDS = fn.SUM(
-        Case(None, [(Activity.hidden == False, Activity.seconds)], 0)
-    ).alias("total_seconds")
-
-    ACTIVITY_COUNT = fn.COUNT(Case(None, [(Activity.hidden == False, 1)], None)).alias(
-        "activity_count"
-    )
-
-    LAST_ACTIVITY = fn.MAX(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("last_activity")
-
-    FIRST_ACTIVITY = fn.MIN(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("first_activity")
-
-    USER_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.user)], None))
-    ).alias("user_count")
-
-    PLATFORM_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.platform)], None))
-    ).alias("platform_count")
+    # aggregated per game over an already filtered activity query, see filtered()
+    TOTAL_SECONDS = fn.SUM(Activity.seconds).alias("total_seconds")
+    ACTIVITY_COUNT = fn.COUNT(Activity.id).alias("activity_count")
+    LAST_ACTIVITY = fn.MAX(Activity.timestamp).alias("last_activity")
+    FIRST_ACTIVITY = fn.MIN(Activity.timestamp).alias("first_activity")
+    USER_COUNT = fn.COUNT(fn.DISTINCT(Activity.user)).alias("user_count")
+    PLATFORM_COUNT = fn.COUNT(fn.DISTINCT(Activity.platform)).alias("platform_count")
 
     AGGREGATES = {
         "playtime": TOTAL_SECONDS,
@@ -94,6 +82,17 @@ class GameStatsQuery:
         "platform_count": PLATFORM_COUNT,
     }
 
+    # same columns as AGGREGATES, read from the rollup table instead
+    ROLLUP = [
+        fn.COALESCE(GameStats.seconds, 0).alias("total_seconds"),
+        fn.COALESCE(GameStats.activity_count, 0).alias("activity_count"),
+        GameStats.last_activity.alias("last_activity"),
+        GameStats.first_activity.alias("first_activity"),
+        fn.COALESCE(GameStats.user_count, 0).alias("user_count"),
+        fn.COALESCE(GameStats.platform_count, 0).alias("platform_count"),
+    ]
+
+    # sorting only renders the alias, so these work on filtered() and rollup() alike
     SORTS = {
         **AGGREGATES,
         "name": Game.name,
@@ -101,20 +100,65 @@ class GameStatsQuery:
     }
 
     @staticmethod
-    def base(include_hidden=False):
-        if include_hidden:
-            return (
-                Game.select(Game, *GameStatsQuery.AGGREGATES.values())
-                .join(Activity, JOIN.LEFT_OUTER)
-                .group_by(Game.id)
+    def filtered(
+        activities, keep_empty=False, include_hidden=False, with_children=False
+    ):
+        """
+        Aggregates the activities query (with its filters already applied) per game
+        in a subquery, and joins that to the games.
+        Filtering before grouping lets postgres use the activity indexes instead of
+        joining every activity to every game and filtering afterwards.
+        keep_empty: also return games without any matching activities (with zeroed stats)
+        with_children: also aggregate the activities of all descendants of each game
+        """
+        if with_children:
+            key = GameClosure.ancestor
+            activities = activities.join(
+                GameClosure, on=(GameClosure.descendant == Activity.game)
             )
         else:
-            return (
-                Game.select(Game, *GameStatsQuery.AGGREGATES.values())
-                .join(Activity, JOIN.LEFT_OUTER)
-                .where(Game.hidden == False)  # noqa: E712
-                .group_by(Game.id)
+            key = Activity.game
+        stats = (
+            activities.select(key.alias("game_id"), *GameStatsQuery.AGGREGATES.values())
+            .group_by(key)
+            .order_by()
+            .alias("stats")
+        )
+        query = (
+            Game.select(
+                Game,
+                fn.COALESCE(stats.c.total_seconds, 0).alias("total_seconds"),
+                fn.COALESCE(stats.c.activity_count, 0).alias("activity_count"),
+                stats.c.last_activity.alias("last_activity"),
+                stats.c.first_activity.alias("first_activity"),
+                fn.COALESCE(stats.c.user_count, 0).alias("user_count"),
+                fn.COALESCE(stats.c.platform_count, 0).alias("platform_count"),
             )
+            .join(
+                stats,
+                JOIN.LEFT_OUTER if keep_empty else JOIN.INNER,
+                on=(stats.c.game_id == Game.id),
+            )
+            .objects()  # put the stats columns on the Game
+        )
+        if include_hidden:
+            return query
+        return query.where(Game.hidden == False)  # noqa: E712
+
+    @staticmethod
+    def rollup(include_hidden=False):
+        """
+        Like filtered() over all activities, but reads the precomputed GameStats instead.
+        Only valid when there are no activity filters (before/after/user/platform...)
+        """
+        query = (
+            Game.select(Game, *GameStatsQuery.ROLLUP)
+            .join(GameStats, JOIN.LEFT_OUTER, on=(GameStats.game == Game.id))
+            .objects()  # put the stats columns on the Game, like filtered() does
+        )
+        if include_hidden:
+            return query
+        return query.where(Game.hidden == False)  # noqa: E712
 
     @staticmethod
     def apply_ids(
@@ -130,6 +174,6 @@ class GameStatsQuery:
         order,
     ):
         column = GameStatsQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
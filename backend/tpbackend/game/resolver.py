@@ -0,0 +1,97 @@
+"""
+In-memory name/alias -> game map for GameSelect.by_name_or_alias,
+so resolving a known game (every synced Oblivionis session) costs no queries.
+Dropped by every game write (Game.save, bulk_save, delete_instance), rebuilt on the next lookup
+"""
+
+import logging
+import os
+import threading
+import time
+
+from tpbackend.storage import Game, db
+
+logger = logging.getLogger("game_resolver")
+
+# rebuilt after this anyway, for writes done in a transaction another thread had not committed yet
+GAME_RESOLVER_EX = int(os.environ.get("GAME_RESOLVER_EX", 300))
+
+_lock = threading.Lock()
+_names: "GameNames | None" = None
+_generation = 0
+
+
+class GameNames:
+    """
+    Snapshot of all games by name, alias and lowercase name.
+    Same lookups (and ties) as GameSelect.by_name/by_alias, without the queries
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.loaded = time.monotonic()
+        self.names: dict[str, dict] = {}
+        self.lower_names: dict[str, dict] = {}
+        self.aliases: dict[str, dict] = {}
+        # newest release first (null last), like GameSelect.by_name
+        for row in rows:
+            self.names.setdefault(row["name"], row)
+            self.lower_names.setdefault(row["name"].lower(), row)
+            for alias in row["aliases"] or []:
+                self.aliases.setdefault(alias, row)
+
+    @staticmethod
+    def load() -> "GameNames":
+        rows = (
+            Game.select()
+            .order_by(Game.release_year.desc(nulls="LAST"), Game.id)  # type: ignore
+            .dicts()
+        )
+        return GameNames(list(rows))
+
+    @staticmethod
+    def _game(row: dict | None) -> Game | None:
+        if row is None:
+            return None
+        # a new instance each time, callers may change it (add_alias...)
+        game = Game(__no_default__=1, **{**row, "aliases": list(row["aliases"] or [])})
+        game._dirty.clear()
+        return game
+
+    def by_name(self, name: str, case_sensitive=False) -> Game | None:
+        if case_sensitive:
+            return GameNames._game(self.names.get(name))
+        return GameNames._game(self.lower_names.get(name.lower()))
+
+    def by_alias(self, alias: str) -> Game | None:
+        return GameNames._game(self.aliases.get(alias))
+
+
+def game_names() -> GameNames | None:
+    """
+    The current snapshot, (re)built if needed.
+    None inside a transaction if there is no current one: a rebuild there could keep
+    the transaction's own game writes, and they might be rolled back
+    """
+    global _names
+    names = _names
+    if names is not None and time.monotonic() - names.loaded < GAME_RESOLVER_EX:
+        return names
+    if db.in_transaction():
+        return None
+    with _lock:
+        generation = _generation
+    names = GameNames.load()
+    logger.debug("Loaded %s game names", len(names.names))
+    with _lock:
+        if generation != _generation:
+            # a game was written while loading, it may be missing
+            return None
+        _names = names
+    return names
+
+
+def invalidate_game_names():
+    global _names, _generation
+    with _lock:
+        _names = None
+        _generation += 1
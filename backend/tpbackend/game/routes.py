@@ -1,9 +1,10 @@
 from tpbackend.activity.query import ActivityQuery
 from tpbackend.game.models import API_GameWithStats
 from tpbackend.game.query import GameStatsQuery
-from tpbackend.utils2 import clamp, parseTS, parse_csv
+from tpbackend.utils2 import clamp, parseTS, parseWindow, parse_csv
 from tpbackend.game.query import GameQuery
 from tpbackend.game.models import API_Game
+from tpbackend.api.route_cache import cached_route
 from tpbackend.api.responses import bad_request, not_found
 import logging
 from fastapi import APIRouter, Path
@@ -14,9 +15,11 @@ from tpbackend.api.params import (
     path_csv,
     path_id,
     query_id,
+    query_overlaps,
     query_ts,
     sorts,
     query_search,
+    query_rollup,
 )
 
 logger = logging.getLogger("games-routes")
@@ -27,6 +30,7 @@ def __get_games_stats(
     gids: list[int] | None = None,
     before: int | None = None,
     after: int | None = None,
+    overlaps: str | None = None,
     user_id: int | None = None,
     platform_id: int | None = None,
     sort="id",
@@ -34,27 +38,39 @@ def __get_games_stats(
     offset: int | None = None,
     limit: int | None = None,
     search="",
+    rollup=False,
 ) -> list[API_GameWithStats]:
     bf = parseTS(before)
     af = parseTS(after)
+    window = parseWindow(overlaps) if overlaps else None
+    if overlaps and not window:
+        return bad_request("Invalid overlaps, expected start,end timestamps")
 
-    query = GameStatsQuery.base()
-    if gids and len(gids) > 0:
-        if len(gids) > 100:
-            return bad_request("Cannot request more than 100 games at once")
-        query = GameStatsQuery.apply_ids(query, gids)
-
-    if bf:
-        query = ActivityQuery.before(query, bf)
-
-    if af:
-        query = ActivityQuery.after(query, af)
-
-    if user_id:
-        query = ActivityQuery.user(query, user_id)
+    if gids and len(gids) > 100:
+        return bad_request("Cannot request more than 100 games at once")
 
-    if platform_id:
-        query = ActivityQuery.platform(query, platform_id)
+    if rollup or bf or af or window or user_id or platform_id:
+        activities = ActivityQuery.base()
+        if bf:
+            activities = ActivityQuery.before(activities, bf)
+        if af:
+            activities = ActivityQuery.after(activities, af)
+        if window:
+            activities = ActivityQuery.overlaps(activities, *window)
+        if user_id:
+            activities = ActivityQuery.user(activities, user_id)
+        if platform_id:
+            activities = ActivityQuery.platform(activities, platform_id)
+        # without activity filters (rollup only) every game is listed, like rollup() does
+        unfiltered = not (bf or af or window or user_id or platform_id)
+        query = GameStatsQuery.filtered(
+            activities, keep_empty=bool(gids) or unfiltered, with_children=rollup
+        )
+    else:
+        # nothing to filter activities on, precomputed stats will do
+        query = GameStatsQuery.rollup()
+    if gids:
+        query = GameStatsQuery.apply_ids(query, gids)
 
     if search:
         query = GameQuery.search(query, search)
@@ -67,7 +83,7 @@ def __get_games_stats(
     if limit:
         query = query.limit(clamp(limit, 1, 100))
 
-    return [API_GameWithStats.from_game(game) for game in query]
+    return API_GameWithStats.from_games(query)
 
 
 @router.get(
@@ -75,19 +91,24 @@ def __get_games_stats(
     tags=["games", "stats"],
     response_model=API_GameWithStats,
 )
+@cached_route("games", single_flight=True)
 def get_single_game_stats(
     game_id=path_id("game"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     user=query_id("user"),
     platform=query_id("platform"),
+    rollup: bool = query_rollup(),
 ) -> API_GameWithStats:
     x = __get_games_stats(
         gids=[int(game_id)],
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         platform_id=platform,
+        rollup=rollup,
     )
     if len(x) == 0:
         return not_found("Game not found")
@@ -99,24 +120,29 @@ def get_single_game_stats(
     response_model=list[API_GameWithStats],
     tags=["games", "stats"],
 )
+@cached_route("games", single_flight=True)
 def get_many_games_stats(
     game_ids=path_csv("game ids"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     user=query_id("user"),
     platform=query_id("platform"),
     sort=sorts(list(GameStatsQuery.SORTS.keys()), default="id"),
     order: AscDescOrder = "asc",
+    rollup: bool = query_rollup(),
 ) -> list[API_GameWithStats]:
     gids = parse_csv(game_ids)
     return __get_games_stats(
         gids=gids,
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         platform_id=platform,
         sort=sort,
         order=order,
+        rollup=rollup,
     )
 
 
@@ -125,6 +151,7 @@ def get_many_games_stats(
     tags=["games", "stats"],
     response_model=list[API_GameWithStats],
 )
+@cached_route("games", single_flight=True)
 def get_games_stats(
     offset=offset(),
     limit=limit(),
@@ -132,9 +159,11 @@ def get_games_stats(
     platform=query_id("platform"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     sort=sorts(list(GameStatsQuery.SORTS.keys()), default="playtime"),
     order: AscDescOrder = "desc",
     search=query_search("games"),
+    rollup: bool = query_rollup(),
 ) -> list[API_GameWithStats]:
     limit = clamp(int(limit), 1, 100)
     offset = max(0, int(offset))
@@ -142,6 +171,7 @@ def get_games_stats(
     return __get_games_stats(
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         platform_id=platform,
         sort=sort,
@@ -149,6 +179,7 @@ def get_games_stats(
         offset=offset,
         limit=limit,
         search=search,
+        rollup=rollup,
     )
 
 
@@ -178,7 +209,7 @@ def __get_games(
         query = query.offset(max(0, int(offset)))
     if limit:
         query = query.limit(clamp(limit, 1, 100))
-    return [API_Game.from_game(g) for g in query]
+    return API_Game.from_games(query)
 
 
 @router.get(
@@ -186,6 +217,7 @@ def __get_games(
     tags=["games"],
     response_model=API_Game,
 )
+@cached_route("games")
 def get_single_game(game_id=path_id("game")) -> API_Game:
     x = __get_games(ids=[int(game_id)])
     if len(x) == 0:
@@ -198,6 +230,7 @@ def get_single_game(game_id=path_id("game")) -> API_Game:
     tags=["games"],
     response_model=list[API_Game],
 )
+@cached_route("games")
 def get_many_games(
     game_ids=path_csv("game ids"),
     sort=sorts(list(GameQuery.SORTS.keys()), default="id"),
@@ -218,6 +251,7 @@ def get_many_games(
     tags=["games"],
     response_model=list[API_Game],
 )
+@cached_route("games")
 def get_games(
     offset=offset(),
     limit=limit(),
@@ -2,6 +2,7 @@ import logging
 
 from tpbackend.storage import Game
 from tpbackend.game.query import GameQuery
+from tpbackend.game.resolver import GameNames, game_names
 from peewee import fn
 
 logger = logging.getLogger("game_select")
@@ -34,17 +35,32 @@ class GameSelect:
 
     @staticmethod
     def by_name_or_alias(s: str) -> Game | None:
-        game = GameSelect.by_name(s, case_sensitive=True)
+        names = game_names()
+        if names is not None:
+            game = GameSelect._by_name_or_alias(names, s)
+            if game:
+                return game
+        # not in memory: new, or written since the map was loaded
+        return GameSelect._by_name_or_alias(GameSelect, s)
+
+    @staticmethod
+    def _by_name_or_alias(
+        source: "GameNames | type[GameSelect]", s: str
+    ) -> Game | None:
+        """
+        source: GameSelect (queries) or GameNames (the in-memory map), same lookups
+        """
+        game = source.by_name(s, case_sensitive=True)
         if game:
             logger.info("Found game by name: '%s' (id: %s)", s, game.id)
             return game
         # any game with this alias?
-        game = GameSelect.by_alias(s)
+        game = source.by_alias(s)
         if game:
             logger.info("Found game by alias '%s': '%s' (id: %s)", s, game.name, game.id)  # type: ignore
             return game
         # any game with this name but different capitalization?
-        game = GameSelect.by_name(s, case_sensitive=False)
+        game = source.by_name(s, case_sensitive=False)
         if game:
             logger.info(
                 "Found game by different capitalization: db: '%s' / s: '%s' (id: %s)",
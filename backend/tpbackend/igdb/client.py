@@ -4,7 +4,7 @@ import logging
 import os
 import json
 
-from tpbackend.cache import cache_get, cache_set
+from tpbackend.cache import cache_get_or_compute
 from tpbackend.utils2 import ts_to_dt
 
 logger = logging.getLogger("IGDBClient")
@@ -71,27 +71,24 @@ class IGDBClient:
         def error(*args):
             logger.error(f"IGDB request #{self.req_no}: " + args[0], *args[1:])
 
-        cache_key = f"igdb_request:{query}"
-        cached = cache_get(cache_key)
-        if cached:
-            log("Cache hit for query: %s", query)
-            return cached.decode("utf-8")  # type: ignore
-        try:
-            self._authenticate()
-            log("Making query: %s", query)
-            r = requests.post(
-                "https://api.igdb.com/v4/games",
-                headers={
-                    "Client-ID": self.client_id,
-                    "Authorization": f"Bearer {self.token}",
-                },
-                data=query,
-            )
-            r.raise_for_status()
-            json_str = r.text
-            log("Response: %s %s", r.status_code, json_str)
-            cache_set(cache_key, json_str, ex=cache_expiry)
-            return json_str
-        except Exception as e:
-            error("Error during IGDB request: %s", e)
-            return None
+        def fetch() -> str | None:
+            try:
+                self._authenticate()
+                log("Making query: %s", query)
+                r = requests.post(
+                    "https://api.igdb.com/v4/games",
+                    headers={
+                        "Client-ID": self.client_id,
+                        "Authorization": f"Bearer {self.token}",
+                    },
+                    data=query,
+                )
+                r.raise_for_status()
+                log("Response: %s %s", r.status_code, r.text)
+                return r.text
+            except Exception as e:
+                error("Error during IGDB request: %s", e)
+                return None
+
+        # concurrent misses of the same query make one request
+        return cache_get_or_compute(f"igdb_request:{query}", fetch, ex=cache_expiry)
@@ -2,6 +2,7 @@ import asyncio
 import os
 from .oblivionis import storage as oblivionis_storage, sync as oblivionis_sync
 from .discord.bot import bot
+from tpbackend.metrics import start_metrics_server
 from tpbackend.storage import db, clean_loop
 import tpbackend.api.api as api
 
@@ -22,7 +23,10 @@ async def async_main():
 
 def main():
     oblivionis_storage.connect_db()
+    # verify connection + run on_connect hooks, then hand it back to the pool
     db.connect()
+    db.close()
+    start_metrics_server()
     asyncio.run(async_main())
 
 
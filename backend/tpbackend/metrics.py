@@ -0,0 +1,155 @@
+"""
+Prometheus metrics, served on their own port (METRICS_PORT), not on the public API
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from tpbackend.cache import get_cache_counters, get_codec_counters
+
+logger = logging.getLogger("metrics")
+
+# internal, don't publish it (0 disables the metrics server)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
+
+# fast statements, mostly below 10 ms
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+HTTP_REQUESTS = Counter(
+    "tp_http_requests_total", "API requests", ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "tp_http_request_seconds", "API request latency", ["method", "route"]
+)
+DB_QUERIES = Counter("tp_db_queries_total", "SQL statements", ["source"])
+DB_QUERY_SECONDS = Histogram(
+    "tp_db_query_seconds", "SQL statement duration", ["source"], buckets=QUERY_BUCKETS
+)
+DISCORD_COMMAND_SECONDS = Histogram(
+    "tp_discord_command_seconds", "Discord command latency", ["command"]
+)
+SYNC_ACTIVITIES = Counter(
+    "tp_sync_activities_total", "Oblivionis activities synced", ["result"]
+)
+SYNC_LAG_SECONDS = Histogram(
+    "tp_sync_lag_seconds",
+    "Time from an Oblivionis activity being written to it being synced",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600),
+)
+SYNC_TICK_SECONDS = Histogram("tp_sync_tick_seconds", "Oblivionis sync tick duration")
+
+# what is running: an ASGI scope (the route is filled in once it is matched) or a name
+_source: ContextVar[dict | str] = ContextVar("metrics_source", default="background")
+
+
+@contextmanager
+def metrics_source(source: dict | str):
+    """
+    Attribute SQL statements in the block to source (request scope, "discord:<command>"...)
+    """
+    token = _source.set(source)
+    try:
+        yield
+    finally:
+        _source.reset(token)
+
+
+def current_source() -> str:
+    source = _source.get()
+    if isinstance(source, dict):
+        route = source.get("route")
+        return getattr(route, "path", "unmatched")
+    return source
+
+
+def observe_query(seconds: float):
+    source = current_source()
+    DB_QUERIES.labels(source=source).inc()
+    DB_QUERY_SECONDS.labels(source=source).observe(seconds)
+
+
+def observe_request(scope: dict, status: int, seconds: float):
+    method = scope.get("method", "")
+    route = getattr(scope.get("route"), "path", "unmatched")
+    HTTP_REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+    HTTP_REQUEST_SECONDS.labels(method=method, route=route).observe(seconds)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(
+            time.monotonic() - started
+        )
+
+
+class StatsCollector:
+    """
+    Reads the existing pool/cache counters when scraped, instead of keeping copies
+    """
+
+    def describe(self):
+        # otherwise register() calls collect(), before storage is importable
+        return []
+
+    def collect(self):
+        # imported here, storage imports this module
+        from tpbackend.storage import get_pool_stats
+
+        pool = get_pool_stats()
+        for name, doc in [
+            ("in_use", "Pooled DB connections in use"),
+            ("idle", "Pooled DB connections idle"),
+            ("max", "Max pooled DB connections"),
+        ]:
+            yield GaugeMetricFamily(f"tp_db_pool_{name}", doc, value=pool[name])
+        yield CounterMetricFamily(
+            "tp_db_pool_checkouts", "DB connection checkouts", value=pool["connects"]
+        )
+        yield CounterMetricFamily(
+            "tp_db_pool_wait_seconds",
+            "Time spent waiting for a DB connection",
+            value=pool["wait_total"],
+        )
+
+        lookups = CounterMetricFamily(
+            "tp_cache_lookups", "Cache lookups", labels=["prefix", "result"]
+        )
+        for prefix, counts in get_cache_counters().items():
+            lookups.add_metric([prefix, "l1_hit"], counts["l1_hit"])
+            lookups.add_metric([prefix, "redis_hit"], counts["hit"])
+            lookups.add_metric([prefix, "miss"], counts["miss"])
+        yield lookups
+
+        codec = get_codec_counters()
+        yield CounterMetricFamily(
+            "tp_cache_compressed_values",
+            "Cached values stored compressed",
+            value=codec["compressed"],
+        )
+        yield CounterMetricFamily(
+            "tp_cache_compressed_bytes_saved",
+            "Bytes saved by compressing cached values",
+            value=codec["bytes_in"] - codec["bytes_stored"],
+        )
+
+
+REGISTRY.register(StatsCollector())
+
+
+def start_metrics_server():
+    """
+    Serves the metrics on METRICS_PORT, in a daemon thread
+    """
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logger.info(f"Serving metrics on port {METRICS_PORT}")
@@ -2,6 +2,7 @@
 import datetime
 import os
 
+import psycopg2
 from peewee import (
     CharField,
     DateTimeField,
@@ -11,6 +12,9 @@ from peewee import (
     PostgresqlDatabase,
 )
 
+# notified by a trigger on activity inserts, the sync LISTENs on it
+NOTIFY_CHANNEL = "oblivionis_activity"
+
 db = PostgresqlDatabase(
     os.environ.get("DB_NAME"),
     user=os.environ.get("DB_USER"),
@@ -48,3 +52,39 @@ def connect_db():
     db.execute_sql(
         "ALTER TABLE activity ADD COLUMN IF NOT EXISTS platform VARCHAR DEFAULT 'pc'"
     )
+    # wake up the sync on new activities, once per INSERT statement
+    with db.atomic():
+        db.execute_sql(
+            f"""
+            CREATE OR REPLACE FUNCTION notify_oblivionis_activity() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('{NOTIFY_CHANNEL}', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        db.execute_sql("DROP TRIGGER IF EXISTS activity_notify ON activity")
+        db.execute_sql(
+            "CREATE TRIGGER activity_notify AFTER INSERT ON activity "
+            "FOR EACH STATEMENT EXECUTE FUNCTION notify_oblivionis_activity()"
+        )
+
+
+def listen_connection():
+    """
+    A separate autocommit connection LISTENing on NOTIFY_CHANNEL, for the event loop to watch.
+    Keepalives, so a dead connection errors out instead of silently never notifying again
+    """
+    conn = psycopg2.connect(
+        database=db.database,
+        keepalives=1,
+        keepalives_idle=60,
+        keepalives_interval=10,
+        keepalives_count=3,
+        **db.connect_params,
+    )
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+    return conn
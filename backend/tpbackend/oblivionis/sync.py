@@ -1,26 +1,82 @@
 import datetime
 import logging
 import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, cast
 
 from tpbackend import operations
 from tpbackend.discord import bot
+from tpbackend.game.resolver import game_names
 from tpbackend.game.select import GameSelect
 from tpbackend.globals import MINIMUM_SESSION_LENGTH
+from tpbackend.metrics import (
+    SYNC_ACTIVITIES,
+    SYNC_LAG_SECONDS,
+    SYNC_TICK_SECONDS,
+    metrics_source,
+    timed,
+)
 from tpbackend.oblivionis import storage
 from tpbackend.permissions import PERMISSION_OBLIVIONIS_SYNC
-from tpbackend.storage import User, Platform, Game
+from tpbackend.storage import (
+    Activity,
+    OblivionisDeadLetter,
+    User,
+    Platform,
+    Game,
+    connection_scope,
+    stats_batch,
+    stats_savepoint,
+)
+from tpbackend.utils2 import assertTimezone, now
 
 logger = logging.getLogger("oblivionis-sync")
 
+# pending Oblivionis activities handled per transaction
+SYNC_BATCH_SIZE = int(os.environ.get("OBLIVIONIS_SYNC_BATCH_SIZE", 500))
+
+# catches activities whose notification was missed, while the listener was reconnecting
+SYNC_FALLBACK_POLL = int(os.environ.get("OBLIVIONIS_SYNC_FALLBACK_POLL", 60))
+LISTEN_RETRY = 5
+
+# failed syncs of a row before it is dead-lettered (moved out of Oblivionis, see !adm_dead_letters)
+SYNC_MAX_ATTEMPTS = int(os.environ.get("OBLIVIONIS_SYNC_MAX_ATTEMPTS", 5))
+
+# a single thread, so its Oblivionis db connection (peewee keeps one per thread) is reused
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="oblivionis-sync")
+
 
 class PassedActivity(TypedDict):
+    oblivionis_id: int
     game_name: str
     duration: int
     dt: datetime.datetime
     discord_user_name: str
     discord_user_id: str
     platform: str
+    # when the session is recorded as ended, None: now (#62: Discord timestamps cant be trusted).
+    # Set for rows that failed to sync before: when they first failed
+    ended: datetime.datetime | None
+
+
+class SyncBatch:
+    """
+    Users, games and platforms already resolved in this batch, pending rows mostly repeat them
+    """
+
+    def __init__(self):
+        self.users: dict[tuple[str, str], User] = {}
+        self.games: dict[str, Game] = {}
+        self.platforms: dict[str, Platform] = {}
+        # of the last failed row
+        self.error = ""
+
+    def forget(self):
+        # after a failed row: what it created was rolled back
+        self.users.clear()
+        self.games.clear()
+        self.platforms.clear()
 
 
 def get_game_by_name_or_alias_or_create(s: str) -> Game:
@@ -38,110 +94,375 @@ def get_game_by_name_or_alias_or_create(s: str) -> Game:
     return game
 
 
-def parseActivity(activity: PassedActivity) -> bool:
+def get_user(activity: PassedActivity) -> User:
+    user, created = User.get_or_create(
+        discord_id=activity["discord_user_id"], name=activity["discord_user_name"]
+    )
+    user = cast(User, user)
+    if created:
+        logger.info(
+            "Added new user '%s' (id: %s, discord id: %s) to database",
+            user.name,
+            user.id,
+            user.discord_id,
+        )
+        user.add_history("Created during Oblivionis sync")
+        user.save()
+
+    # maybe sync display name
+    try:
+        user_discord_id = user.get_discord_id()
+        if user_discord_id:
+            user_info = bot.get_discord_user(user_discord_id)
+            if user_info:
+                user.sync_display_name(user_info.display_name)
+    except Exception as e:
+        logger.warning(
+            "Failed to sync display name for user '%s' (id: %s) during sync: %s",
+            user.name,
+            user.id,
+            e,
+        )
+    return user
+
+
+def get_platform(abbreviation: str) -> Platform:
+    platform, created = Platform.get_or_create(abbreviation=abbreviation)
+    if created:
+        logger.info("Added new platform %s to database", platform.abbreviation)
+        platform.add_history("Created during Oblivionis sync")
+        platform.save()
+    return platform
+
+
+def _parseActivity(activity: PassedActivity, batch: SyncBatch) -> bool:
+    logger.info("Syncing activity: %s", activity)
+    if activity["duration"] < MINIMUM_SESSION_LENGTH:
+        logger.info("Skipping too short session...")
+        return True
+
+    user_key = (activity["discord_user_id"], activity["discord_user_name"])
+    if user_key not in batch.users:
+        batch.users[user_key] = get_user(activity)
+    user = batch.users[user_key]
+
+    if not user.has_permission(PERMISSION_OBLIVIONIS_SYNC):
+        logger.warning(
+            "User '%s' (id: %s) does not have permission to sync, skipping",
+            user.name,
+            user.id,
+        )
+        return True
+
+    game_name = activity["game_name"]
+    game_name = game_name.removesuffix(" with Medal").strip()
+    if game_name not in batch.games:
+        batch.games[game_name] = get_game_by_name_or_alias_or_create(game_name)
+    game = batch.games[game_name]
+
+    platform_abbr = activity["platform"]
+    if platform_abbr == "pc":
+        # apply users set pc platform (linux/mac/win)
+        platform_abbr = user.pc_platform or "win"
+    if platform_abbr not in batch.platforms:
+        batch.platforms[platform_abbr] = get_platform(platform_abbr)
+    platform = batch.platforms[platform_abbr]
+
+    success = operations.add_session(
+        user=user,
+        game=game,
+        timestamp=activity["ended"],
+        seconds=activity["duration"],
+        platform=platform,
+        oblivionis_id=activity["oblivionis_id"],
+        source="Oblivionis",
+    )
+    if not success[0]:
+        # roll back the row's savepoint, the error may have aborted the transaction
+        raise cast(Exception, success[1])
+    logger.info("Activity synced successfully")
+    return True
+
+
+def parseActivity(activity: PassedActivity, batch: SyncBatch | None = None) -> bool:
+    batch = batch or SyncBatch()
     try:
-        logger.info("Syncing activity: %s", activity)
-        if activity["duration"] < MINIMUM_SESSION_LENGTH:
-            logger.info("Skipping too short session...")
-            return True
+        # a savepoint, so one failing row doesn't take the batch's transaction (or its stats) with it
+        with stats_savepoint():
+            return _parseActivity(activity, batch)
+    except Exception as e:
+        logger.error("Error when syncing activity: %s", e)
+        batch.error = f"{type(e).__name__}: {e}"
+        batch.forget()
+        return False
+
+
+def pending_activities(after_id: int, limit: int) -> list:
+    """
+    Next Oblivionis activities, with their user and game joined in (no lazy loads per row)
+    """
+    return list(
+        storage.Activity.select(storage.Activity, storage.User, storage.Game)
+        .join(storage.User)
+        .switch(storage.Activity)
+        .join(storage.Game)
+        .where(storage.Activity.id > after_id)
+        .order_by(storage.Activity.id)
+        .limit(limit)
+    )
 
-        user, created = User.get_or_create(
-            discord_id=activity["discord_user_id"], name=activity["discord_user_name"]
+
+def sync_activities(activities: list[PassedActivity]) -> tuple[set[int], set[int]]:
+    """
+    Syncs the activities in one transaction, recording failures in the dead-letter table.
+    Returns the Oblivionis ids synced (or skipped) and the ones that just died
+    """
+    ids = [a["oblivionis_id"] for a in activities]
+    # synced before, but the Oblivionis row was not deleted (crash in between)
+    already = {
+        row.oblivionis_id
+        for row in Activity.select(Activity.oblivionis_id).where(
+            Activity.oblivionis_id.in_(ids)  # type: ignore
         )
-        user = cast(User, user)
-        if created:
-            logger.info(
-                "Added new user '%s' (id: %s, discord id: %s) to database",
-                user.name,
-                user.id,
-                user.discord_id,
-            )
-            user.add_history("Created during Oblivionis sync")
-            user.save()
+    }
+    for oblivionis_id in already:
+        logger.info("Oblivionis activity %s was synced already", oblivionis_id)
 
-        # maybe sync display name
-        try:
-            user_discord_id = user.get_discord_id()
-            if user_discord_id:
-                user_info = bot.get_discord_user(user_discord_id)
-                if user_info:
-                    user.sync_display_name(user_info.display_name)
-        except Exception as e:
-            logger.warning(
-                "Failed to sync display name for user '%s' (id: %s) during sync: %s",
-                user.name,
-                user.id,
-                e,
-            )
+    # (re)loaded before the transaction, it is not inside one
+    game_names()
 
-        if not user.has_permission(PERMISSION_OBLIVIONIS_SYNC):
+    batch = SyncBatch()
+    synced = set(already)
+    failures: dict[int, tuple[PassedActivity, str]] = {}
+
+    # one transaction, the stats of all its sessions are updated at its end
+    with stats_batch():
+        for activity in activities:
+            if activity["oblivionis_id"] in already:
+                continue
+            if parseActivity(activity, batch):
+                synced.add(activity["oblivionis_id"])
+            else:
+                failures[activity["oblivionis_id"]] = (activity, batch.error)
+
+    if synced:
+        OblivionisDeadLetter.delete().where(OblivionisDeadLetter.oblivionis_id.in_(list(synced))).execute()  # type: ignore
+    return synced, record_failures(failures)
+
+
+def record_failures(failures: dict[int, tuple[PassedActivity, str]]) -> set[int]:
+    """
+    Counts an attempt for each failed activity, returns the ones out of attempts
+    """
+    if not failures:
+        return set()
+    attempts = {
+        letter.oblivionis_id: letter.attempts
+        for letter in OblivionisDeadLetter.select(
+            OblivionisDeadLetter.oblivionis_id, OblivionisDeadLetter.attempts
+        ).where(
+            OblivionisDeadLetter.oblivionis_id.in_(list(failures))  # type: ignore
+        )
+    }
+    rows = []
+    dead = set()
+    for oblivionis_id, (activity, error) in failures.items():
+        attempt = attempts.get(oblivionis_id, 0) + 1
+        if attempt >= SYNC_MAX_ATTEMPTS:
             logger.warning(
-                "User '%s' (id: %s) does not have permission to sync, skipping",
-                user.name,
-                user.id,
+                "Giving up on Oblivionis activity %s after %s attempts: %s",
+                oblivionis_id,
+                attempt,
+                error,
             )
-            return True
-
-        game_name = activity["game_name"]
-        game_name = game_name.removesuffix(" with Medal").strip()
-
-        game = get_game_by_name_or_alias_or_create(game_name)
-
-        platform_abbr = activity["platform"]
-        if platform_abbr == "pc":
-            # apply users set pc platform (linux/mac/win)
-            platform_abbr = user.pc_platform or "win"
-        platform, created = Platform.get_or_create(abbreviation=platform_abbr)
-        if created:
-            logger.info("Added new platform %s to database", platform.abbreviation)
-            platform.add_history("Created during Oblivionis sync")
-            platform.save()
-
-        success = operations.add_session(
-            user=user,
-            game=game,
-            # #62: Discord timestamps cant be trusted... passing None to let it default to now
-            # timestamp=activity["dt"],
-            seconds=activity["duration"],
-            platform=platform,
+            dead.add(oblivionis_id)
+        rows.append(
+            {
+                "oblivionis_id": oblivionis_id,
+                "timestamp": activity["dt"],
+                "discord_user_id": activity["discord_user_id"],
+                "discord_user_name": activity["discord_user_name"],
+                "game_name": activity["game_name"],
+                "seconds": activity["duration"],
+                "platform": activity["platform"],
+                "attempts": attempt,
+                "error": error,
+                "last_failed": now(),
+                "dead": attempt >= SYNC_MAX_ATTEMPTS,
+            }
         )
-        if success[0]:
-            logger.info("Activity synced successfully")
-            created_activity = success[0]
-            created_activity.add_history("Activity source: Oblivionis")
-            created_activity.save()
-            return True
-
-        logger.error("Error when syncing activity: %s", success[1])
-        return False
-    except Exception as e:
-        logger.error("Unhandled exception when syncing: %s", e)
-        return False
+    fields = OblivionisDeadLetter
+    OblivionisDeadLetter.insert_many(rows).on_conflict(
+        conflict_target=[fields.oblivionis_id],
+        preserve=[fields.attempts, fields.error, fields.last_failed, fields.dead],
+    ).execute()
+    return dead
 
 
-async def sync_loop():
+def sync_batch(oblivionisActivities: list):
+    # failed before: synced as of then, not as of this retry
+    first_failed = {
+        letter.oblivionis_id: assertTimezone(letter.first_failed)
+        for letter in OblivionisDeadLetter.select(
+            OblivionisDeadLetter.oblivionis_id, OblivionisDeadLetter.first_failed
+        ).where(
+            OblivionisDeadLetter.oblivionis_id.in_([o.id for o in oblivionisActivities])  # type: ignore
+        )
+    }
+    synced, dead = sync_activities(
+        [
+            {
+                "oblivionis_id": o.id,
+                "dt": o.timestamp,
+                "discord_user_name": o.user.name,
+                "discord_user_id": o.user.id,
+                "game_name": o.game.name,
+                "duration": o.seconds,
+                "platform": o.platform,
+                "ended": first_failed.get(o.id),
+            }
+            for o in oblivionisActivities
+        ]
+    )
+
+    for o in oblivionisActivities:
+        if o.id in synced:
+            SYNC_ACTIVITIES.labels(result="synced").inc()
+            lag = now() - assertTimezone(o.timestamp)
+            SYNC_LAG_SECONDS.observe(max(0.0, lag.total_seconds()))
+        elif o.id in dead:
+            SYNC_ACTIVITIES.labels(result="dead_lettered").inc()
+        else:
+            SYNC_ACTIVITIES.labels(result="failed").inc()
+
+    # delete successful parses, and the dead ones (their data is in the dead-letter table)
+    done = list(synced | dead)
+    if len(done) > 0:
+        storage.Activity.delete().where(storage.Activity.id.in_(done)).execute()  # type: ignore
+
+
+def dead_letter_activity(letter: OblivionisDeadLetter) -> PassedActivity:
+    return {
+        "oblivionis_id": cast(int, letter.oblivionis_id),
+        "dt": assertTimezone(letter.timestamp),
+        "discord_user_name": cast(str, letter.discord_user_name),
+        "discord_user_id": cast(str, letter.discord_user_id),
+        "game_name": cast(str, letter.game_name),
+        "duration": cast(int, letter.seconds),
+        "platform": cast(str, letter.platform),
+        # it would have been synced then: a session recorded as ending now could
+        # replace (overlap) the user's current ones
+        "ended": assertTimezone(letter.first_failed),
+    }
+
+
+def retry_dead_letters(ids: list[int] | None = None) -> dict[int, str | None]:
+    """
+    Syncs dead-lettered activities again (all dead ones if ids is None).
+    Returns the error of each, None if it synced
+    """
+    letters = OblivionisDeadLetter.select().order_by(OblivionisDeadLetter.oblivionis_id)
+    if ids is None:
+        letters = letters.where(OblivionisDeadLetter.dead == True)  # noqa: E712
+    else:
+        letters = letters.where(OblivionisDeadLetter.oblivionis_id.in_(ids))  # type: ignore
+    letters = list(letters)
+    synced, _ = sync_activities([dead_letter_activity(letter) for letter in letters])
+    failed = [
+        letter.oblivionis_id for letter in letters if letter.oblivionis_id not in synced
+    ]
+    # the new errors
+    errors = {
+        letter.oblivionis_id: letter.error
+        for letter in OblivionisDeadLetter.select().where(
+            OblivionisDeadLetter.oblivionis_id.in_(failed)  # type: ignore
+        )
+    }
+    return {
+        letter.oblivionis_id: (
+            None if letter.oblivionis_id in synced else errors.get(letter.oblivionis_id)
+        )
+        for letter in letters
+    }
+
+
+def sync_tick():
+    last_id = 0
     while True:
-        # logger.info("Checking...")
-        oblivionisActivities = storage.Activity.select()
-        parsedIds = []
-
-        for o in oblivionisActivities:
-            i = o.id
-            success = parseActivity(
-                {
-                    "dt": o.timestamp,
-                    "discord_user_name": o.user.name,
-                    "discord_user_id": o.user.id,
-                    "game_name": o.game.name,
-                    "duration": o.seconds,
-                    "platform": o.platform,
-                }
-            )
-            if success:
-                parsedIds.append(i)
+        # failed rows stay pending, page past them instead of fetching them again
+        oblivionisActivities = pending_activities(last_id, SYNC_BATCH_SIZE)
+        if not oblivionisActivities:
+            return
+        sync_batch(oblivionisActivities)
+        if len(oblivionisActivities) < SYNC_BATCH_SIZE:
+            return
+        last_id = oblivionisActivities[-1].id
+
+
+def run_sync_tick():
+    with connection_scope(), metrics_source("oblivionis_sync"), timed(
+        SYNC_TICK_SECONDS
+    ):
+        sync_tick()
 
-        # delete successful parses
-        if len(parsedIds) > 0:
-            storage.Activity.delete().where(storage.Activity.id.in_(parsedIds)).execute()  # type: ignore
 
-        await asyncio.sleep(1)
+async def listen(wake: asyncio.Event):
+    """
+    Sets wake whenever the activity trigger notifies, (re)connecting as needed
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            # connecting blocks
+            conn = await asyncio.to_thread(storage.listen_connection)
+        except Exception as e:
+            logger.warning("Failed to LISTEN for Oblivionis activities: %s", e)
+            await asyncio.sleep(LISTEN_RETRY)
+            continue
+
+        lost = asyncio.Event()
+
+        def on_readable():
+            try:
+                conn.poll()
+            except Exception as e:
+                logger.warning("Lost the Oblivionis LISTEN connection: %s", e)
+                lost.set()
+                return
+            if conn.notifies:
+                conn.notifies.clear()
+                wake.set()
+
+        fd = conn.fileno()
+        loop.add_reader(fd, on_readable)
+        logger.info("Listening for Oblivionis activities")
+        # anything inserted while not listening
+        wake.set()
+        try:
+            await lost.wait()
+        finally:
+            loop.remove_reader(fd)
+            conn.close()
+        await asyncio.sleep(LISTEN_RETRY)
+
+
+async def sync_loop():
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    listener = asyncio.create_task(listen(wake))
+    try:
+        while True:
+            # notifications arriving during the tick run it again right after
+            wake.clear()
+            # peewee blocks, keep it off the event loop serving the API and the Discord gateway
+            try:
+                await loop.run_in_executor(_executor, run_sync_tick)
+            except Exception as e:
+                logger.error("Unhandled exception in sync tick: %s", e)
+
+            try:
+                await asyncio.wait_for(wake.wait(), SYNC_FALLBACK_POLL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        listener.cancel()
@@ -0,0 +1,72 @@
+import datetime
+import os
+
+# the sync imports the bot, whose SteamGridDB client needs a token
+os.environ.setdefault("SGDB_TOKEN", "test")
+
+from tpbackend import operations  # noqa: E402
+from tpbackend.oblivionis import sync  # noqa: E402
+from tpbackend.permissions import PERMISSION_OBLIVIONIS_SYNC  # noqa: E402
+from tpbackend.storage import (  # noqa: E402
+    Activity,
+    Game,
+    OblivionisDeadLetter,
+    Platform,
+    User,
+)
+
+
+def make_letter() -> OblivionisDeadLetter:
+    return OblivionisDeadLetter(
+        oblivionis_id=42,
+        timestamp=datetime.datetime(2025, 3, 1, 12, 0),
+        discord_user_id="1234",
+        discord_user_name="someone",
+        game_name="wow",
+        seconds=3600,
+        platform="win",
+        first_failed=datetime.datetime(2025, 3, 1, 12, 1),
+        last_failed=datetime.datetime(2025, 3, 1, 12, 5),
+    )
+
+
+def make_batch() -> sync.SyncBatch:
+    # resolved already, no queries (defaults like the user's platform would query)
+    batch = sync.SyncBatch()
+    batch.users[("1234", "someone")] = User(
+        __no_default__=1, id=1, name="someone", permissions=[PERMISSION_OBLIVIONIS_SYNC]
+    )
+    batch.games["wow"] = Game(__no_default__=1, id=2, name="wow")
+    batch.platforms["win"] = Platform(__no_default__=1, id=3, abbreviation="win")
+    return batch
+
+
+class TestRetryDeadLetter:
+    def test_recorded_when_it_first_failed(self, monkeypatch):
+        calls = []
+
+        def add_session(**kwargs):
+            calls.append(kwargs)
+            return Activity(__no_default__=1), None
+
+        monkeypatch.setattr(operations, "add_session", add_session)
+        activity = sync.dead_letter_activity(make_letter())
+        assert sync._parseActivity(activity, make_batch())
+        assert calls[0]["timestamp"] == datetime.datetime(
+            2025, 3, 1, 12, 1, tzinfo=datetime.UTC
+        )
+        assert calls[0]["oblivionis_id"] == 42
+        assert calls[0]["seconds"] == 3600
+
+    def test_new_session_ends_now(self, monkeypatch):
+        calls = []
+
+        def add_session(**kwargs):
+            calls.append(kwargs)
+            return Activity(__no_default__=1), None
+
+        monkeypatch.setattr(operations, "add_session", add_session)
+        activity = {**sync.dead_letter_activity(make_letter()), "ended": None}
+        assert sync._parseActivity(activity, make_batch())  # type: ignore
+        # add_session defaults it to now
+        assert calls[0]["timestamp"] is None
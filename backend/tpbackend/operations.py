@@ -1,57 +1,85 @@
 import datetime
 import logging
-from typing import cast
 
 from tpbackend import utils2
+from tpbackend.activity.query import ActivityQuery
+from tpbackend.platform.resolver import (
+    platform_by_abbreviation_or_create,
+    platform_by_id,
+)
 from .storage import (
-    Activity_or_none,
-    Platform_or_none,
+    StatsChange,
     User,
     Game,
     Platform,
     Activity,
+    db,
+    pending_stats_changes,
+    stats_changes_ctes,
 )
 from tpbackend.globals import MINIMUM_SESSION_LENGTH
 
 logger = logging.getLogger("operations")
 
 
-def get_overlapping_activity(
+def delete_overlapping_activities(
     user: User,
     game: Game,
     platform: Platform,
     incoming_ended_dt: datetime.datetime,
     incoming_seconds: int,
-) -> Activity | None:
+) -> list[Activity]:
     """
-    Returns None if no overlap.
-    Returns old activity if overlap is detected (it should be removed)
+    Deletes the activities of this user/game/platform played (at least partly) while the
+    incoming one was, in one DELETE ... RETURNING using the user + period GiST index.
+    Returns the deleted activities
     """
-    # get last activity for this user/game/platform
-    last_activity = (
-        Activity.select()
-        .where(
-            (Activity.user == user)
-            & (Activity.game == game)
-            & (Activity.platform == platform)
-        )
-        .order_by(Activity.timestamp.desc())
-        .first()
+    incoming_started_dt = incoming_ended_dt - datetime.timedelta(
+        seconds=incoming_seconds
     )
-    if not last_activity:
-        return None
+    query = ActivityQuery.user(Activity.delete(), user)
+    query = ActivityQuery.overlaps(query, incoming_started_dt, incoming_ended_dt)
+    query = ActivityQuery.game(query, game)
+    query = ActivityQuery.platform(query, platform)
+    deleted = list(query.returning(Activity).execute())
+    # their history is deleted with them (ON DELETE CASCADE)
+    for activity in deleted:
+        logger.info("⚠️ Deleted overlapping activity: %s", activity)
+    return deleted
 
-    last_activity = cast(Activity, last_activity)
-    last_ended_ts = last_activity.get_timestamp()
-    new_ended_ts = int(incoming_ended_dt.timestamp() * 1000)
-    # calculate time between the activities
-    delta_ms = new_ended_ts - last_ended_ts
-    delta_s = delta_ms / 1000
-    if delta_s < incoming_seconds:
-        # if the last_activity ended when you were still playing (according to this new incoming activity), it's an overlap
-        logger.info("⚠️ Detected overlapping activity: %s", last_activity)
-        return last_activity
-    return None
+
+def insert_activity(
+    activity: Activity, stats_changes: list[StatsChange] | None = None
+) -> Activity:
+    """
+    INSERTs the new activity, its pending history and stats_changes (see storage.pending_stats_changes)
+    in one statement (data-modifying CTEs), instead of save()'s INSERT + history INSERT + stats update.
+    Sets and returns it with its id
+    """
+    insert, params = Activity.insert(activity.__data__).returning(Activity.id).sql()
+    ctes = [f'"new_activity" AS ({insert})']
+    if activity.pending_history:
+        entries = ", ".join(["(%s, %s)"] * len(activity.pending_history))
+        ctes.append(
+            '"new_history" AS (INSERT INTO "history" ("activity_id", "timestamp", "message") '
+            'SELECT "new_activity"."id", e."timestamp", e."message" '
+            f'FROM "new_activity", (VALUES {entries}) AS e ("timestamp", "message"))'
+        )
+        params += [
+            value
+            for entry in activity.pending_history
+            for value in (entry["timestamp"], entry["message"])
+        ]
+    if stats_changes:
+        sql, stats_params = stats_changes_ctes(stats_changes)
+        ctes.append(sql)
+        params += stats_params
+    cursor = db.execute_sql(
+        f'WITH {", ".join(ctes)}\nSELECT "id" FROM "new_activity"', params
+    )
+    activity.id = cursor.fetchone()[0]
+    activity.pending_history.clear()
+    return activity
 
 
 def add_session(
@@ -60,9 +88,16 @@ def add_session(
     seconds: int,
     platform: Platform | None = None,
     timestamp: datetime.datetime | None = None,
+    oblivionis_id: int | None = None,
+    source: str | None = None,
 ) -> tuple[Activity | None, Exception | None]:
     """
     Adds a new session to the database.
+    One transaction of two statements: the overlapping activities' DELETE ... RETURNING, then the INSERT of
+    the activity and its history with the stats changes of both. user, game and platform are used as passed,
+    the default/pc platform is resolved from memory (platform/resolver.py).
+    oblivionis_id: the Oblivionis row it comes from, if any
+    source: recorded in the activity's history ("Activity source: <source>")
     Returns a tuple of (Activity, None) on success, or (None, Exception) on failure.
     """
     if seconds < MINIMUM_SESSION_LENGTH:
@@ -72,54 +107,57 @@ def add_session(
 
     try:
         # use default platform if not provided
-        platform = platform or user.get_default_platform()
+        platform = platform or platform_by_id(user.default_platform_id)  # type: ignore
         if platform.get_abbreviation() == "pc":
-            platform, created = Platform.get_or_create(
-                abbreviation=user.get_pc_platform()
-            )
-
-        platform = Platform_or_none(platform.id)  # type: ignore
-        if not platform:
-            raise Exception("Platform is None somehow... this shouldnt be possible")
+            platform = platform_by_abbreviation_or_create(user.get_pc_platform())
 
         # now if not provided
         timestamp = timestamp or utils2.now()
 
-        # Check for overlapping activity
-        overlapping_activity = get_overlapping_activity(
-            user=user,
-            game=game,
-            platform=platform,
-            incoming_ended_dt=timestamp,
-            incoming_seconds=seconds,
-        )
-        if overlapping_activity is not None:
-            logger.info(
-                "Deleting overlapping activity %s for user %s",
-                overlapping_activity,
-                user,
-            )
-            overlapping_activity.delete_instance()  # or maybe just hide...
-
-        raw_activity = Activity.create(
+        activity = Activity(
             user=user,
             game=game,
             seconds=seconds,
             platform=platform,
             timestamp=timestamp,
             hidden=game.get_hidden(),
+            oblivionis_id=oblivionis_id,
         )
+        if source:
+            activity.add_history(f"Activity source: {source}")
 
-        activity = Activity_or_none(raw_activity.id, include_hidden=True)
-        if not activity:
-            raise Exception("Failed to retrieve newly created activity")
+        with db.atomic():
+            # Check for overlapping activities
+            overlapping_activities = delete_overlapping_activities(
+                user=user,
+                game=game,
+                platform=platform,
+                incoming_ended_dt=timestamp,
+                incoming_seconds=seconds,
+            )
+            if overlapping_activities:
+                logger.info(
+                    "Deleted %s overlapping activities for user %s",
+                    len(overlapping_activities),
+                    user,
+                )
+            stats_changes = pending_stats_changes(
+                [
+                    *(
+                        overlapping.stats_change(-1)
+                        for overlapping in overlapping_activities
+                    ),
+                    activity.stats_change(1),
+                ]
+            )
+            insert_activity(activity, stats_changes)
 
         logger.info(
             "Added activity id %s for user %s: %s (%s) - %s seconds @ %s (hidden: %s)",
             activity.get_id(),
-            activity.get_user().get_name(),
-            activity.get_game().get_name(),
-            activity.get_platform().get_abbreviation(),
+            user.get_name(),
+            game.get_name(),
+            platform.get_abbreviation(),
             activity.get_seconds(),
             activity.get_datetime().isoformat(),
             activity.get_hidden(),
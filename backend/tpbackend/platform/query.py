@@ -1,12 +1,9 @@
 import logging
 from typing import Literal
 
-from peewee import (
-    JOIN,
-    fn,
-    Case,
-)
-from tpbackend.storage import Activity, Platform
+from peewee import JOIN, fn
+from tpbackend.common.search import normalize_search, search_rank, search_where
+from tpbackend.storage import PlatformStats, Activity, Platform
 
 logger = logging.getLogger("platform_query")
 
@@ -33,42 +30,33 @@ class PlatformQuery:
     @staticmethod
     def apply_sort(query, sort, order):
         column = PlatformQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
 
     @staticmethod
     def search(query, search: str):
-        if not search or search.strip() == "":
+        """
+        Filters on search and orders by best match.
+        Sorts applied after this only break ties.
+        """
+        search = normalize_search(search)
+        if not search:
             return query
-        q = query.where(Platform.search.contains(search.lower()))  # type: ignore
+        q = query.where(search_where(Platform.search, search)).order_by(  # type: ignore
+            *search_rank(Platform.search, search)  # type: ignore
+        )
         return q
 
 
 class PlatformStatsQuery:
-    TOTAL_SECONDS = fn.SUM(
-        Case(None, [(Activity.hidden == False, Activity.seconds)], 0)
-    ).alias("total_seconds")
-
-    ACTIVITY_COUNT = fn.COUNT(Case(None, [(Activity.hidden == False, 1)], None)).alias(
-        "activity_count"
-    )
-
-    LAST_ACTIVITY = fn.MAX(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("last_activity")
-
-    FIRST_ACTIVITY = fn.MIN(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("first_activity")
-
-    USER_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.user)], None))
-    ).alias("user_count")
-
-    GAME_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.game)], None))
-    ).alias("game_count")
+    # aggregated per platform over an already filtered activity query, see filtered()
+    TOTAL_SECONDS = fn.SUM(Activity.seconds).alias("total_seconds")
+    ACTIVITY_COUNT = fn.COUNT(Activity.id).alias("activity_count")
+    LAST_ACTIVITY = fn.MAX(Activity.timestamp).alias("last_activity")
+    FIRST_ACTIVITY = fn.MIN(Activity.timestamp).alias("first_activity")
+    USER_COUNT = fn.COUNT(fn.DISTINCT(Activity.user)).alias("user_count")
+    GAME_COUNT = fn.COUNT(fn.DISTINCT(Activity.game)).alias("game_count")
 
     AGGREGATES = {
         "playtime": TOTAL_SECONDS,
@@ -79,6 +67,17 @@ class PlatformStatsQuery:
         "game_count": GAME_COUNT,
     }
 
+    # same columns as AGGREGATES, read from the rollup table instead
+    ROLLUP = [
+        fn.COALESCE(PlatformStats.seconds, 0).alias("total_seconds"),
+        fn.COALESCE(PlatformStats.activity_count, 0).alias("activity_count"),
+        PlatformStats.last_activity.alias("last_activity"),
+        PlatformStats.first_activity.alias("first_activity"),
+        fn.COALESCE(PlatformStats.user_count, 0).alias("user_count"),
+        fn.COALESCE(PlatformStats.game_count, 0).alias("game_count"),
+    ]
+
+    # sorting only renders the alias, so these work on filtered() and rollup() alike
     SORTS = {
         **AGGREGATES,
         "name": Platform.name,
@@ -86,11 +85,53 @@ class PlatformStatsQuery:
     }
 
     @staticmethod
-    def base():
+    def filtered(activities, keep_empty=False):
+        """
+        Aggregates the activities query (with its filters already applied) per platform
+        in a subquery, and joins that to the platforms. See GameStatsQuery.filtered()
+        keep_empty: also return platforms without any matching activities (with zeroed stats)
+        """
+        stats = (
+            activities.select(
+                Activity.platform.alias("platform_id"),
+                *PlatformStatsQuery.AGGREGATES.values()
+            )
+            .group_by(Activity.platform)
+            .order_by()
+            .alias("stats")
+        )
+        return (
+            Platform.select(
+                Platform,
+                fn.COALESCE(stats.c.total_seconds, 0).alias("total_seconds"),
+                fn.COALESCE(stats.c.activity_count, 0).alias("activity_count"),
+                stats.c.last_activity.alias("last_activity"),
+                stats.c.first_activity.alias("first_activity"),
+                fn.COALESCE(stats.c.user_count, 0).alias("user_count"),
+                fn.COALESCE(stats.c.game_count, 0).alias("game_count"),
+            )
+            .join(
+                stats,
+                JOIN.LEFT_OUTER if keep_empty else JOIN.INNER,
+                on=(stats.c.platform_id == Platform.id),
+            )
+            .objects()  # put the stats columns on the Platform
+        )
+
+    @staticmethod
+    def rollup():
+        """
+        Like filtered() over all activities, but reads the precomputed PlatformStats instead.
+        Only valid when there are no activity filters (before/after/game/platform...)
+        """
         return (
-            Platform.select(Platform, *PlatformStatsQuery.AGGREGATES.values())
-            .join(Activity, JOIN.LEFT_OUTER)
-            .group_by(Platform.id)
+            Platform.select(Platform, *PlatformStatsQuery.ROLLUP)
+            .join(
+                PlatformStats,
+                JOIN.LEFT_OUTER,
+                on=(PlatformStats.platform == Platform.id),
+            )
+            .objects()  # put the stats columns on the Platform, like filtered() does
         )
 
     @staticmethod
@@ -107,6 +148,6 @@ class PlatformStatsQuery:
         order,
     ):
         column = PlatformStatsQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
@@ -0,0 +1,97 @@
+"""
+In-memory id/abbreviation -> platform map, so add_session resolves the user's default
+and pc platform without queries.
+Dropped by every platform write (Platform.save, bulk_save, delete_instance), rebuilt on the next lookup
+"""
+
+import logging
+import os
+import threading
+import time
+
+from tpbackend.storage import Platform, db
+
+logger = logging.getLogger("platform_resolver")
+
+# rebuilt after this anyway, for writes done in a transaction another thread had not committed yet
+PLATFORM_RESOLVER_EX = int(os.environ.get("PLATFORM_RESOLVER_EX", 300))
+
+_lock = threading.Lock()
+_platforms: "Platforms | None" = None
+_generation = 0
+
+
+class Platforms:
+    """
+    Snapshot of all platforms by id and abbreviation
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.loaded = time.monotonic()
+        self.ids: dict[int, dict] = {row["id"]: row for row in rows}
+        self.abbreviations: dict[str, dict] = {row["abbreviation"]: row for row in rows}
+
+    @staticmethod
+    def load() -> "Platforms":
+        return Platforms(list(Platform.select().dicts()))
+
+    @staticmethod
+    def _platform(row: dict | None) -> Platform | None:
+        if row is None:
+            return None
+        # a new instance each time, callers may change it
+        platform = Platform(__no_default__=1, **row)
+        platform._dirty.clear()
+        return platform
+
+    def by_id(self, platform_id: int) -> Platform | None:
+        return Platforms._platform(self.ids.get(platform_id))
+
+    def by_abbreviation(self, abbreviation: str) -> Platform | None:
+        return Platforms._platform(self.abbreviations.get(abbreviation))
+
+
+def platforms() -> Platforms | None:
+    """
+    The current snapshot, (re)built if needed.
+    None inside a transaction if there is no current one: a rebuild there could keep
+    the transaction's own platform writes, and they might be rolled back
+    """
+    global _platforms
+    snapshot = _platforms
+    if (
+        snapshot is not None
+        and time.monotonic() - snapshot.loaded < PLATFORM_RESOLVER_EX
+    ):
+        return snapshot
+    if db.in_transaction():
+        return None
+    with _lock:
+        generation = _generation
+    snapshot = Platforms.load()
+    logger.debug("Loaded %s platforms", len(snapshot.ids))
+    with _lock:
+        if generation != _generation:
+            # a platform was written while loading, it may be missing
+            return None
+        _platforms = snapshot
+    return snapshot
+
+
+def invalidate_platforms():
+    global _platforms, _generation
+    with _lock:
+        _platforms = None
+        _generation += 1
+
+
+def platform_by_id(platform_id: int) -> Platform:
+    snapshot = platforms()
+    platform = snapshot.by_id(platform_id) if snapshot else None
+    return platform or Platform.get_by_id(platform_id)
+
+
+def platform_by_abbreviation_or_create(abbreviation: str) -> Platform:
+    snapshot = platforms()
+    platform = snapshot.by_abbreviation(abbreviation) if snapshot else None
+    return platform or Platform.get_or_create(abbreviation=abbreviation)[0]
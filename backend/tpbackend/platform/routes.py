@@ -1,7 +1,8 @@
 from tpbackend.activity.query import ActivityQuery
 from tpbackend.platform.models import API_PlatformWithStats, API_Platform
 from tpbackend.platform.query import PlatformStatsQuery, PlatformQuery
-from tpbackend.utils2 import clamp, parseTS, parse_csv
+from tpbackend.utils2 import clamp, parseTS, parseWindow, parse_csv
+from tpbackend.api.route_cache import cached_route
 from tpbackend.api.responses import bad_request, not_found
 import logging
 from fastapi import APIRouter, Path
@@ -10,6 +11,7 @@ from tpbackend.api.params import (
     path_csv,
     path_id,
     query_search,
+    query_overlaps,
     query_ts,
     query_id,
     sorts,
@@ -25,6 +27,7 @@ def __get_platforms_stats(
     pids: list[int] | None = None,
     before=None,
     after=None,
+    overlaps: str | None = None,
     user_id: int | None = None,
     game_id: int | None = None,
     sort="id",
@@ -35,24 +38,31 @@ def __get_platforms_stats(
 ) -> list[API_PlatformWithStats]:
     bf = parseTS(before)
     af = parseTS(after)
+    window = parseWindow(overlaps) if overlaps else None
+    if overlaps and not window:
+        return bad_request("Invalid overlaps, expected start,end timestamps")
 
-    query = PlatformStatsQuery.base()
-    if pids and len(pids) > 0:
-        if len(pids) > 100:
-            return bad_request("Cannot request more than 100 platforms at once")
-        query = PlatformStatsQuery.apply_ids(query, pids)
-
-    if bf:
-        query = ActivityQuery.before(query, bf)
-
-    if af:
-        query = ActivityQuery.after(query, af)
-
-    if user_id:
-        query = ActivityQuery.user(query, user_id)
+    if pids and len(pids) > 100:
+        return bad_request("Cannot request more than 100 platforms at once")
 
-    if game_id:
-        query = ActivityQuery.game(query, game_id)
+    if bf or af or window or user_id or game_id:
+        activities = ActivityQuery.base()
+        if bf:
+            activities = ActivityQuery.before(activities, bf)
+        if af:
+            activities = ActivityQuery.after(activities, af)
+        if window:
+            activities = ActivityQuery.overlaps(activities, *window)
+        if user_id:
+            activities = ActivityQuery.user(activities, user_id)
+        if game_id:
+            activities = ActivityQuery.game(activities, game_id)
+        query = PlatformStatsQuery.filtered(activities, keep_empty=bool(pids))
+    else:
+        # nothing to filter activities on, precomputed stats will do
+        query = PlatformStatsQuery.rollup()
+    if pids:
+        query = PlatformStatsQuery.apply_ids(query, pids)
 
     if search:
         query = PlatformQuery.search(query, search=search)
@@ -73,10 +83,12 @@ def __get_platforms_stats(
     tags=["platforms", "stats"],
     response_model=API_PlatformWithStats,
 )
+@cached_route("platforms", single_flight=True)
 def get_single_platform_stats(
     platform_id=path_id("platform"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     user=query_id("user"),
     game=query_id("game"),
 ) -> API_PlatformWithStats:
@@ -84,6 +96,7 @@ def get_single_platform_stats(
         pids=[int(platform_id)],
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         game_id=game,
     )
@@ -97,10 +110,12 @@ def get_single_platform_stats(
     response_model=list[API_PlatformWithStats],
     tags=["platforms", "stats"],
 )
+@cached_route("platforms", single_flight=True)
 def get_many_platforms_stats(
     platform_ids=path_csv("platform ids"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     user=query_id("user"),
     game=query_id("game"),
     sort=sorts(list(PlatformStatsQuery.SORTS.keys()), "id"),
@@ -111,6 +126,7 @@ def get_many_platforms_stats(
         pids=pids,
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         game_id=game,
         sort=sort,
@@ -123,6 +139,7 @@ def get_many_platforms_stats(
     tags=["platforms", "stats"],
     response_model=list[API_PlatformWithStats],
 )
+@cached_route("platforms", single_flight=True)
 def get_platforms_stats(
     offset=offset(),
     limit=limit(),
@@ -130,6 +147,7 @@ def get_platforms_stats(
     game=query_id("game"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     sort=sorts(list(PlatformStatsQuery.SORTS.keys()), "playtime"),
     order: AscDescOrder = "desc",
     search=query_search("platforms"),
@@ -140,6 +158,7 @@ def get_platforms_stats(
     return __get_platforms_stats(
         before=before,
         after=after,
+        overlaps=overlaps,
         user_id=user,
         game_id=game,
         sort=sort,
@@ -183,6 +202,7 @@ def __get_platforms(
     tags=["platforms"],
     response_model=API_Platform,
 )
+@cached_route("platforms")
 def get_single_platform(platform_id: int) -> API_Platform:
     x = __get_platforms(ids=[int(platform_id)])
     if len(x) == 0:
@@ -195,6 +215,7 @@ def get_single_platform(platform_id: int) -> API_Platform:
     tags=["platforms"],
     response_model=list[API_Platform],
 )
+@cached_route("platforms")
 def get_many_platforms(
     platform_ids=path_csv("platform ids"),
     sort=sorts(list(PlatformQuery.SORTS.keys()), "id"),
@@ -215,6 +236,7 @@ def get_many_platforms(
     tags=["platforms"],
     response_model=list[API_Platform],
 )
+@cached_route("platforms")
 def get_platforms(
     offset=offset(),
     limit=limit(),
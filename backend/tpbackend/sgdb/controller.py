@@ -3,7 +3,7 @@ from steamgrid import StyleType, MimeType
 import json
 import os
 from .models import SGDB_Game, SGDB_Grid, SGDB_Author
-from tpbackend.cache import cache_get, cache_set
+from tpbackend.cache import cache_get, cache_get_or_compute, cache_set
 import logging
 
 logger = logging.getLogger("sgdb")
@@ -62,26 +62,21 @@ def get_game_by_id(game_id: int) -> Game | None:
     return None
 
 
-def get_grids(game_id: int) -> list[SGDB_Grid]:
+def _encode_grids(val: list[SGDB_Grid]) -> str:
+    res = []
+    for v in val:
+        res.append(v.model_dump())
+    return json.dumps(res, ensure_ascii=False)
 
-    def jsonEncode(val: list[SGDB_Grid]) -> str:
-        res = []
-        for v in val:
-            res.append(v.model_dump())
-        return json.dumps(res, ensure_ascii=False)
 
-    def jsonDecode(val: str) -> list[SGDB_Grid]:
-        res = []
-        for v in json.loads(val):
-            res.append(SGDB_Grid.model_validate(v))
-        return res
+def _decode_grids(val: str) -> list[SGDB_Grid]:
+    res = []
+    for v in json.loads(val):
+        res.append(SGDB_Grid.model_validate(v))
+    return res
 
-    key = f"sgdb_grids:{game_id}"
-    cached = cache_get(key)
-    if cached:
-        decoded = cached.decode("utf-8")  # type: ignore
-        return jsonDecode(decoded)
 
+def _fetch_grids(game_id: int) -> str | None:
     logger.info("Fetching grids for game ID %d from SteamGridDB", game_id)
     fetch = None
     try:
@@ -93,7 +88,7 @@ def get_grids(game_id: int) -> list[SGDB_Grid]:
         )
     except Exception as e:
         logger.error("Exception when fetching grids for game ID %d", game_id, e)
-        return []
+        return None
 
     gs = []
     if fetch:
@@ -121,13 +116,24 @@ def get_grids(game_id: int) -> list[SGDB_Grid]:
                 type=getattr(g, "type", None),
             )
             gs.append(new_grid)
+    return _encode_grids(gs)
 
-    cache_set(key, jsonEncode(gs), ex=ONE_DAY)
-    return gs
+
+def get_grids(game_id: int) -> list[SGDB_Grid]:
+    # popular pages get many concurrent misses, only one of them asks SteamGridDB
+    res = cache_get_or_compute(
+        f"sgdb_grids:{game_id}", lambda: _fetch_grids(game_id), ex=ONE_DAY
+    )
+    if res is None:
+        return []
+    return _decode_grids(res)
 
 
 def get_best_grid(game_id: int) -> SGDB_Grid | None:
-    grids = get_grids(game_id)
+    return best_of(get_grids(game_id))
+
+
+def best_of(grids: list[SGDB_Grid]) -> SGDB_Grid | None:
     if not grids:
         return None
 
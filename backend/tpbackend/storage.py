@@ -1,32 +1,110 @@
 import asyncio
 import os
 import logging
-from typing import cast
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, cast
 from datetime import datetime, timedelta
 
 from peewee import (
     fn,
+    JOIN,
+    BigIntegerField,
     BooleanField,
     CharField,
+    CompositeKey,
+    DateField,
     DateTimeField,
     ForeignKeyField,
     IntegerField,
     Model,
     TextField,
     AutoField,
+    _ConnectionState,
 )
-from playhouse.postgres_ext import PostgresqlExtDatabase, ArrayField
+from playhouse.postgres_ext import ArrayField
+from playhouse.pool import PooledPostgresqlExtDatabase
+from tpbackend.cache import cache_invalidate
+from tpbackend.metrics import observe_query
 from tpbackend.permissions import DEFAULT_PERMISSIONS
 
-from tpbackend.utils2 import js_iso, now_iso, assertTimezone, now
+from tpbackend.utils2 import js_iso, now_iso, assertTimezone, now, split_by_day
 
 logger = logging.getLogger("storage_v2")
 
 
-class CustomDb(PostgresqlExtDatabase):
+DB_POOL_MAX_CONNECTIONS = int(os.environ.get("DB_POOL_MAX_CONNECTIONS", 20))
+DB_POOL_STALE_TIMEOUT = int(os.environ.get("DB_POOL_STALE_TIMEOUT", 300))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+
+# connection state of the current scope (request, command, loop tick...)
+# None = not in a scope, fall back to one connection per thread
+_db_state: ContextVar[dict | None] = ContextVar("db_state", default=None)
+
+
+def _fresh_state() -> dict:
+    return {
+        "closed": True,
+        "conn": None,
+        "ctx": [],
+        "transactions": [],
+        "invalidations": _no_invalidations(),
+    }
+
+
+def _no_invalidations() -> dict:
+    # cached data to drop once the current transaction commits, see invalidate_after_commit
+    return {"tags": set(), "activity_keys": set(), "maps": set()}
+
+
+class ScopedConnectionState(_ConnectionState):
+    """
+    Peewee connection state that lives in a ContextVar instead of a thread local.
+    FastAPI runs sync routes and their dependencies in whatever worker thread is free,
+    so the connection has to follow the request rather than the thread.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_local", threading.local())
+        super().__init__()
+
+    def _state_dict(self) -> dict:
+        state = _db_state.get()
+        if state is None:
+            local = object.__getattribute__(self, "_local")
+            if not hasattr(local, "state"):
+                local.state = _fresh_state()
+            state = local.state
+        return state
+
+    def __getattr__(self, name):
+        try:
+            return self._state_dict()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._state_dict()[name] = value
+
+
+class CustomDb(PooledPostgresqlExtDatabase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._state = ScopedConnectionState()
+        self.connect_count = 0
+        self.connect_wait_total = 0.0
+        self.connect_wait_max = 0.0
+
     def connect(self, reuse_if_open=True):
+        started = time.monotonic()
         connected = super().connect(reuse_if_open)
         if connected:
+            waited = time.monotonic() - started
+            self.connect_count += 1
+            self.connect_wait_total += waited
+            self.connect_wait_max = max(self.connect_wait_max, waited)
             # trigger on_connect for all models to do any initialization (like resetting sequences)
             Platform.on_connect()
             User.on_connect()
@@ -38,15 +116,122 @@ class CustomDb(PostgresqlExtDatabase):
 
         return connected
 
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        finally:
+            observe_query(time.monotonic() - started)
+
+    def commit(self):
+        ret = super().commit()
+        invalidations = self._state.invalidations
+        self._state.invalidations = _no_invalidations()
+        _invalidate(invalidations)
+        return ret
+
+    def rollback(self):
+        # nothing was written
+        self._state.invalidations = _no_invalidations()
+        return super().rollback()
+
 
 db = CustomDb(
     os.environ.get("DB_NAME_TIMEPLAYED"),
     user=os.environ.get("DB_USER"),
     password=os.environ.get("DB_PASSWORD"),
     host=os.environ.get("DB_HOST"),
+    max_connections=DB_POOL_MAX_CONNECTIONS,
+    stale_timeout=DB_POOL_STALE_TIMEOUT,
+    timeout=DB_POOL_TIMEOUT,
 )
 
 
+@contextmanager
+def connection_scope():
+    """
+    Gives the block its own connection (checked out lazily on first query)
+    and returns it to the pool when the block exits
+    """
+    token = _db_state.set(_fresh_state())
+    try:
+        yield
+    finally:
+        try:
+            if not db.is_closed():
+                db.close()
+        finally:
+            _db_state.reset(token)
+
+
+def invalidate_after_commit(
+    tags: set[str] | None = None,
+    activity_keys: set[tuple[int, int, int]] | None = None,
+    maps: set[Callable[[], None]] | None = None,
+):
+    """
+    Drops cached data once the current transaction commits (right away outside of one, not if it rolls back):
+    dropped before, a concurrent request could cache what it read before the commit again.
+    tags: see cache_invalidate, activity_keys: see invalidate_activity_cache,
+    maps: functions dropping in-memory maps (game/resolver.py...), see invalidate_map
+    """
+    invalidations = db._state.invalidations
+    invalidations["tags"].update(tags or ())
+    invalidations["activity_keys"].update(activity_keys or ())
+    invalidations["maps"].update(maps or ())
+    if not db.in_transaction():
+        db._state.invalidations = _no_invalidations()
+        _invalidate(invalidations)
+
+
+def _invalidate(invalidations: dict):
+    try:
+        tags = invalidations["tags"]
+        if invalidations["activity_keys"]:
+            tags |= _activity_cache_tags(invalidations["activity_keys"])
+        if tags:
+            cache_invalidate(tags)
+        for invalidate in invalidations["maps"]:
+            invalidate()
+    except Exception as e:
+        # committed already, the write itself went through
+        logger.error("Failed to invalidate cached data: %s", e)
+
+
+def invalidate_map(invalidate: Callable[[], None]):
+    """
+    Drops an in-memory map of rows on a write: now, so the writing transaction doesn't resolve
+    from it, and once committed, in case another thread rebuilt it in between
+    """
+    invalidate()
+    invalidate_after_commit(maps={invalidate})
+
+
+def get_pool_stats() -> dict:
+    with db._pool_lock:
+        in_use = len(db._in_use)
+        idle = len(db._connections)
+    return {
+        "in_use": in_use,
+        "idle": idle,
+        "max": DB_POOL_MAX_CONNECTIONS,
+        "connects": db.connect_count,
+        "wait_total": db.connect_wait_total,
+        "wait_max": db.connect_wait_max,
+    }
+
+
+def get_db_stats() -> str:
+    s = get_pool_stats()
+    avg_wait = (s["wait_total"] / s["connects"]) if s["connects"] > 0 else 0
+    stats = f"DB pool: **{s['in_use']}/{s['max']}** in use, {s['idle']} idle\n"
+    stats += f"- Checkouts: {s['connects']}\n"
+    stats += (
+        f"- Wait: avg {avg_wait * 1000:.1f} ms, max {s['wait_max'] * 1000:.1f} ms\n"
+    )
+    return stats
+
+
 def reset_sequence(model):
     table = model._meta.table_name
     pk_field = model._meta.primary_key
@@ -67,6 +252,13 @@ class BaseModel(Model):
     def on_connect(cls):
         pass
 
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        """
+        Save fields of many existing rows, mixins/models extend this like save()
+        """
+        cls.bulk_update(models, fields=fields, batch_size=500)
+
 
 #################
 #### Mixins #####
@@ -96,28 +288,43 @@ class HistoryMixin(BaseModel):
     # history = ArrayField(TextField, default=lambda: [])  # type: ignore
     # history is now in a separate table, with foreign key to the model
 
-    pending_history = []
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # written on next save
+        self.pending_history: list[dict] = []
 
     def save(self, *args, **kwargs):
         self.updated = now()
+        with db.atomic():
+            ret = super().save(*args, **kwargs)
+            # after the save, so new rows have an id
+            flush_history([self])
+        return ret
 
-        # write all pending history
-        activity = self.get_id() if isinstance(self, Activity) else None
-        game = self.get_id() if isinstance(self, Game) else None
-        user = self.get_id() if isinstance(self, User) else None
-        platform = self.get_id() if isinstance(self, Platform) else None
-        for h in self.pending_history:
-            History.create(
-                activity=activity,
-                game=game,
-                user=user,
-                platform=platform,
-                message=h["message"],
-                timestamp=h["timestamp"],
-            )
-        self.pending_history.clear()
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        """
+        Save fields (+ updated) of many existing rows and their pending history,
+        a few statements in total instead of a few per row
+        """
+        if not models:
+            return
+        for model in models:
+            model.updated = now()
+        with db.atomic():
+            super().bulk_save(models, [*fields, cls.updated])
+            flush_history(models)
 
-        return super().save(*args, **kwargs)
+    def history_owner(self) -> dict:
+        """
+        History foreign keys pointing at this model
+        """
+        return {
+            "activity": self.get_id() if isinstance(self, Activity) else None,
+            "game": self.get_id() if isinstance(self, Game) else None,
+            "user": self.get_id() if isinstance(self, User) else None,
+            "platform": self.get_id() if isinstance(self, Platform) else None,
+        }
 
     def get_created(self) -> datetime:
         return assertTimezone(self.created)
@@ -135,6 +342,20 @@ class HistoryMixin(BaseModel):
         self.pending_history.append({"message": message, "timestamp": now()})
 
 
+def flush_history(models: list[HistoryMixin]):
+    """
+    Writes the pending history of all models in one multi-row INSERT
+    """
+    rows = []
+    for model in models:
+        owner = model.history_owner()
+        rows.extend({**owner, **entry} for entry in model.pending_history)
+    for i in range(0, len(rows), 1000):
+        History.insert_many(rows[i : i + 1000]).execute()
+    for model in models:
+        model.pending_history.clear()
+
+
 class SearchMixin(BaseModel):
     search = CharField(default="")
 
@@ -143,6 +364,12 @@ class SearchMixin(BaseModel):
         logger.info(f"Updated search: '{self.search}'")
         return super().save(*args, **kwargs)
 
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        for model in models:
+            model.search = model.build_search()[:255]
+        super().bulk_save(models, [*fields, cls.search])
+
     def build_search(self) -> str:
         """
         Return string to be used for searching
@@ -166,22 +393,74 @@ class HiddenMixin(BaseModel):
             self.add_history(f"Hidden changed from {old_hidden} to {hidden}")
 
 
+class CacheMixin(BaseModel):
+    """
+    Drops cached API responses listing this kind of row (see api/route_cache.py)
+    whenever one is written or deleted (once committed)
+    """
+
+    CACHE_TAG = ""
+
+    def save(self, *args, **kwargs):
+        ret = super().save(*args, **kwargs)
+        invalidate_after_commit({self.CACHE_TAG})
+        return ret
+
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        super().bulk_save(models, fields)
+        if models:
+            invalidate_after_commit({cls.CACHE_TAG})
+
+    def delete_instance(self, *args, **kwargs):
+        ret = super().delete_instance(*args, **kwargs)
+        invalidate_after_commit({self.CACHE_TAG})
+        return ret
+
+
 ####################
 ###### Models ######
 ####################
 
 
-class Platform(IdMixin, HistoryMixin, SearchMixin):
+class Platform(IdMixin, HistoryMixin, SearchMixin, CacheMixin):
     """
     Platform (V2)
     """
 
+    CACHE_TAG = "platforms"
+
     abbreviation = CharField(unique=True)
     name = CharField(null=True)
     color_primary = CharField(null=True, column_name="color_primary")
     color_secondary = CharField(null=True, column_name="color_secondary")
     icon = CharField(null=True)
 
+    def save(self, *args, **kwargs):
+        ret = super().save(*args, **kwargs)
+        invalidate_map(Platform.invalidate_resolver)
+        return ret
+
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        super().bulk_save(models, fields)
+        invalidate_map(Platform.invalidate_resolver)
+
+    def delete_instance(self, *args, **kwargs):
+        ret = super().delete_instance(*args, **kwargs)
+        invalidate_map(Platform.invalidate_resolver)
+        return ret
+
+    @staticmethod
+    def invalidate_resolver():
+        """
+        Drops the in-memory id/abbreviation map of platform/resolver.py
+        """
+        # imported here, it imports this module
+        from tpbackend.platform.resolver import invalidate_platforms
+
+        invalidate_platforms()
+
     def get_abbreviation(self) -> str:
         return cast(str, self.abbreviation)
 
@@ -226,11 +505,13 @@ class Platform(IdMixin, HistoryMixin, SearchMixin):
         return f"{self.get_id()} {self.get_abbreviation()} {self.get_name() or ''}".strip().lower()
 
 
-class User(IdMixin, HistoryMixin, SearchMixin):
+class User(IdMixin, HistoryMixin, SearchMixin, CacheMixin):
     """
     User (V2)
     """
 
+    CACHE_TAG = "users"
+
     discord_id = CharField(unique=True, null=True)
     name = CharField()
     display_name = CharField(null=True)
@@ -355,11 +636,13 @@ class User(IdMixin, HistoryMixin, SearchMixin):
         return f"{self.get_id()} {self.get_name()} {self.get_display_name()} {self.get_discord_id() or ''}".strip().lower()
 
 
-class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
+class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin, CacheMixin):
     """
     Game (V2)
     """
 
+    CACHE_TAG = "games"
+
     name = CharField()
     sgdb_id = IntegerField(null=True, default=None)
     sgdb_grid_id = IntegerField(null=True, default=None)
@@ -369,6 +652,75 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
     release_year = IntegerField(null=True, default=None)
     parent = ForeignKeyField("self", null=True, default=None, backref="children")
 
+    # values inherited from the parent(s), only written by refresh_effective_game()
+    effective_sgdb_id = IntegerField(null=True, default=None)
+    effective_sgdb_grid_id = IntegerField(null=True, default=None)
+    effective_igdb_id = IntegerField(null=True, default=None)
+    effective_image_url = CharField(null=True, default=None)
+    effective_hidden = BooleanField(default=False)
+
+    # changes to these need the effective values of the game and its children refreshed
+    INHERITED = {"sgdb_id", "sgdb_grid_id", "igdb_id", "image_url", "hidden", "parent"}
+
+    def save(self, *args, **kwargs):
+        inserting = self.id is None or kwargs.get("force_insert", False)
+        dirty = {f.name for f in self.dirty_fields}
+        changed = inserting or bool(dirty & Game.INHERITED)
+        if not inserting and "only" not in kwargs:
+            # don't write back (possibly outdated) effective values
+            kwargs["only"] = [
+                f
+                for f in self._meta.sorted_fields
+                if not f.name.startswith("effective_")
+            ]
+        with db.atomic():
+            ret = super().save(*args, **kwargs)
+            if inserting or "parent" in dirty:
+                refresh_game_closure(self)
+            if changed:
+                self.__data__.update(refresh_effective_game(self.get_id()))
+        invalidate_map(Game.invalidate_names)
+        return ret
+
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        names = {field.name for field in fields}
+        if "parent" in names:
+            raise ValueError("Parent changes need save() (closure table)")
+        with db.atomic():
+            super().bulk_save(models, fields)
+            if names & Game.INHERITED:
+                for model in models:
+                    model.__data__.update(refresh_effective_game(model.get_id()))
+        invalidate_map(Game.invalidate_names)
+
+    def delete_instance(self, *args, **kwargs):
+        ret = super().delete_instance(*args, **kwargs)
+        invalidate_map(Game.invalidate_names)
+        return ret
+
+    @staticmethod
+    def invalidate_names():
+        """
+        Drops the in-memory name/alias map of GameSelect.by_name_or_alias
+        """
+        # imported here, it imports this module
+        from tpbackend.game.resolver import invalidate_game_names
+
+        invalidate_game_names()
+
+    def _inherited(self, name: str):
+        """
+        Value of name from the parent(s).
+        Uses the precomputed effective_<name> unless there are unsaved changes
+        """
+        if self.id is not None and not self.is_dirty():
+            return getattr(self, f"effective_{name}")
+        parent = self.get_parent()
+        if parent:
+            return getattr(parent, f"get_{name}")()
+        return None
+
     def has_cover_art(self) -> bool:
         if self.get_image_url():
             return True
@@ -406,11 +758,7 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         """
         if self.sgdb_id is not None:
             return cast(int, self.sgdb_id)
-        # try parent
-        parent = self.get_parent()
-        if parent:
-            return parent.get_sgdb_id()
-        return None
+        return self._inherited("sgdb_id")
 
     def set_sgdb_id(self, sgdb_id: int | None):
         old_sgdb_id = self.get_sgdb_id()
@@ -423,10 +771,7 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         """
         if self.sgdb_grid_id:
             return cast(int, self.sgdb_grid_id)
-        parent = self.get_parent()
-        if parent:
-            return parent.get_sgdb_grid_id()
-        return None
+        return self._inherited("sgdb_grid_id")
 
     def set_sgdb_grid_id(self, sgdb_grid_id: int | None):
         old_sgdb_grid_id = self.get_sgdb_grid_id()
@@ -441,10 +786,7 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         """
         if self.igdb_id is not None:
             return cast(int, self.igdb_id)
-        parent = self.get_parent()
-        if parent:
-            return parent.get_igdb_id()
-        return None
+        return self._inherited("igdb_id")
 
     def set_igdb_id(self, igdb_id: int | None):
         old_igdb_id = self.get_igdb_id()
@@ -457,10 +799,7 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         """
         if self.image_url:
             return cast(str, self.image_url)
-        parent = self.get_parent()
-        if parent:
-            return parent.get_image_url()
-        return None
+        return self._inherited("image_url")
 
     def set_image_url(self, image_url: str | None):
         old_image_url = self.get_image_url()
@@ -500,10 +839,9 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
 
     def get_hidden(self) -> bool:
         # hide if parent is hidden
-        parent = self.get_parent()
-        if parent and parent.get_hidden():
+        if super().get_hidden():
             return True
-        return super().get_hidden()
+        return bool(self._inherited("hidden"))
 
     def get_parent(self) -> "Game | None":
         return cast(Game | None, self.parent)
@@ -516,8 +854,7 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
             if self.get_id() == new_parent.get_id():
                 raise ValueError("Game cannot be its own parent")
             # avoid setting parent to a child
-            children = self.get_children()
-            if any(c.get_id() == new_parent.get_id() for c in children):
+            if self.is_ancestor_of(new_parent):
                 raise ValueError("Game cannot be parent of a child")
         old_parent = self.get_parent()
         old_parent_name = "None"
@@ -530,13 +867,39 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         self.add_history(f"Parent changed from {old_parent_name} to {new_parent_name}")
 
     def get_children(self, recursive=True) -> list["Game"]:
-        children = []
-        for c in cast(list[Game], list(self.children)):  # type: ignore
-            children.append(c)
-            if recursive:
-                for cc in c.get_children():
-                    children.append(cc)
-        return children
+        if not recursive:
+            return cast(list[Game], list(self.children))  # type: ignore
+        # all descendants, closest first
+        query = (
+            Game.select()
+            .join(GameClosure, on=(GameClosure.descendant == Game.id))
+            .where((GameClosure.ancestor == self) & (GameClosure.depth > 0))
+            .order_by(GameClosure.depth, Game.id)
+        )
+        return cast(list[Game], list(query))
+
+    def get_ancestors(self) -> list["Game"]:
+        """
+        Parent, grandparent...
+        """
+        query = (
+            Game.select()
+            .join(GameClosure, on=(GameClosure.ancestor == Game.id))
+            .where((GameClosure.descendant == self) & (GameClosure.depth > 0))
+            .order_by(GameClosure.depth)
+        )
+        return cast(list[Game], list(query))
+
+    def is_ancestor_of(self, game: "Game") -> bool:
+        return (
+            GameClosure.select()
+            .where(
+                (GameClosure.ancestor == self)
+                & (GameClosure.descendant == game)
+                & (GameClosure.depth > 0)
+            )
+            .exists()
+        )
 
     def user_has_played(self, user: User) -> bool:
         exists = (
@@ -563,6 +926,106 @@ class Game(IdMixin, HistoryMixin, SearchMixin, HiddenMixin):
         return exists is not None
 
 
+class GameClosure(BaseModel):
+    """
+    Every (ancestor, descendant) pair of the game hierarchy, including (game, game) at depth 0.
+    Kept current by Game.save (refresh_game_closure)
+    """
+
+    ancestor = ForeignKeyField(Game, backref="+", on_delete="CASCADE")
+    descendant = ForeignKeyField(Game, backref="+", on_delete="CASCADE")
+    depth = IntegerField()
+
+    class Meta:
+        table_name = "game_closure"
+        primary_key = CompositeKey("ancestor", "descendant")
+
+
+def refresh_game_closure(game: Game):
+    """
+    Moves game (and everything below it) under its current parent in the closure table
+    """
+    subtree = GameClosure.select(GameClosure.descendant).where(
+        GameClosure.ancestor == game
+    )
+    # detach from the old ancestors
+    GameClosure.delete().where(
+        GameClosure.descendant.in_(subtree) & GameClosure.ancestor.not_in(subtree)
+    ).execute()
+    GameClosure.insert(
+        ancestor=game, descendant=game, depth=0
+    ).on_conflict_ignore().execute()
+    parent_id = game.parent_id  # type: ignore
+    if parent_id is None:
+        return
+    # attach to the new parent's ancestors
+    above = GameClosure.alias()
+    below = GameClosure.alias()
+    paths = (
+        above.select(above.ancestor, below.descendant, above.depth + below.depth + 1)
+        .join(below, on=(below.ancestor == game.get_id()))
+        .where(above.descendant == parent_id)
+    )
+    GameClosure.insert_from(
+        paths, [GameClosure.ancestor, GameClosure.descendant, GameClosure.depth]
+    ).on_conflict_ignore().execute()
+
+
+EFFECTIVE_GAME_SQL = """
+WITH RECURSIVE tree AS (
+    SELECT
+        g.id,
+        0 AS depth,
+        COALESCE(g.sgdb_id, p.effective_sgdb_id) AS sgdb_id,
+        COALESCE(NULLIF(g.sgdb_grid_id, 0), p.effective_sgdb_grid_id) AS sgdb_grid_id,
+        COALESCE(g.igdb_id, p.effective_igdb_id) AS igdb_id,
+        COALESCE(NULLIF(g.image_url, ''), p.effective_image_url) AS image_url,
+        g.hidden OR COALESCE(p.effective_hidden, FALSE) AS hidden
+    FROM "game" g
+    LEFT JOIN "game" p ON p.id = g.parent_id
+    WHERE {roots}
+    UNION ALL
+    SELECT
+        c.id,
+        t.depth + 1,
+        COALESCE(c.sgdb_id, t.sgdb_id),
+        COALESCE(NULLIF(c.sgdb_grid_id, 0), t.sgdb_grid_id),
+        COALESCE(c.igdb_id, t.igdb_id),
+        COALESCE(NULLIF(c.image_url, ''), t.image_url),
+        c.hidden OR t.hidden
+    FROM "game" c
+    JOIN tree t ON c.parent_id = t.id
+    WHERE t.depth < 32
+)
+UPDATE "game" SET
+    effective_sgdb_id = tree.sgdb_id,
+    effective_sgdb_grid_id = tree.sgdb_grid_id,
+    effective_igdb_id = tree.igdb_id,
+    effective_image_url = tree.image_url,
+    effective_hidden = tree.hidden
+FROM tree
+WHERE "game".id = tree.id
+RETURNING "game".id, effective_sgdb_id, effective_sgdb_grid_id, effective_igdb_id, effective_image_url, effective_hidden
+"""
+
+
+def refresh_effective_game(game_id: int | None = None) -> dict:
+    """
+    Recompute the effective (parent inherited) values of a game and all its children,
+    or of all games if game_id is None.
+    Returns the new effective values of game_id
+    """
+    if game_id is None:
+        db.execute_sql(EFFECTIVE_GAME_SQL.format(roots="g.parent_id IS NULL"))
+        return {}
+    cursor = db.execute_sql(EFFECTIVE_GAME_SQL.format(roots="g.id = %s"), (game_id,))
+    names = [column.name for column in cursor.description][1:]
+    for row in cursor.fetchall():
+        if row[0] == game_id:
+            return dict(zip(names, row[1:]))
+    return {}
+
+
 class Activity(IdMixin, HistoryMixin, HiddenMixin):
     """
     Activity (V2)
@@ -574,6 +1037,87 @@ class Activity(IdMixin, HistoryMixin, HiddenMixin):
     platform = ForeignKeyField(Platform, backref="activities")
     seconds = IntegerField()
     emulated = BooleanField(default=False)
+    # Oblivionis row it was synced from (unique), so a row is never synced twice
+    oblivionis_id = IntegerField(null=True)
+
+    # what the stats rollups are made of
+    STATS_FIELDS = {"user", "game", "platform", "timestamp", "seconds", "hidden"}
+
+    def stats_change(self, n: int) -> "StatsChange":
+        """
+        n = 1: this activity now counts towards the stats, -1: it no longer does.
+        Hidden activities don't count (n = 0), cached responses are still dropped
+        """
+        return (
+            # raw ids, no lazy loads
+            self.user_id,  # type: ignore
+            self.game_id,  # type: ignore
+            self.platform_id,  # type: ignore
+            assertTimezone(self.timestamp),
+            self.get_seconds(),
+            0 if self.get_hidden() else n,
+        )
+
+    @staticmethod
+    def lock_stats_rows(ids: list[int]) -> dict[int, "StatsChange"]:
+        """
+        Locks the activities and returns their current rows (by id) as -1 changes,
+        before they are updated/deleted: what is in the database, not what the instances loaded.
+        Missing ids were deleted already
+        """
+        if not ids:
+            return {}
+        rows = (
+            Activity.select(
+                Activity.id,
+                Activity.user,
+                Activity.game,
+                Activity.platform,
+                Activity.timestamp,
+                Activity.seconds,
+                Activity.hidden,
+            )
+            .where(Activity.id.in_(ids))  # type: ignore
+            .for_update()
+        )
+        return {row.get_id(): row.stats_change(-1) for row in rows}
+
+    def save(self, *args, **kwargs):
+        inserting = self.id is None or kwargs.get("force_insert", False)
+        if inserting:
+            with db.atomic():
+                ret = super().save(*args, **kwargs)
+                record_stats_changes([self.stats_change(1)])
+            return ret
+        if not {f.name for f in self.dirty_fields} & Activity.STATS_FIELDS:
+            ret = super().save(*args, **kwargs)
+            invalidate_activity_cache({self.stats_change(0)[:3]})
+            return ret
+        with db.atomic():
+            old = Activity.lock_stats_rows([self.get_id()])
+            ret = super().save(*args, **kwargs)
+            if old:
+                record_stats_changes([*old.values(), self.stats_change(1)])
+        return ret
+
+    @classmethod
+    def bulk_save(cls, models: list, fields: list):
+        if not {field.name for field in fields} & Activity.STATS_FIELDS:
+            super().bulk_save(models, fields)
+            invalidate_activity_cache({m.stats_change(0)[:3] for m in models})
+            return
+        with db.atomic():
+            old = Activity.lock_stats_rows([model.get_id() for model in models])
+            super().bulk_save(models, fields)
+            new = [m.stats_change(1) for m in models if m.get_id() in old]
+            record_stats_changes([*old.values(), *new])
+
+    def delete_instance(self, *args, **kwargs):
+        with db.atomic():
+            old = Activity.lock_stats_rows([self.get_id()])
+            ret = super().delete_instance(*args, **kwargs)
+            record_stats_changes(list(old.values()))
+        return ret
 
     def get_game(self) -> Game:
         return cast(Game, self.game)
@@ -665,6 +1209,29 @@ class DiscordHistory(IdMixin):
     message = TextField()
 
 
+class OblivionisDeadLetter(BaseModel):
+    """
+    Oblivionis activities that failed to sync, with what is needed to retry them.
+    Dead ones gave up after too many attempts, their Oblivionis row is deleted.
+    """
+
+    oblivionis_id = IntegerField(primary_key=True)
+    timestamp = DateTimeField()
+    discord_user_id = CharField()
+    discord_user_name = CharField()
+    game_name = CharField()
+    seconds = IntegerField()
+    platform = CharField()
+    attempts = IntegerField(default=0)
+    error = TextField(default="")
+    first_failed = DateTimeField(default=lambda: now())
+    last_failed = DateTimeField(default=lambda: now())
+    dead = BooleanField(default=False)
+
+    class Meta:
+        table_name = "oblivionis_dead_letter"
+
+
 class History(IdMixin):
     timestamp = DateTimeField(default=lambda: now())
     game = ForeignKeyField(Game, backref="history", null=True)
@@ -674,6 +1241,566 @@ class History(IdMixin):
     message = TextField()
 
 
+##################
+###### Stats #####
+##################
+
+
+class StatsMixin(BaseModel):
+    """
+    Rolled up totals of non-hidden activities, kept current by Activity.save/delete_instance.
+    """
+
+    seconds = BigIntegerField(default=0)
+    activity_count = IntegerField(default=0)
+    first_activity = DateTimeField(null=True)
+    last_activity = DateTimeField(null=True)
+
+
+class GameStats(StatsMixin):
+    game = ForeignKeyField(Game, primary_key=True, on_delete="CASCADE")
+    user_count = IntegerField(default=0)
+    platform_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "game_stats"
+
+
+class UserStats(StatsMixin):
+    user = ForeignKeyField(User, primary_key=True, on_delete="CASCADE")
+    game_count = IntegerField(default=0)
+    platform_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "user_stats"
+
+
+class PlatformStats(StatsMixin):
+    platform = ForeignKeyField(Platform, primary_key=True, on_delete="CASCADE")
+    user_count = IntegerField(default=0)
+    game_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "platform_stats"
+
+
+class GlobalStats(StatsMixin):
+    id = IntegerField(primary_key=True, default=1)  # single row
+    user_count = IntegerField(default=0)
+    game_count = IntegerField(default=0)
+    platform_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "global_stats"
+
+
+class ActivityDaily(BaseModel):
+    """
+    Seconds of non-hidden activities per (UTC day, user, game, platform).
+    Activities crossing midnight are split over the days, see utils2.split_by_day.
+    activity_count counts activities ending on that day.
+    """
+
+    day = DateField()
+    user = ForeignKeyField(User, on_delete="CASCADE")
+    game = ForeignKeyField(Game, on_delete="CASCADE")
+    platform = ForeignKeyField(Platform, on_delete="CASCADE")
+    seconds = IntegerField(default=0)
+    activity_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "activity_daily"
+        primary_key = CompositeKey("day", "user", "game", "platform")
+
+
+class PairStatsMixin(BaseModel):
+    """
+    Non-hidden activities of a pair. The distinct counts of the rollups (user_stats.game_count...)
+    change when a pair's count goes from 0 to more or back, see STATS_CHANGES_CTES
+    """
+
+    activity_count = IntegerField(default=0)
+
+
+class UserGameStats(PairStatsMixin):
+    user = ForeignKeyField(User, on_delete="CASCADE")
+    game = ForeignKeyField(Game, on_delete="CASCADE")
+
+    class Meta:
+        table_name = "user_game_stats"
+        primary_key = CompositeKey("user", "game")
+
+
+class UserPlatformStats(PairStatsMixin):
+    user = ForeignKeyField(User, on_delete="CASCADE")
+    platform = ForeignKeyField(Platform, on_delete="CASCADE")
+
+    class Meta:
+        table_name = "user_platform_stats"
+        primary_key = CompositeKey("user", "platform")
+
+
+class GamePlatformStats(PairStatsMixin):
+    game = ForeignKeyField(Game, on_delete="CASCADE")
+    platform = ForeignKeyField(Platform, on_delete="CASCADE")
+
+    class Meta:
+        table_name = "game_platform_stats"
+        primary_key = CompositeKey("game", "platform")
+
+
+# (user_id, game_id, platform_id, timestamp, seconds, n), see Activity.stats_change
+StatsChange = tuple[int, int, int, datetime, int, int]
+
+# pair table -> its two columns
+STATS_PAIRS = {
+    "user_game_stats": ("user_id", "game_id"),
+    "user_platform_stats": ("user_id", "platform_id"),
+    "game_platform_stats": ("game_id", "platform_id"),
+}
+# rollup table -> (key column, key in the changes, {distinct count column: table whose rows it counts})
+STATS_ROLLUPS = {
+    "user_stats": (
+        "user_id",
+        "user_id",
+        {"game_count": "user_game_stats", "platform_count": "user_platform_stats"},
+    ),
+    "game_stats": (
+        "game_id",
+        "game_id",
+        {"user_count": "user_game_stats", "platform_count": "game_platform_stats"},
+    ),
+    "platform_stats": (
+        "platform_id",
+        "platform_id",
+        {"user_count": "user_platform_stats", "game_count": "game_platform_stats"},
+    ),
+    "global_stats": (
+        "id",
+        "1",
+        {
+            "user_count": "user_stats",
+            "game_count": "game_stats",
+            "platform_count": "platform_stats",
+        },
+    ),
+}
+
+_PAIR_CHANGES_SQL = """
+{table}_delta AS (
+    SELECT {a}, {b}, SUM(n) AS n FROM d GROUP BY {a}, {b}
+),
+{table}_new AS (
+    INSERT INTO "{table}" AS s ({a}, {b}, activity_count)
+    SELECT {a}, {b}, n FROM {table}_delta ORDER BY {a}, {b}
+    ON CONFLICT ({a}, {b}) DO UPDATE SET activity_count = s.activity_count + excluded.activity_count
+    RETURNING s.{a}, s.{b}, s.activity_count
+),
+-- 1: the pair has activities now, -1: no longer has
+{table}_change AS (
+    SELECT {a}, {b}, (p.activity_count > 0)::int - (p.activity_count - x.n > 0)::int AS present
+    FROM {table}_new p JOIN {table}_delta x USING ({a}, {b})
+)"""
+
+_ROLLUP_CHANGES_SQL = """
+{table}_delta AS (
+    SELECT {key_expr} AS {key},
+        SUM(seconds * n) AS seconds,
+        SUM(n) AS activity_count,
+        MIN(ts) FILTER (WHERE n > 0) AS added_first,
+        MAX(ts) FILTER (WHERE n > 0) AS added_last,
+        MIN(ts) FILTER (WHERE n < 0) AS removed_first,
+        MAX(ts) FILTER (WHERE n < 0) AS removed_last
+    FROM d GROUP BY 1
+),
+{table}_new AS (
+    INSERT INTO "{table}" AS s ({key}, seconds, activity_count, first_activity, last_activity, {count_columns})
+    SELECT x.{key}, x.seconds, x.activity_count,
+        -- removed activities may have been the first/last one: look them up again (index scans).
+        -- With the added ones, they may be inserted by this same statement (not visible here yet)
+        CASE WHEN x.removed_first IS NULL THEN x.added_first ELSE LEAST(x.added_first,
+            (SELECT MIN(a.timestamp) FROM "activity" a WHERE {activity_where} NOT a.hidden))
+        END,
+        CASE WHEN x.removed_last IS NULL THEN x.added_last ELSE GREATEST(x.added_last,
+            (SELECT MAX(a.timestamp) FROM "activity" a WHERE {activity_where} NOT a.hidden))
+        END,
+        {count_deltas}
+    FROM {table}_delta x
+    ORDER BY 1
+    ON CONFLICT ({key}) DO UPDATE SET
+        seconds = s.seconds + excluded.seconds,
+        activity_count = s.activity_count + excluded.activity_count,
+        first_activity = CASE
+            WHEN s.first_activity >= (SELECT x.removed_first FROM {table}_delta x WHERE x.{key} = excluded.{key})
+            THEN excluded.first_activity
+            ELSE LEAST(s.first_activity, excluded.first_activity)
+        END,
+        last_activity = CASE
+            WHEN s.last_activity <= (SELECT x.removed_last FROM {table}_delta x WHERE x.{key} = excluded.{key})
+            THEN excluded.last_activity
+            ELSE GREATEST(s.last_activity, excluded.last_activity)
+        END,
+        {count_updates}
+    RETURNING s.{key}, s.activity_count
+),
+-- 1: it has activities now, -1: no longer has
+{table}_change AS (
+    SELECT {key}, (p.activity_count > 0)::int - (p.activity_count - x.activity_count > 0)::int AS present
+    FROM {table}_new p JOIN {table}_delta x USING ({key})
+)"""
+
+
+def _rollup_changes_sql(table: str, key: str, key_expr: str, counts: dict) -> str:
+    correlated = key != "id"
+    where = f"c.{key} = x.{key}" if correlated else "TRUE"
+    return _ROLLUP_CHANGES_SQL.format(
+        table=table,
+        key=key,
+        key_expr=key_expr,
+        activity_where=f"a.{key} = x.{key} AND" if correlated else "",
+        count_columns=", ".join(counts),
+        count_deltas=",\n        ".join(
+            f"COALESCE((SELECT SUM(c.present) FROM {source}_change c WHERE {where}), 0)"
+            for source in counts.values()
+        ),
+        count_updates=",\n        ".join(
+            f"{column} = s.{column} + excluded.{column}" for column in counts
+        ),
+    )
+
+
+# dd: seconds/activities per day to add, see _daily_changes
+_DAILY_CHANGES_SQL = """
+activity_daily_new AS (
+    INSERT INTO "activity_daily" AS s (day, user_id, game_id, platform_id, seconds, activity_count)
+    SELECT day, user_id, game_id, platform_id, seconds, n FROM dd ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, user_id, game_id, platform_id) DO UPDATE SET
+        seconds = s.seconds + excluded.seconds,
+        activity_count = s.activity_count + excluded.activity_count
+)"""
+
+# Apply activity changes to the pair tables, the rollups (user, game, platform, then global)
+# and activity_daily as deltas, CTEs of one statement. Concurrent writers serialize on the rows they change,
+# and each adds its own delta to the latest row, instead of overwriting it with a total
+STATS_CHANGES_CTES = (
+    "d (user_id, game_id, platform_id, ts, seconds, n) AS (VALUES {changes}),"
+    + "\ndd (day, user_id, game_id, platform_id, seconds, n) AS (VALUES {daily}),"
+    + ",".join(
+        [
+            _DAILY_CHANGES_SQL,
+            *(
+                _PAIR_CHANGES_SQL.format(table=t, a=a, b=b)
+                for t, (a, b) in STATS_PAIRS.items()
+            ),
+            *(_rollup_changes_sql(t, *config) for t, config in STATS_ROLLUPS.items()),
+        ]
+    )
+)
+
+
+_stats_batch: ContextVar[list | None] = ContextVar("stats_batch", default=None)
+
+
+@contextmanager
+def stats_batch():
+    """
+    A transaction whose activity writes update the stats once, at the end (bulk edits, the Oblivionis sync...).
+    Nothing is applied if it raises
+    """
+    if _stats_batch.get() is not None:
+        yield  # already batching
+        return
+    changes: list[StatsChange] = []
+    with db.atomic():
+        token = _stats_batch.set(changes)
+        try:
+            yield
+        finally:
+            _stats_batch.reset(token)
+        record_stats_changes(changes)
+
+
+@contextmanager
+def stats_savepoint():
+    """
+    db.atomic(), but also forgets the stats changes recorded in it (in a stats_batch) if it rolls back
+    """
+    changes = _stats_batch.get()
+    mark = len(changes) if changes is not None else 0
+    try:
+        with db.atomic():
+            yield
+    except Exception:
+        if changes is not None:
+            del changes[mark:]
+        raise
+
+
+def _refresh_rollup(rollup, entity, fk, distinct: dict):
+    """
+    Recomputes all rollup rows of entity in one INSERT ... SELECT ... ON CONFLICT
+    """
+    query = (
+        entity.select(
+            entity.id,
+            fn.COALESCE(fn.SUM(Activity.seconds), 0),
+            fn.COUNT(Activity.id),
+            fn.MIN(Activity.timestamp),
+            fn.MAX(Activity.timestamp),
+            *[fn.COUNT(fn.DISTINCT(column)) for column in distinct.values()],
+        )
+        .join(
+            Activity,
+            JOIN.LEFT_OUTER,
+            on=((fk == entity.id) & (Activity.hidden == False)),  # noqa: E712
+        )
+        .group_by(entity.id)
+    )
+    fields = [
+        rollup._meta.primary_key,
+        rollup.seconds,
+        rollup.activity_count,
+        rollup.first_activity,
+        rollup.last_activity,
+        *[getattr(rollup, name) for name in distinct.keys()],
+    ]
+    rollup.insert_from(query, fields).on_conflict(
+        conflict_target=[rollup._meta.primary_key], preserve=fields[1:]
+    ).execute()
+
+
+def _refresh_global_stats():
+    # everything can be derived from the (small) rollup tables
+    def active(rollup):
+        return rollup.select(fn.COUNT(rollup._meta.primary_key)).where(
+            rollup.activity_count > 0
+        )
+
+    query = UserStats.select(
+        1,
+        fn.COALESCE(fn.SUM(UserStats.seconds), 0),
+        fn.COALESCE(fn.SUM(UserStats.activity_count), 0),
+        fn.MIN(UserStats.first_activity),
+        fn.MAX(UserStats.last_activity),
+        active(UserStats),
+        active(GameStats),
+        active(PlatformStats),
+    )
+    fields = [
+        GlobalStats.id,
+        GlobalStats.seconds,
+        GlobalStats.activity_count,
+        GlobalStats.first_activity,
+        GlobalStats.last_activity,
+        GlobalStats.user_count,
+        GlobalStats.game_count,
+        GlobalStats.platform_count,
+    ]
+    GlobalStats.insert_from(query, fields).on_conflict(
+        conflict_target=[GlobalStats.id], preserve=fields[1:]
+    ).execute()
+
+
+def _refresh_pairs():
+    for pair, (a, b) in [
+        (UserGameStats, (Activity.user, Activity.game)),
+        (UserPlatformStats, (Activity.user, Activity.platform)),
+        (GamePlatformStats, (Activity.game, Activity.platform)),
+    ]:
+        pair.delete().execute()
+        query = (
+            Activity.select(a, b, fn.COUNT(Activity.id))
+            .where(Activity.hidden == False)  # noqa: E712
+            .group_by(a, b)
+        )
+        fields = [f for f in pair._meta.sorted_fields if f.name != "activity_count"]
+        pair.insert_from(query, [*fields, pair.activity_count]).execute()
+
+
+def _refresh_activity_daily():
+    """
+    Recomputes the whole ActivityDaily table
+    """
+    activities = Activity.select(
+        Activity.user,
+        Activity.game,
+        Activity.platform,
+        Activity.timestamp,
+        Activity.seconds,
+    ).where(
+        Activity.hidden == False  # noqa: E712
+    )
+    rows: dict[tuple, list[int]] = {}
+    for user_id, game_id, platform_id, timestamp, seconds in activities.tuples():
+        days = split_by_day(timestamp, seconds)
+        for day, day_seconds in days.items():
+            row = rows.setdefault((day, user_id, game_id, platform_id), [0, 0])
+            row[0] += day_seconds
+        # counted on the day it ended
+        rows[(max(days), user_id, game_id, platform_id)][1] += 1
+
+    fields = [
+        ActivityDaily.day,
+        ActivityDaily.user,
+        ActivityDaily.game,
+        ActivityDaily.platform,
+        ActivityDaily.seconds,
+        ActivityDaily.activity_count,
+    ]
+    ActivityDaily.delete().execute()
+    data = [(*key, *values) for key, values in rows.items()]
+    for i in range(0, len(data), 1000):
+        ActivityDaily.insert_many(data[i : i + 1000], fields).execute()
+
+
+def _refresh_stats():
+    with db.atomic():
+        _refresh_pairs()
+        _refresh_rollup(
+            UserStats,
+            User,
+            Activity.user,
+            {"game_count": Activity.game, "platform_count": Activity.platform},
+        )
+        _refresh_rollup(
+            GameStats,
+            Game,
+            Activity.game,
+            {"user_count": Activity.user, "platform_count": Activity.platform},
+        )
+        _refresh_rollup(
+            PlatformStats,
+            Platform,
+            Activity.platform,
+            {"user_count": Activity.user, "game_count": Activity.game},
+        )
+        _refresh_global_stats()
+
+
+def _daily_changes(changes: list[StatsChange]) -> list[tuple]:
+    """
+    (day, user_id, game_id, platform_id, seconds, n) to add to ActivityDaily,
+    the changed activities split by day like _refresh_activity_daily
+    """
+    rows: dict[tuple, list[int]] = {}
+    for user_id, game_id, platform_id, timestamp, seconds, n in changes:
+        days = split_by_day(timestamp, seconds)
+        for day, day_seconds in days.items():
+            row = rows.setdefault((day, user_id, game_id, platform_id), [0, 0])
+            row[0] += day_seconds * n
+        # counted on the day it ended
+        rows[(max(days), user_id, game_id, platform_id)][1] += n
+    return [(*key, *values) for key, values in rows.items()]
+
+
+def stats_changes_ctes(changes: list[StatsChange]) -> tuple[str, list]:
+    """
+    The CTEs (and their params) applying changes, for a statement's WITH
+    """
+    daily = _daily_changes(changes)
+    sql = STATS_CHANGES_CTES.format(
+        changes=", ".join(["(%s, %s, %s, %s::timestamptz, %s, %s)"] * len(changes)),
+        daily=", ".join(["(%s::date, %s, %s, %s, %s, %s)"] * len(daily)),
+    )
+    return sql, [value for row in [*changes, *daily] for value in row]
+
+
+def pending_stats_changes(changes: list[StatsChange]) -> list[StatsChange]:
+    """
+    Like record_stats_changes, but returns the changes for the caller to apply in its own statement
+    (see stats_changes_ctes). Empty if there is nothing to apply now (in a stats_batch...)
+    """
+    if not changes:
+        return []
+    batch = _stats_batch.get()
+    if batch is not None:
+        batch.extend(changes)
+        return []
+    invalidate_activity_cache({change[:3] for change in changes})
+    # hidden activities don't count
+    return [change for change in changes if change[5]]
+
+
+def record_stats_changes(changes: list[StatsChange]):
+    """
+    Applies activity writes to the stats (in a stats_batch: once, at its end),
+    in the writer's transaction
+    """
+    counted = pending_stats_changes(changes)
+    if counted:
+        sql, params = stats_changes_ctes(counted)
+        db.execute_sql(f"WITH {sql}\nSELECT 1", params)
+
+
+def invalidate_activity_cache(keys: set[tuple[int, int, int]]):
+    """
+    Drop cached API responses covering activities of the given (user, game, platform) keys,
+    once committed
+    """
+    invalidate_after_commit(activity_keys=keys)
+
+
+def _activity_cache_tags(keys: set[tuple[int, int, int]]) -> set[str]:
+    """
+    Tags of the cached API responses covering activities of the keys.
+    Ancestors of the games too, their stats can include their children's activities
+    """
+    game_ids = {k[1] for k in keys}
+    ancestors = GameClosure.select(GameClosure.ancestor).where(
+        GameClosure.descendant.in_(game_ids)  # type: ignore
+    )
+    tags = {"global"}
+    tags.update(f"user:{k[0]}" for k in keys)
+    tags.update(f"platform:{k[2]}" for k in keys)
+    tags.update(f"game:{row.ancestor_id}" for row in ancestors)
+    tags.update(f"game:{game_id}" for game_id in game_ids)
+    return tags
+
+
+STATS_TABLES = [
+    UserStats,
+    GameStats,
+    PlatformStats,
+    GlobalStats,
+    UserGameStats,
+    UserPlatformStats,
+    GamePlatformStats,
+]
+
+
+def _lock_tables(tables: list):
+    # activity writes wait until the lock is released (they need the tables for their changes),
+    # so none is lost or counted twice
+    db.execute_sql(
+        "LOCK TABLE "
+        + ", ".join(f'"{model._meta.table_name}"' for model in tables)
+        + " IN SHARE ROW EXCLUSIVE MODE"
+    )
+
+
+def reconcile_stats():
+    """
+    Recompute all stats tables from scratch (not ActivityDaily, see rebuild_activity_daily)
+    """
+    logger.info("Reconciling stats tables...")
+    with db.atomic():
+        _lock_tables(STATS_TABLES)
+        _refresh_stats()
+    logger.info("Stats tables reconciled")
+
+
+def rebuild_activity_daily():
+    """
+    Recompute the whole ActivityDaily table (backfill).
+    Loads every activity, activity writes keep it up to date otherwise
+    """
+    logger.info("Rebuilding activity_daily...")
+    with db.atomic():
+        _lock_tables([ActivityDaily])
+        _refresh_activity_daily()
+    logger.info("activity_daily rebuilt")
+
+
 async def clean_loop():
     def cleanupDiscordHistory():
         cutoff = now() - timedelta(days=30)
@@ -683,9 +1810,14 @@ async def clean_loop():
         deleted = DiscordHistory.delete().where(DiscordHistory.timestamp < cutoff).execute()  # type: ignore
         logger.info(f"Deleted {deleted} old entries from DiscordHistory")
 
+    def clean():
+        with connection_scope():
+            cleanupDiscordHistory()
+
     while True:
         logger.info("Cleaning up... 🧹")
-        cleanupDiscordHistory()
+        # blocking DB work, keep it off the event loop
+        await asyncio.to_thread(clean)
         logger.info("Cleanup complete! 🧹")
         await asyncio.sleep(3600)  # every hour
 
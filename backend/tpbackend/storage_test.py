@@ -0,0 +1,40 @@
+import contextvars
+import threading
+
+from tpbackend.storage import connection_scope, db
+
+
+class TestConnectionScope:
+    def test_scope_starts_closed(self):
+        with connection_scope():
+            assert db.is_closed()
+            assert db._state.conn is None
+
+    def test_scope_does_not_leak_state(self):
+        with connection_scope():
+            db._state.ctx.append("outer")
+            with connection_scope():
+                assert db._state.ctx == []
+            assert db._state.ctx == ["outer"]
+
+    def test_worker_thread_shares_request_state(self):
+        # like anyio's to_thread: the worker runs in a copy of the request context
+        with connection_scope():
+            ctx = contextvars.copy_context()
+            t = threading.Thread(
+                target=ctx.run, args=(setattr, db._state, "conn", "fake")
+            )
+            t.start()
+            t.join()
+            assert db._state.conn == "fake"
+            db._state.conn = None
+
+    def test_unscoped_threads_get_own_state(self):
+        seen = []
+        with connection_scope():
+            db._state.conn = "fake"
+            t = threading.Thread(target=lambda: seen.append(db._state.conn))
+            t.start()
+            t.join()
+            db._state.conn = None
+        assert seen == [None]
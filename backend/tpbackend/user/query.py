@@ -1,12 +1,9 @@
 import logging
 from typing import Literal
 
-from peewee import (
-    JOIN,
-    fn,
-    Case,
-)
-from tpbackend.storage import User, Activity
+from peewee import JOIN, fn
+from tpbackend.common.search import normalize_search, search_rank, search_where
+from tpbackend.storage import UserStats, User, Activity
 
 logger = logging.getLogger("user_query")
 
@@ -33,42 +30,33 @@ class UserQuery:
     @staticmethod
     def apply_sort(query, sort, order):
         column = UserQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
 
     @staticmethod
     def search(query, search: str):
-        if not search or search.strip() == "":
+        """
+        Filters on search and orders by best match.
+        Sorts applied after this only break ties.
+        """
+        search = normalize_search(search)
+        if not search:
             return query
-        q = query.where(User.search.contains(search.lower()))  # type: ignore
+        q = query.where(search_where(User.search, search)).order_by(  # type: ignore
+            *search_rank(User.search, search)  # type: ignore
+        )
         return q
 
 
 class UserStatsQuery:
-    TOTAL_SECONDS = fn.SUM(
-        Case(None, [(Activity.hidden == False, Activity.seconds)], 0)
-    ).alias("total_seconds")
-
-    ACTIVITY_COUNT = fn.COUNT(Case(None, [(Activity.hidden == False, 1)], None)).alias(
-        "activity_count"
-    )
-
-    LAST_ACTIVITY = fn.MAX(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("last_activity")
-
-    FIRST_ACTIVITY = fn.MIN(
-        Case(None, [(Activity.hidden == False, Activity.timestamp)], None)
-    ).alias("first_activity")
-
-    GAME_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.game)], None))
-    ).alias("game_count")
-
-    PLATFORM_COUNT = fn.COUNT(
-        fn.DISTINCT(Case(None, [(Activity.hidden == False, Activity.platform)], None))
-    ).alias("platform_count")
+    # aggregated per user over an already filtered activity query, see filtered()
+    TOTAL_SECONDS = fn.SUM(Activity.seconds).alias("total_seconds")
+    ACTIVITY_COUNT = fn.COUNT(Activity.id).alias("activity_count")
+    LAST_ACTIVITY = fn.MAX(Activity.timestamp).alias("last_activity")
+    FIRST_ACTIVITY = fn.MIN(Activity.timestamp).alias("first_activity")
+    GAME_COUNT = fn.COUNT(fn.DISTINCT(Activity.game)).alias("game_count")
+    PLATFORM_COUNT = fn.COUNT(fn.DISTINCT(Activity.platform)).alias("platform_count")
 
     AGGREGATES = {
         "playtime": TOTAL_SECONDS,
@@ -79,6 +67,17 @@ class UserStatsQuery:
         "platform_count": PLATFORM_COUNT,
     }
 
+    # same columns as AGGREGATES, read from the rollup table instead
+    ROLLUP = [
+        fn.COALESCE(UserStats.seconds, 0).alias("total_seconds"),
+        fn.COALESCE(UserStats.activity_count, 0).alias("activity_count"),
+        UserStats.last_activity.alias("last_activity"),
+        UserStats.first_activity.alias("first_activity"),
+        fn.COALESCE(UserStats.game_count, 0).alias("game_count"),
+        fn.COALESCE(UserStats.platform_count, 0).alias("platform_count"),
+    ]
+
+    # sorting only renders the alias, so these work on filtered() and rollup() alike
     SORTS = {
         **AGGREGATES,
         "name": User.display_name,  # User.name,
@@ -86,11 +85,48 @@ class UserStatsQuery:
     }
 
     @staticmethod
-    def base():
+    def filtered(activities, keep_empty=False):
+        """
+        Aggregates the activities query (with its filters already applied) per user
+        in a subquery, and joins that to the users. See GameStatsQuery.filtered()
+        keep_empty: also return users without any matching activities (with zeroed stats)
+        """
+        stats = (
+            activities.select(
+                Activity.user.alias("user_id"), *UserStatsQuery.AGGREGATES.values()
+            )
+            .group_by(Activity.user)
+            .order_by()
+            .alias("stats")
+        )
+        return (
+            User.select(
+                User,
+                fn.COALESCE(stats.c.total_seconds, 0).alias("total_seconds"),
+                fn.COALESCE(stats.c.activity_count, 0).alias("activity_count"),
+                stats.c.last_activity.alias("last_activity"),
+                stats.c.first_activity.alias("first_activity"),
+                fn.COALESCE(stats.c.game_count, 0).alias("game_count"),
+                fn.COALESCE(stats.c.platform_count, 0).alias("platform_count"),
+            )
+            .join(
+                stats,
+                JOIN.LEFT_OUTER if keep_empty else JOIN.INNER,
+                on=(stats.c.user_id == User.id),
+            )
+            .objects()  # put the stats columns on the User
+        )
+
+    @staticmethod
+    def rollup():
+        """
+        Like filtered() over all activities, but reads the precomputed UserStats instead.
+        Only valid when there are no activity filters (before/after/game/platform...)
+        """
         return (
-            User.select(User, *UserStatsQuery.AGGREGATES.values())
-            .join(Activity, JOIN.LEFT_OUTER)
-            .group_by(User.id)
+            User.select(User, *UserStatsQuery.ROLLUP)
+            .join(UserStats, JOIN.LEFT_OUTER, on=(UserStats.user == User.id))
+            .objects()  # put the stats columns on the User, like filtered() does
         )
 
     @staticmethod
@@ -103,6 +139,6 @@ class UserStatsQuery:
     @staticmethod
     def apply_sort(query, sort, order):
         column = UserStatsQuery.SORTS[sort]
-        return query.order_by(
+        return query.order_by_extend(
             column.desc(nulls="LAST") if order == "desc" else column.asc(nulls="LAST")
         )
@@ -1,12 +1,14 @@
 from tpbackend.activity.query import ActivityQuery
-from tpbackend.utils2 import clamp, parseTS, parse_csv
+from tpbackend.utils2 import clamp, parseTS, parseWindow, parse_csv
 from tpbackend.user.query import UserStatsQuery, UserQuery
 from tpbackend.user.models import API_UserWithStats, API_User
+from tpbackend.api.route_cache import cached_route
 from tpbackend.api.responses import bad_request, not_found
 import logging
 from fastapi import APIRouter, Path
 from tpbackend.api.params import (
     path_csv,
+    query_overlaps,
     query_ts,
     AscDescOrder,
     path_id,
@@ -26,6 +28,7 @@ def __get_users_stats(
     uids: list[int] | None = None,
     before: int | None = None,
     after: int | None = None,
+    overlaps: str | None = None,
     game_id: int | None = None,
     platform_id: int | None = None,
     sort="id",
@@ -36,24 +39,31 @@ def __get_users_stats(
 ) -> list[API_UserWithStats]:
     bf = parseTS(before)
     af = parseTS(after)
+    window = parseWindow(overlaps) if overlaps else None
+    if overlaps and not window:
+        return bad_request("Invalid overlaps, expected start,end timestamps")
 
-    query = UserStatsQuery.base()
-    if uids and len(uids) > 0:
-        if len(uids) > 100:
-            return bad_request("Cannot request more than 100 users at once")
-        query = UserStatsQuery.apply_ids(query, uids)
-
-    if bf:
-        query = ActivityQuery.before(query, bf)
-
-    if af:
-        query = ActivityQuery.after(query, af)
-
-    if game_id:
-        query = ActivityQuery.game(query, game_id)
+    if uids and len(uids) > 100:
+        return bad_request("Cannot request more than 100 users at once")
 
-    if platform_id:
-        query = ActivityQuery.platform(query, platform_id)
+    if bf or af or window or game_id or platform_id:
+        activities = ActivityQuery.base()
+        if bf:
+            activities = ActivityQuery.before(activities, bf)
+        if af:
+            activities = ActivityQuery.after(activities, af)
+        if window:
+            activities = ActivityQuery.overlaps(activities, *window)
+        if game_id:
+            activities = ActivityQuery.game(activities, game_id)
+        if platform_id:
+            activities = ActivityQuery.platform(activities, platform_id)
+        query = UserStatsQuery.filtered(activities, keep_empty=bool(uids))
+    else:
+        # nothing to filter activities on, precomputed stats will do
+        query = UserStatsQuery.rollup()
+    if uids:
+        query = UserStatsQuery.apply_ids(query, uids)
 
     if search:
         query = UserQuery.search(query, search=search)
@@ -75,10 +85,12 @@ def __get_users_stats(
     tags=["users", "stats"],
     response_model=API_UserWithStats,
 )
+@cached_route("users", single_flight=True)
 def get_single_user_stats(
     user_id: int,
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     game: int | None = None,
     platform: int | None = None,
 ) -> API_UserWithStats:
@@ -86,6 +98,7 @@ def get_single_user_stats(
         uids=[int(user_id)],
         before=before,
         after=after,
+        overlaps=overlaps,
         game_id=game,
         platform_id=platform,
     )
@@ -99,10 +112,12 @@ def get_single_user_stats(
     response_model=list[API_UserWithStats],
     tags=["users", "stats"],
 )
+@cached_route("users", single_flight=True)
 def get_many_users_stats(
     user_ids=path_csv("user ids"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     game=query_id("game"),
     platform=query_id("platform"),
     sort=sorts(list(UserStatsQuery.SORTS.keys()), "id"),
@@ -113,6 +128,7 @@ def get_many_users_stats(
         uids=uids,
         before=before,
         after=after,
+        overlaps=overlaps,
         game_id=game,
         platform_id=platform,
         sort=sort,
@@ -125,6 +141,7 @@ def get_many_users_stats(
     tags=["users", "stats"],
     response_model=list[API_UserWithStats],
 )
+@cached_route("users", single_flight=True)
 def get_users_stats(
     offset=offset(),
     limit=limit(),
@@ -132,6 +149,7 @@ def get_users_stats(
     platform=query_id("platform"),
     before=query_ts("before"),
     after=query_ts("after"),
+    overlaps=query_overlaps(),
     sort=sorts(list(UserStatsQuery.SORTS.keys()), "playtime"),
     order: AscDescOrder = "desc",
     search=query_search("users"),
@@ -142,6 +160,7 @@ def get_users_stats(
     return __get_users_stats(
         before=before,
         after=after,
+        overlaps=overlaps,
         game_id=game,
         platform_id=platform,
         sort=sort,
@@ -184,6 +203,7 @@ def __get_users(
     tags=["users"],
     response_model=API_User,
 )
+@cached_route("users")
 def get_single_user(user_id: int) -> API_User:
     x = __get_users(ids=[int(user_id)])
     if len(x) == 0:
@@ -196,6 +216,7 @@ def get_single_user(user_id: int) -> API_User:
     tags=["users"],
     response_model=list[API_User],
 )
+@cached_route("users")
 def get_many_users(
     user_ids=path_csv("user ids"),
     sort=sorts(list(UserQuery.SORTS.keys()), "id"),
@@ -216,6 +237,7 @@ def get_many_users(
     tags=["users"],
     response_model=list[API_User],
 )
+@cached_route("users")
 def get_users(
     offset=offset(),
     limit=offset(),
@@ -221,6 +221,20 @@ def parseTS(ts) -> datetime.datetime | None:
     return assertTimezone(dt)
 
 
+def parseWindow(window: str) -> tuple[datetime.datetime, datetime.datetime] | None:
+    """
+    Parses "start,end" timestamps (see parseTS).
+    Returns None on failure, or if start is not before end
+    """
+    parts = window.replace("%2C", ",").split(",")
+    if len(parts) != 2:
+        return None
+    start, end = parseTS(parts[0].strip()), parseTS(parts[1].strip())
+    if not start or not end or start >= end:
+        return None
+    return start, end
+
+
 def truncateMilliseconds(ts: int) -> int:
     return (ts // 1000) * 1000
 
@@ -311,6 +325,58 @@ def ts_to_dt(ts: int | float) -> datetime.datetime:
     return datetime.datetime.fromtimestamp(ts / 1000)
 
 
+def split_by_day(
+    end_time: datetime.datetime,
+    seconds: int,
+    after: datetime.datetime | None = None,
+    before: datetime.datetime | None = None,
+) -> dict[datetime.date, int]:
+    """
+    Splits an activity (ending at end_time, lasting seconds) into seconds per UTC day.
+    With after/before, only the part played during [after, before) (empty if none)
+    """
+    end_time = assertTimezone(end_time).astimezone(datetime.timezone.utc)
+    start_time = end_time - datetime.timedelta(seconds=seconds)
+    if after is not None or before is not None:
+        if after is not None:
+            start_time = max(start_time, assertTimezone(after))
+        if before is not None:
+            end_time = min(end_time, assertTimezone(before))
+        if end_time <= start_time:
+            return {}
+        days = split_by_day(end_time, round((end_time - start_time).total_seconds()))
+        # cut at a midnight, the day after has none of it
+        return {day: day_seconds for day, day_seconds in days.items() if day_seconds}
+
+    start_date = start_time.date()
+    end_date = end_time.date()
+
+    if start_date == end_date:
+        return {start_date: seconds}
+
+    res: dict[datetime.date, int] = {}
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date == start_date:
+            next_midnight = datetime.datetime.combine(
+                current_date + datetime.timedelta(days=1),
+                datetime.time.min,
+                tzinfo=datetime.timezone.utc,
+            )
+            res[current_date] = round((next_midnight - start_time).total_seconds())
+        elif current_date == end_date:
+            this_midnight = datetime.datetime.combine(
+                current_date,
+                datetime.time.min,
+                tzinfo=datetime.timezone.utc,
+            )
+            res[current_date] = round((end_time - this_midnight).total_seconds())
+        else:
+            res[current_date] = 86400
+        current_date += datetime.timedelta(days=1)
+    return res
+
+
 def parse_csv(input: int | str) -> list[int]:
     def ret(v):
         logger.info("parse_csv: '%s' -> %s", input, v)
@@ -93,6 +93,26 @@ class TestParseRange:
         assert utils.parseRange(s) == expected
 
 
+class TestParseWindow:
+    def test_parse(self):
+        start, end = utils.parseWindow("1700000000000,1700003600000")
+        assert start == datetime.datetime(2023, 11, 14, 22, 13, 20, tzinfo=datetime.UTC)
+        assert (end - start) == datetime.timedelta(hours=1)
+
+    @pytest.mark.parametrize(
+        "s",
+        [
+            "1700003600000,1700000000000",
+            "1700000000000,1700000000000",
+            "1700000000000",
+            "1700000000000,abc",
+            "1,2,3",
+        ],
+    )
+    def test_invalid(self, s):
+        assert utils.parseWindow(s) is None
+
+
 class TestNormalizeQuotes:
     @pytest.mark.parametrize(
         "s, expected",
@@ -174,3 +194,57 @@ class TestQueryNormalize:
 
     def test_pokemon(self):
         assert utils.query_normalize("Pokémon") == "pokemon"
+
+
+class TestSplitByDay:
+    def test_same_day(self):
+        end = datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.UTC)
+        assert utils.split_by_day(end, 3600) == {datetime.date(2025, 1, 1): 3600}
+
+    def test_across_midnight(self):
+        end = datetime.datetime(2025, 1, 2, 0, 30, tzinfo=datetime.UTC)
+        assert utils.split_by_day(end, 3600) == {
+            datetime.date(2025, 1, 1): 1800,
+            datetime.date(2025, 1, 2): 1800,
+        }
+
+    def test_full_days_in_between(self):
+        end = datetime.datetime(2025, 1, 3, 1, 0, tzinfo=datetime.UTC)
+        result = utils.split_by_day(end, 2 * 86400)
+        assert result == {
+            datetime.date(2025, 1, 1): 82800,
+            datetime.date(2025, 1, 2): 86400,
+            datetime.date(2025, 1, 3): 3600,
+        }
+        assert sum(result.values()) == 2 * 86400
+
+    def test_converts_to_utc(self):
+        tz = datetime.timezone(datetime.timedelta(hours=2))
+        end = datetime.datetime(2025, 1, 2, 1, 0, tzinfo=tz)  # 23:00 UTC the day before
+        assert utils.split_by_day(end, 3600) == {datetime.date(2025, 1, 1): 3600}
+
+    def test_clipped(self):
+        end = datetime.datetime(2025, 1, 2, 1, 0, tzinfo=datetime.UTC)
+        after = datetime.datetime(2025, 1, 1, 23, 30, tzinfo=datetime.UTC)
+        before = datetime.datetime(2025, 1, 2, 0, 15, tzinfo=datetime.UTC)
+        assert utils.split_by_day(end, 3 * 3600, after, before) == {
+            datetime.date(2025, 1, 1): 1800,
+            datetime.date(2025, 1, 2): 900,
+        }
+
+    def test_clipped_outside(self):
+        end = datetime.datetime(2025, 1, 2, 1, 0, tzinfo=datetime.UTC)
+        after = datetime.datetime(2025, 1, 2, 1, 0, tzinfo=datetime.UTC)
+        assert utils.split_by_day(end, 3600, after=after) == {}
+
+    def test_clipped_on_midnights_like_whole_days(self):
+        # what the daily rollup gives for midnight bounds
+        end = datetime.datetime(2025, 1, 4, 1, 0, tzinfo=datetime.UTC)
+        after = datetime.datetime(2025, 1, 2, tzinfo=datetime.UTC)
+        before = datetime.datetime(2025, 1, 4, tzinfo=datetime.UTC)
+        days = utils.split_by_day(end, 3 * 86400)
+        assert utils.split_by_day(end, 3 * 86400, after, before) == {
+            day: seconds
+            for day, seconds in days.items()
+            if after.date() <= day < before.date()
+        }
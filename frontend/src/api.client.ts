@@ -293,6 +293,28 @@ export class TimeplayedAPI {
     return data;
   }
 
+  /** Like getActivities, but also returns the cursor of the next page (if any) */
+  static async getActivitiesPage(
+    query: paths["/api/activities"]["get"]["parameters"]["query"],
+  ) {
+    const { data, error, response } = await this.getClient().GET(
+      "/api/activities",
+      {
+        params: {
+          query,
+        },
+      },
+    );
+    if (error) {
+      console.error("Error fetching activities:", error);
+      throw error;
+    }
+    return {
+      activities: data,
+      nextCursor: response.headers.get("X-Next-Cursor") ?? undefined,
+    };
+  }
+
   static async getNewestActivity(
     query: paths["/api/activity/newest"]["get"]["parameters"]["query"],
   ) {
@@ -453,7 +453,12 @@ export interface paths {
             path?: never;
             cookie?: never;
         };
-        /** Get Playtime By Day */
+        /**
+         * Get Playtime By Day
+         * @description Seconds played per UTC day during [after, before), activities are cut at the bounds.
+         *     before/after on UTC midnights (or none at all) are answered from the daily rollup,
+         *     anything else is computed from the activities. Days without playtime are left out
+         */
         get: operations["get_playtime_by_day_api_charts_playtime_by_day_get"];
         put?: never;
         post?: never;
@@ -1002,6 +1007,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 game?: number | null;
                 platform?: number | null;
             };
@@ -1040,6 +1047,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description ID of the game to filter by */
                 game?: number;
                 /** @description ID of the platform to filter by */
@@ -1090,6 +1099,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description Sort by */
                 sort?: "playtime" | "activity_count" | "last_activity" | "first_activity" | "game_count" | "platform_count" | "name" | "id";
                 order?: "asc" | "desc";
@@ -1379,6 +1390,10 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
+                /** @description X-Next-Cursor header of the previous page, to continue from there */
+                cursor?: string | null;
             };
             header?: never;
             path?: never;
@@ -1419,6 +1434,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
             };
             header?: never;
             path?: never;
@@ -1453,10 +1470,14 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description ID of the user to filter by */
                 user?: number;
                 /** @description ID of the platform to filter by */
                 platform?: number;
+                /** @description Include the activities of all child games */
+                rollup?: boolean;
             };
             header?: never;
             path: {
@@ -1494,6 +1515,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description ID of the user to filter by */
                 user?: number;
                 /** @description ID of the platform to filter by */
@@ -1501,6 +1524,8 @@ export interface operations {
                 /** @description Sort by */
                 sort?: "playtime" | "activity_count" | "last_activity" | "first_activity" | "user_count" | "platform_count" | "name" | "id";
                 order?: "asc" | "desc";
+                /** @description Include the activities of all child games */
+                rollup?: boolean;
             };
             header?: never;
             path: {
@@ -1544,11 +1569,15 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description Sort by */
                 sort?: "playtime" | "activity_count" | "last_activity" | "first_activity" | "user_count" | "platform_count" | "name" | "id";
                 order?: "asc" | "desc";
                 /** @description Search term to filter games by */
                 search?: string;
+                /** @description Include the activities of all child games */
+                rollup?: boolean;
             };
             header?: never;
             path?: never;
@@ -1688,6 +1717,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description ID of the user to filter by */
                 user?: number;
                 /** @description ID of the game to filter by */
@@ -1729,6 +1760,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description ID of the user to filter by */
                 user?: number;
                 /** @description ID of the game to filter by */
@@ -1779,6 +1812,8 @@ export interface operations {
                 before?: number;
                 /** @description Timestamp (in milliseconds). Only include activities after this timestamp. */
                 after?: number;
+                /** @description Comma-separated start,end timestamps (in milliseconds). Only include activities played (at least partly) during this window. */
+                overlaps?: string;
                 /** @description Sort by */
                 sort?: "playtime" | "activity_count" | "last_activity" | "first_activity" | "user_count" | "game_count" | "name" | "id";
                 order?: "asc" | "desc";